@@ -0,0 +1,87 @@
+# Utilidades compartidas por los benchmarks. `configure` debe llamarse antes de
+# importar `database`/`main`, porque el engine se crea al importar.
+import os
+import statistics
+import subprocess
+import tempfile
+
+ADMIN_IDENTIFICACION = "bench-admin"
+ADMIN_PASSWORD = "Bench123!"
+
+
+def configure(database_url: str | None = None) -> str:
+    if database_url is None:
+        database_url = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("JWT_SECRET", "bench-secret")
+    # El escenario login repite el mismo usuario desde la misma IP
+    os.environ.setdefault("LOGIN_RATE_LIMIT", "false")
+    return database_url
+
+
+def create_admin(db, identificacion: str = ADMIN_IDENTIFICACION):
+    import models as _models
+    import services.hashing_service as _hashingService
+
+    admin = _models.Administrador(
+        identificacion=identificacion,
+        nombres="Bench",
+        apellidos="Admin",
+        telefono="0",
+        cargo="bench",
+        empresa="bench",
+        email=f"{identificacion}@example.com",
+        hashed_password=_hashingService.pwd_context().hash(ADMIN_PASSWORD),
+    )
+    db.add(admin)
+    return admin
+
+
+def client(timeout=None):
+    import httpx
+
+    import main as _main
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=_main.app),
+        base_url="http://bench",
+        timeout=timeout,
+    )
+
+
+async def auth_headers(client, identificacion: str = ADMIN_IDENTIFICACION) -> dict:
+    response = await client.post(
+        "/api/v1/token",
+        data={"username": identificacion, "password": ADMIN_PASSWORD},
+    )
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def percentiles(latencies: list[float]) -> dict:
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+
+    ordered = sorted(latencies)
+    if len(ordered) == 1:
+        cuts = [ordered[0]] * 99
+    else:
+        cuts = statistics.quantiles(ordered, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,118 @@
+# Compara requests/seg del mismo worker con DATABASE_ASYNC=false y true.
+#
+#   python -m benchmarks.concurrency --requests 2000 --concurrency 50
+#
+# Cada modo corre en un subproceso propio porque el engine se configura al importar
+# `database`. Por defecto usa una base SQLite temporal; con --database-url se puede
+# apuntar a un Postgres local.
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+from benchmarks import common as _common
+
+
+def _run_mode(args):
+    import database as _database
+    import models as _models
+    import services.database as _databaseServices
+
+    _databaseServices.create_database()
+
+    with _database.SessionLocal() as db:
+        _common.create_admin(db)
+        for i in range(args.students):
+            db.add(
+                _models.Estudiante(
+                    tipo_identificacion="CC",
+                    identificacion=f"bench-{i}",
+                    nombres="Bench",
+                    apellidos=str(i),
+                    institucion="bench",
+                    telefono="0",
+                    direccion="-",
+                    email=f"bench-{i}@example.com",
+                    hashed_password="-",
+                    codigoQR="",
+                )
+            )
+        db.commit()
+
+    async def run():
+        async with _common.client() as client:
+            headers = await _common.auth_headers(client)
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def one(i):
+                async with semaphore:
+                    r = await client.get(
+                        f"/api/v1/estudiantes/bench-{i % args.students}",
+                        headers=headers,
+                    )
+                    r.raise_for_status()
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(args.requests)))
+            return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    print(
+        json.dumps(
+            {
+                "async": _database.DATABASE_ASYNC,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "seconds": round(elapsed, 3),
+                "requests_per_second": round(args.requests / elapsed, 1),
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--database-url")
+    parser.add_argument("--mode", choices=["sync", "async"])
+    args = parser.parse_args()
+
+    if args.mode:
+        _run_mode(args)
+        return
+
+    for mode in ("sync", "async"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env.setdefault("ALGORITHM", "HS256")
+            env.setdefault("JWT_SECRET", "bench-secret")
+            env["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/bench.db"
+            env["DATABASE_ASYNC"] = "true" if mode == "async" else "false"
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.concurrency",
+                    "--mode",
+                    mode,
+                    "--requests",
+                    str(args.requests),
+                    "--concurrency",
+                    str(args.concurrency),
+                    "--students",
+                    str(args.students),
+                ],
+                env=env,
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Lanza descuentos de tiquetes en paralelo sobre los mismos estudiantes y verifica
+# que los contadores queden exactos (sin doble gasto ni actualizaciones perdidas).
+#
+#   python -m benchmarks.discount_stress --students 5 --tickets 40 --scans 60
+#
+# Cada estudiante recibe --tickets tiquetes y --scans escaneos concurrentes, así que
+# deben aplicarse exactamente min(tickets, scans) descuentos por estudiante.
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from benchmarks import common as _common
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=5)
+    parser.add_argument("--tickets", type=int, default=40)
+    parser.add_argument("--scans", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    _common.configure(args.database_url)
+
+    import sqlalchemy as _sql
+
+    import database as _database
+    import models as _models
+    import services.database as _databaseServices
+
+    _databaseServices.create_database()
+
+    with _database.SessionLocal() as db:
+        _common.create_admin(db)
+        for i in range(args.students):
+            db.add(
+                _models.Estudiante(
+                    tipo_identificacion="CC",
+                    identificacion=f"stress-{i}",
+                    nombres="Stress",
+                    apellidos=str(i),
+                    institucion="bench",
+                    telefono="0",
+                    direccion="-",
+                    email=f"stress-{i}@example.com",
+                    hashed_password="-",
+                    numero_tiquetes=args.tickets,
+                )
+            )
+        db.commit()
+
+    async def run():
+        async with _common.client() as client:
+            headers = await _common.auth_headers(client)
+            semaphore = asyncio.Semaphore(args.concurrency)
+            latencies = []
+            statuses = {}
+
+            async def scan(i):
+                identificacion = f"stress-{i % args.students}"
+                async with semaphore:
+                    start = time.perf_counter()
+                    r = await client.put(
+                        f"/api/v1/estudiantes/tickets/delete/{identificacion}",
+                        data={"identification": identificacion},
+                        headers=headers,
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(scan(i) for i in range(args.students * args.scans)))
+            return time.perf_counter() - start, latencies, statuses
+
+    elapsed, latencies, statuses = asyncio.run(run())
+
+    with _database.SessionLocal() as db:
+        students = db.execute(
+            _sql.select(
+                _models.Estudiante.numero_tiquetes, _models.Estudiante.numero_viajes
+            )
+        ).all()
+        trips = db.execute(
+            _sql.select(_sql.func.count(_models.Viaje.viaje_id))
+        ).scalar()
+
+    expected = min(args.tickets, args.scans)
+    consistent = (
+        all(
+            row.numero_tiquetes == args.tickets - expected
+            and row.numero_viajes == expected
+            for row in students
+        )
+        and trips == expected * args.students
+        and statuses.get(200, 0) == expected * args.students
+    )
+    print(
+        json.dumps(
+            {
+                "scans": len(latencies),
+                "statuses": statuses,
+                "trips": trips,
+                "consistent": consistent,
+                "seconds": round(elapsed, 3),
+                "scans_per_second": round(len(latencies) / elapsed, 1),
+                **_common.percentiles(latencies),
+            }
+        )
+    )
+    if not consistent:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Memoria y velocidad de las exportaciones en streaming sobre una base sembrada.
+#
+#   python -m benchmarks.export --students 10000 --trips 1000000 \
+#       --max-rss-mb 150 [--database-url postgresql://localhost/tiquetes_bench]
+#
+# La siembra corre en un subproceso y cada exportación en otro, así el pico de
+# memoria (ru_maxrss) de cada medición es solo el de exportar. El cuerpo se
+# consume directamente del generador que recibe StreamingResponse: el transporte
+# ASGI de httpx acumula la respuesta completa y ocultaría lo que se mide. Con
+# --max-rss-mb termina con código 1 si alguna exportación supera ese pico.
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import common as _common
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _run_export(args):
+    import asyncio
+
+    import schemas.admin as _admin
+    import services.export_service as _exportService
+
+    admin = _admin.Admin.model_construct(identificacion=_common.ADMIN_IDENTIFICACION)
+    if args.target == "viajes":
+        body = _exportService.export_trips(admin=admin, formato=args.formato)
+    else:
+        body = _exportService.export_students(admin=admin, formato=args.formato)
+
+    async def consume():
+        total = 0
+        async for chunk in body:
+            total += len(chunk)
+        return total
+
+    rss_start = _rss_mb()
+    start = time.perf_counter()
+    size = asyncio.run(consume())
+    elapsed = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "seconds": round(elapsed, 2),
+                "mb": round(size / 2**20, 1),
+                "rss_start_mb": round(rss_start, 1),
+                # ru_maxrss está en KiB en Linux
+                "rss_peak_mb": round(
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+                ),
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--trips", type=int, default=1000000)
+    parser.add_argument("--database-url")
+    parser.add_argument("--max-rss-mb", type=float)
+    parser.add_argument("--target", choices=["viajes", "estudiantes"])
+    parser.add_argument("--formato", choices=["csv", "xlsx"])
+    args = parser.parse_args()
+
+    if args.target:
+        _common.configure(args.database_url)
+        _run_export(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{tmp}/export.db"
+        env = dict(os.environ)
+        env.setdefault("ALGORITHM", "HS256")
+        env.setdefault("JWT_SECRET", "bench-secret")
+
+        start = time.perf_counter()
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.seed",
+                "--students",
+                str(args.students),
+                "--trips",
+                str(args.trips),
+                "--database-url",
+                database_url,
+            ],
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        seed_seconds = time.perf_counter() - start
+
+        results = {}
+        for target, rows in (("viajes", args.trips), ("estudiantes", args.students)):
+            for formato in ("csv", "xlsx"):
+                output = subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "benchmarks.export",
+                        "--target",
+                        target,
+                        "--formato",
+                        formato,
+                        "--database-url",
+                        database_url,
+                    ],
+                    env=env,
+                    check=True,
+                    stdout=subprocess.PIPE,
+                    text=True,
+                ).stdout
+                result = json.loads(output)
+                result["rows_per_second"] = round(rows / result["seconds"], 1)
+                results[f"{target}_{formato}"] = result
+
+    report = {
+        "commit": _common.git_commit(),
+        "students": args.students,
+        "trips": args.trips,
+        "seed_seconds": round(seed_seconds, 1),
+        "exports": results,
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.max_rss_mb is not None and any(
+        result["rss_peak_mb"] > args.max_rss_mb for result in results.values()
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Mide filas/seg de POST /api/v1/estudiantes/importar con un CSV sintético.
+#
+#   python -m benchmarks.import_throughput --rows 2000
+#
+# El costo dominante es bcrypt; HASHING_WORKERS / HASHING_EXECUTOR=process cambian
+# el resultado. Un porcentaje de filas se duplica a propósito para medir también
+# el reporte de errores.
+import argparse
+import asyncio
+import csv
+import io
+import json
+import time
+
+from benchmarks import common as _common
+
+
+def _csv(rows: int, duplicates: float) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(
+        [
+            "tipo_identificacion",
+            "identificacion",
+            "nombres",
+            "apellidos",
+            "institucion",
+            "telefono",
+            "direccion",
+            "email",
+            "hashed_password",
+        ]
+    )
+    every = int(1 / duplicates) if duplicates else 0
+    for i in range(rows):
+        n = i - 1 if every and i and i % every == 0 else i
+        writer.writerow(
+            [
+                "CC",
+                f"import-{n}",
+                "Import",
+                str(n),
+                f"institucion-{n % 10}",
+                "0",
+                "-",
+                f"import-{n}@example.com",
+                "Import123!",
+            ]
+        )
+    return buffer.getvalue().encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--duplicates", type=float, default=0.01)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    _common.configure(args.database_url)
+
+    import database as _database
+    import services.database as _databaseServices
+
+    _databaseServices.create_database()
+
+    with _database.SessionLocal() as db:
+        _common.create_admin(db)
+        db.commit()
+
+    content = _csv(args.rows, args.duplicates)
+
+    async def run():
+        async with _common.client() as client:
+            headers = await _common.auth_headers(client)
+
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/v1/estudiantes/importar",
+                files={"archivo": ("estudiantes.csv", content, "text/csv")},
+                headers=headers,
+            )
+            response.raise_for_status()
+            return time.perf_counter() - start, response.json()
+
+    elapsed, report = asyncio.run(run())
+    print(
+        json.dumps(
+            {
+                "rows": report["procesados"],
+                "inserted": report["insertados"],
+                "errors": len(report["errores"]),
+                "seconds": round(elapsed, 3),
+                "rows_per_second": round(report["procesados"] / elapsed, 1),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
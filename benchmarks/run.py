@@ -0,0 +1,185 @@
+# Suite de carga reproducible para los endpoints más usados de la API.
+#
+#   python -m benchmarks.run --students 10000 --trips 100000 --concurrency 50 \
+#       --output bench.json [--baseline bench-anterior.json]
+#
+# Siembra una base (SQLite temporal por defecto, o --database-url para un Postgres
+# local), y ejecuta contra la `app` de main.py los escenarios login, scan
+# (discount_ticket), lookup (estudiante por identificación) y list (paginación).
+# El resultado es JSON con p50/p95/p99 y throughput por escenario; con --baseline
+# se agrega la variación porcentual respecto a una corrida anterior.
+#
+# SQLite serializa las escrituras: con concurrencia alta el escenario scan reporta
+# errores "database is locked". Para comparar escrituras use un Postgres local.
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from benchmarks import common as _common
+
+SCENARIOS = ("login", "scan", "lookup", "list")
+
+
+async def _drive(client, requests: int, concurrency: int, make_request):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+            except Exception:
+                # ASGITransport propaga las excepciones no manejadas de la app
+                # (p. ej. "database is locked" en SQLite) en lugar de un 500
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        **_common.percentiles(latencies),
+    }
+
+
+async def _run(args, identificaciones: list[str]) -> dict:
+    rng = random.Random(args.seed)
+    results = {}
+
+    async with _common.client() as client:
+        headers = await _common.auth_headers(client)
+
+        async def login(client, i):
+            return await client.post(
+                "/api/v1/token",
+                data={
+                    "username": _common.ADMIN_IDENTIFICACION,
+                    "password": _common.ADMIN_PASSWORD,
+                },
+            )
+
+        async def scan(client, i):
+            identificacion = rng.choice(identificaciones)
+            return await client.put(
+                f"/api/v1/estudiantes/tickets/delete/{identificacion}",
+                data={"identification": identificacion},
+                headers=headers,
+            )
+
+        async def lookup(client, i):
+            return await client.get(
+                f"/api/v1/estudiantes/{rng.choice(identificaciones)}", headers=headers
+            )
+
+        async def list_page(client, i):
+            after = rng.choice(identificaciones)
+            return await client.get(
+                f"/api/v1/estudiantes?after={after}&limit={args.page_size}",
+                headers=headers,
+            )
+
+        handlers = {"login": login, "scan": scan, "lookup": lookup, "list": list_page}
+        for name in args.scenarios:
+            requests = args.login_requests if name == "login" else args.requests
+            results[name] = await _drive(
+                client, requests, args.concurrency, handlers[name]
+            )
+
+    return results
+
+
+def _compare(results: dict, baseline: dict) -> dict:
+    delta = {}
+    for name, current in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        delta[name] = {
+            key: round((current[key] - previous[key]) / previous[key] * 100, 1)
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+            if current.get(key) and previous.get(key)
+        }
+    return delta
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--trips", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--login-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument(
+        "--scenarios",
+        type=lambda value: value.split(","),
+        default=list(SCENARIOS),
+        help="Lista separada por comas: " + ",".join(SCENARIOS),
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    database_url = _common.configure(args.database_url)
+
+    from benchmarks import seed as _seed
+
+    seed_start = time.perf_counter()
+    identificaciones = _seed.seed(
+        students=args.students, trips=args.trips, rng=random.Random(args.seed)
+    )
+    seed_seconds = time.perf_counter() - seed_start
+
+    import database as _database
+
+    report = {
+        "commit": _common.git_commit(),
+        "database": _database.engine.dialect.name,
+        "async": _database.DATABASE_ASYNC,
+        "config": {
+            "students": args.students,
+            "trips": args.trips,
+            "requests": args.requests,
+            "login_requests": args.login_requests,
+            "concurrency": args.concurrency,
+            "page_size": args.page_size,
+            "seed": args.seed,
+        },
+        "seed_seconds": round(seed_seconds, 3),
+        "scenarios": asyncio.run(_run(args, identificaciones)),
+    }
+    if database_url.startswith("sqlite"):
+        report["config"]["database_url"] = "sqlite (temporal)"
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["delta_pct"] = _compare(report["scenarios"], json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Latencia de GET /api/v1/estudiantes/search sobre una base sembrada.
+#
+#   python -m benchmarks.search --students 100000 --repeat 50 \
+#       [--database-url postgresql://localhost/tiquetes_bench]
+#
+# Con SQLite mide el índice de trigramas en memoria (la primera búsqueda lo
+# construye y se reporta aparte); con Postgres, el índice GIN de pg_trgm, que
+# debe existir: ejecute `python manage.py init-db` sobre esa base antes.
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks import common as _common
+
+# Consultas por tipo, sobre los datos de benchmarks.seed
+QUERIES = {
+    "identificacion_prefijo": lambda rng: f"bench-{rng.randrange(10000):04d}",
+    "nombre_exacto": lambda rng: f"Nombre{rng.randrange(100000)}",
+    "apellido_con_error": lambda rng: f"Apelido{rng.randrange(100000)}",
+    "institucion": lambda rng: f"institucion-{rng.randrange(20)}",
+}
+
+
+async def _run(args) -> dict:
+    rng = random.Random(args.seed)
+    results = {}
+    async with _common.client() as client:
+        headers = await _common.auth_headers(client)
+
+        async def search(q):
+            response = await client.get(
+                "/api/v1/estudiantes/search",
+                params={"q": q, "limit": args.limit},
+                headers=headers,
+            )
+            response.raise_for_status()
+            return response
+
+        start = time.perf_counter()
+        await search("warmup")
+        results["primera_busqueda_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+        for name, make_query in QUERIES.items():
+            latencies = []
+            resultados = 0
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = await search(make_query(rng))
+                latencies.append(time.perf_counter() - start)
+                resultados += len(response.json())
+            results[name] = {
+                "resultados_promedio": round(resultados / args.repeat, 1),
+                **_common.percentiles(latencies),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    database_url = _common.configure(args.database_url)
+
+    from benchmarks import seed as _seed
+
+    _seed.seed(students=args.students, trips=0)
+    results = asyncio.run(_run(args))
+    print(
+        json.dumps(
+            {
+                "commit": _common.git_commit(),
+                "database": database_url.split(":", 1)[0],
+                "students": args.students,
+                "queries": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
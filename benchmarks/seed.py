@@ -0,0 +1,156 @@
+# Carga sintética de estudiantes y viajes directamente en las tablas de `models`.
+#
+#   python -m benchmarks.seed --students 100000 --trips 1000000 \
+#       --database-url postgresql://localhost/tiquetes_bench
+#
+# Inserta con executemany por lotes y llena viaje_resumen_diario con los mismos
+# conteos, así los reportes funcionan sobre los datos sembrados.
+import argparse
+import datetime as _dt
+import json
+import random
+import time
+import uuid
+from collections import Counter
+
+from benchmarks import common as _common
+
+# Hash fijo: los estudiantes sembrados no inician sesión y así se evita bcrypt
+_PASSWORD_PLACEHOLDER = "$2b$12$" + "x" * 53
+
+
+def _uuid() -> uuid.UUID:
+    # En SQLite las columnas UUID tienen afinidad NUMERIC: un hex como
+    # "1234...e56..." se guarda como número y no se puede volver a leer. Pasa
+    # con ~1 de cada 10^5 uuid4, así que con millones de filas hay que evitarlos.
+    while True:
+        value = uuid.uuid4()
+        try:
+            float(value.hex)
+        except ValueError:
+            return value
+
+
+def seed(
+    students: int,
+    trips: int,
+    admins: int = 3,
+    institutions: int = 20,
+    days: int = 90,
+    tickets: int = 1000,
+    batch_size: int = 5000,
+    rng: random.Random | None = None,
+):
+    import sqlalchemy as _sql
+
+    import database as _database
+    import models as _models
+    import services.database as _databaseServices
+
+    rng = rng or random.Random(0)
+    _databaseServices.create_database()
+
+    with _database.SessionLocal() as db:
+        admin_ids = []
+        for i in range(admins):
+            admin = _common.create_admin(
+                db,
+                identificacion=_common.ADMIN_IDENTIFICACION
+                if i == 0
+                else f"bench-admin-{i}",
+            )
+            admin.administrador_id = _uuid()
+            admin_ids.append(admin.administrador_id)
+        db.commit()
+
+        estudiantes = []
+        for start in range(0, students, batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, students)):
+                estudiante_id = _uuid()
+                institucion = f"institucion-{i % institutions}"
+                estudiantes.append((estudiante_id, institucion))
+                rows.append(
+                    {
+                        "estudiante_id": estudiante_id,
+                        "tipo_identificacion": "CC",
+                        "identificacion": f"bench-{i:08d}",
+                        "nombres": f"Nombre{i}",
+                        "apellidos": f"Apellido{i}",
+                        "institucion": institucion,
+                        "telefono": "3000000000",
+                        "direccion": "Calle 1",
+                        "email": f"bench-{i}@example.com",
+                        "hashed_password": _PASSWORD_PLACEHOLDER,
+                        "numero_tiquetes": tickets,
+                        "numero_viajes": 0,
+                    }
+                )
+            db.execute(_sql.insert(_models.Estudiante), rows)
+            db.commit()
+
+        hoy = _dt.datetime.utcnow().replace(microsecond=0)
+        resumen = Counter()
+        for start in range(0, trips, batch_size):
+            rows = []
+            for _ in range(start, min(start + batch_size, trips)):
+                estudiante_id, institucion = rng.choice(estudiantes)
+                administrador_id = rng.choice(admin_ids)
+                fecha = hoy - _dt.timedelta(seconds=rng.randrange(days * 86400))
+                resumen[(fecha.date(), institucion, administrador_id)] += 1
+                rows.append(
+                    {
+                        "viaje_id": _uuid(),
+                        "estudiante_id": estudiante_id,
+                        "administrador_id": administrador_id,
+                        "fecha_viaje": fecha,
+                        "hora": fecha.time(),
+                    }
+                )
+            db.execute(_sql.insert(_models.Viaje), rows)
+            db.commit()
+
+        if resumen:
+            db.execute(
+                _sql.insert(_models.ViajeResumenDiario),
+                [
+                    {
+                        "fecha": fecha,
+                        "institucion": institucion,
+                        "administrador_id": administrador_id,
+                        "total": total,
+                    }
+                    for (fecha, institucion, administrador_id), total in resumen.items()
+                ],
+            )
+            db.commit()
+
+    return [f"bench-{i:08d}" for i in range(students)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--trips", type=int, default=100000)
+    parser.add_argument("--admins", type=int, default=3)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    database_url = _common.configure(args.database_url)
+    start = time.perf_counter()
+    seed(students=args.students, trips=args.trips, admins=args.admins, days=args.days)
+    print(
+        json.dumps(
+            {
+                "database_url": database_url,
+                "students": args.students,
+                "trips": args.trips,
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
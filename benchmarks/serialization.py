@@ -0,0 +1,110 @@
+# Costo de serializar estudiantes por cada camino de respuesta, en µs y bytes por
+# estudiante, sin red ni base de datos.
+#
+#   python -m benchmarks.serialization --students 1000 --repeat 20
+#
+# "orm_jsonable" es el camino anterior: el handler devolvía objetos de SQLAlchemy y
+# FastAPI los pasaba por jsonable_encoder, incluyendo hashed_password y el QR que
+# se guardaba en la fila. Los demás validan con el response_model y cambian solo
+# la clase de respuesta (JSONResponse vs ORJSONResponse).
+import argparse
+import json
+import time
+import uuid
+
+from benchmarks import common as _common
+
+# Tamaño aproximado del QR en base64 que se guardaba en cada fila
+_QR_PLACEHOLDER = "x" * 1500
+
+
+def _students(n: int):
+    import models as _models
+
+    return [
+        _models.Estudiante(
+            estudiante_id=uuid.uuid4(),
+            tipo_identificacion="CC",
+            identificacion=f"bench-{i:08d}",
+            nombres=f"Nombre{i}",
+            apellidos=f"Apellido{i}",
+            institucion=f"institucion-{i % 20}",
+            telefono="3000000000",
+            direccion="Calle 1",
+            email=f"bench-{i}@example.com",
+            hashed_password="$2b$12$" + "x" * 53,
+            codigoQR=_QR_PLACEHOLDER,
+            numero_tiquetes=1000,
+            numero_viajes=0,
+            activo=True,
+        )
+        for i in range(n)
+    ]
+
+
+def _paths():
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from pydantic import TypeAdapter
+
+    from schemas import estudiante as _estudiante
+
+    def orm_jsonable(students):
+        return JSONResponse(jsonable_encoder(students)).body
+
+    def response_model(schema, response_class):
+        adapter = TypeAdapter(list[schema])
+
+        def serialize(students):
+            # Lo mismo que hace FastAPI con un response_model
+            validated = adapter.validate_python(students, from_attributes=True)
+            return response_class(adapter.dump_python(validated, mode="json")).body
+
+        return serialize
+
+    return {
+        "orm_jsonable": orm_jsonable,
+        "resumen_json": response_model(_estudiante.EstudianteResumen, JSONResponse),
+        "resumen_orjson": response_model(_estudiante.EstudianteResumen, ORJSONResponse),
+        "listado_orjson": response_model(_estudiante.EstudianteListado, ORJSONResponse),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    _common.configure()
+    students = _students(args.students)
+
+    results = {}
+    for name, serialize in _paths().items():
+        size = len(serialize(students))
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            serialize(students)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results[name] = {
+            "us_per_student": round(best / args.students * 1e6, 3),
+            "bytes_per_student": round(size / args.students, 1),
+        }
+
+    print(
+        json.dumps(
+            {
+                "commit": _common.git_commit(),
+                "students": args.students,
+                "repeat": args.repeat,
+                "paths": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
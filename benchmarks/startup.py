@@ -0,0 +1,142 @@
+# Tiempo de arranque en frío: importar main.py y atender el primer request
+# (lifespan + GET /healthz), cada corrida en un proceso nuevo.
+#
+#   python -m benchmarks.startup --runs 5 [--top 15] [--output startup.json] \
+#       [--baseline startup-anterior.json] [--max-regression-pct 20]
+#
+# Reporta la mediana de las corridas y los módulos con mayor tiempo acumulado
+# según `python -X importtime`. Con --baseline y --max-regression-pct termina con
+# código 1 si import_ms o first_request_ms empeoran más que ese porcentaje, para
+# usarlo como control en CI.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import common as _common
+
+_PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def first_request():
+    import httpx
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://b") as c:
+            (await c.get("/healthz")).raise_for_status()
+
+asyncio.run(first_request())
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (done - start) * 1000,
+    "modules": len(__import__("sys").modules),
+}))
+"""
+
+
+def _env(database_url: str) -> dict:
+    env = dict(os.environ)
+    env["DATABASE_URL"] = database_url
+    env.setdefault("ALGORITHM", "HS256")
+    env.setdefault("JWT_SECRET", "bench-secret")
+    return env
+
+
+def _probe(env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _import_profile(env: dict, top: int) -> list[dict]:
+    # Cada línea de -X importtime: "import time: self | cumulative | módulo"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line.split(":", 1)[1].split("|", 2)
+        modules.append(
+            {
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_ms": round(int(own) / 1000, 1),
+                "cumulative_ms": round(int(cumulative) / 1000, 1),
+            }
+        )
+    modules.sort(key=lambda m: m["cumulative_ms"], reverse=True)
+    return modules[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--database-url")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--max-regression-pct", type=float)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = _env(args.database_url or f"sqlite:///{tmp}/startup.db")
+        # La primera corrida calienta el caché de bytecode y no se cuenta
+        _probe(env)
+        runs = [_probe(env) for _ in range(args.runs)]
+        profile = _import_profile(env, args.top)
+
+    report = {
+        "commit": _common.git_commit(),
+        "runs": args.runs,
+        "import_ms": round(statistics.median(r["import_ms"] for r in runs), 1),
+        "first_request_ms": round(
+            statistics.median(r["first_request_ms"] for r in runs), 1
+        ),
+        "modules_loaded": runs[-1]["modules"],
+        "slowest_imports": profile,
+    }
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["delta_pct"] = {
+            key: round((report[key] - baseline[key]) / baseline[key] * 100, 1)
+            for key in ("import_ms", "first_request_ms")
+            if baseline.get(key)
+        }
+        if args.max_regression_pct is not None:
+            failed = any(
+                delta > args.max_regression_pct
+                for delta in report["delta_pct"].values()
+            )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    sys.stdout.write(output + "\n")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
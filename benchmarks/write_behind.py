@@ -0,0 +1,146 @@
+# Compara escaneos/seg de discount_ticket con commit por request y con
+# DISCOUNT_WRITE_BEHIND=true (commit agrupado por el flusher).
+#
+#   python -m benchmarks.write_behind --requests 5000 --concurrency 50 \
+#       [--database-url postgresql://localhost/tiquetes_bench]
+#
+# Cada modo corre en un subproceso propio porque la configuración se lee al
+# importar. Con SQLite las escrituras se serializan y el modo por request reporta
+# errores "database is locked" con concurrencia alta; use un Postgres local para
+# medir el costo real del commit.
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import common as _common
+
+
+def _run_mode(args):
+    import database as _database
+    import main as _main
+    import models as _models
+    import services.database as _databaseServices
+    import services.write_behind_service as _writeBehindService
+
+    _databaseServices.create_database()
+
+    with _database.SessionLocal() as db:
+        _common.create_admin(db)
+        for i in range(args.students):
+            db.add(
+                _models.Estudiante(
+                    tipo_identificacion="CC",
+                    identificacion=f"bench-{i}",
+                    nombres="Bench",
+                    apellidos=str(i),
+                    institucion="bench",
+                    telefono="0",
+                    direccion="-",
+                    email=f"bench-{i}@example.com",
+                    hashed_password="-",
+                    numero_tiquetes=args.requests,
+                )
+            )
+        db.commit()
+
+    async def run():
+        # ASGITransport no ejecuta el lifespan: se abre a mano para el flusher
+        async with _main.app.router.lifespan_context(_main.app):
+            async with _common.client() as client:
+                headers = await _common.auth_headers(client)
+                semaphore = asyncio.Semaphore(args.concurrency)
+                errors = 0
+
+                async def one(i):
+                    nonlocal errors
+                    identificacion = f"bench-{i % args.students}"
+                    async with semaphore:
+                        try:
+                            r = await client.put(
+                                f"/api/v1/estudiantes/tickets/delete/{identificacion}",
+                                data={"identification": identificacion},
+                                headers=headers,
+                            )
+                        except Exception:
+                            errors += 1
+                            return
+                        if r.status_code >= 400:
+                            errors += 1
+
+                start = time.perf_counter()
+                await asyncio.gather(*(one(i) for i in range(args.requests)))
+                elapsed = time.perf_counter() - start
+
+                # Tiempo hasta que todo lo confirmado queda escrito en la base
+                await _writeBehindService.flush()
+                durable = time.perf_counter() - start
+        return elapsed, durable, errors
+
+    elapsed, durable, errors = asyncio.run(run())
+
+    with _database.SessionLocal() as db:
+        viajes = db.query(_models.Viaje).count()
+
+    print(
+        json.dumps(
+            {
+                "write_behind": _writeBehindService.DISCOUNT_WRITE_BEHIND,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "errors": errors,
+                "viajes_en_base": viajes,
+                "seconds": round(elapsed, 3),
+                "scans_per_second": round(args.requests / elapsed, 1),
+                "seconds_until_durable": round(durable, 3),
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--database-url")
+    parser.add_argument("--mode", choices=["per-request", "write-behind"])
+    args = parser.parse_args()
+
+    if args.mode:
+        _run_mode(args)
+        return
+
+    for mode in ("per-request", "write-behind"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env.setdefault("ALGORITHM", "HS256")
+            env.setdefault("JWT_SECRET", "bench-secret")
+            env["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/bench.db"
+            env["DISCOUNT_WRITE_BEHIND"] = "true" if mode == "write-behind" else "false"
+            env["DISCOUNT_JOURNAL_DIR"] = os.path.join(tmp, "diario")
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.write_behind",
+                    "--mode",
+                    mode,
+                    "--requests",
+                    str(args.requests),
+                    "--concurrency",
+                    str(args.concurrency),
+                    "--students",
+                    str(args.students),
+                ],
+                env=env,
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import os
+
+from dotenv import load_dotenv
+
+# Único punto que carga el archivo .env; los demás módulos leen su configuración
+# con config.getenv para que el orden de importación no importe
+load_dotenv()
+
+
+def getenv(name: str, default: str | None = None) -> str | None:
+    return os.getenv(name, default)
@@ -1,15 +1,95 @@
 import sqlalchemy as _sql
 import sqlalchemy.orm as _orm
+import sqlalchemy.ext.asyncio as _asyncio
 import sqlalchemy.ext.declarative as _declarative
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
+import config as _config
+import metrics as _metrics
 
-DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = _sql.create_engine(DATABASE_URL)
+DATABASE_URL = _config.getenv("DATABASE_URL")
+
+# DATABASE_ASYNC=true hace que get_db entregue AsyncSession en lugar de Session
+DATABASE_ASYNC = _config.getenv("DATABASE_ASYNC", "false").lower() == "true"
+
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def _async_url(url: str):
+    if not url:
+        return url
+    scheme, sep, rest = url.partition("://")
+    return _ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+ASYNC_DATABASE_URL = _config.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+
+# Configuración del pool de conexiones (por engine y por proceso)
+DB_POOL_SIZE = int(_config.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(_config.getenv("DB_MAX_OVERFLOW", "10"))
+# Segundos esperando una conexión libre antes de fallar
+DB_POOL_TIMEOUT = float(_config.getenv("DB_POOL_TIMEOUT", "30"))
+# Segundos de vida de una conexión antes de reemplazarla; -1 la deshabilita
+DB_POOL_RECYCLE = int(_config.getenv("DB_POOL_RECYCLE", "1800"))
+# Verifica la conexión al sacarla del pool (descarta conexiones caídas tras un failover)
+DB_POOL_PRE_PING = _config.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# statement_timeout de Postgres en milisegundos; 0 lo deja sin límite
+DB_STATEMENT_TIMEOUT_MS = int(_config.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+def _engine_options(url: str) -> dict:
+    url = _sql.make_url(url)
+    poolclass = url.get_dialect().get_pool_class(url)
+
+    # El pool por defecto del dialecto, midiendo la espera de cada checkout
+    options = {
+        "poolclass": _metrics.timed_pool(poolclass),
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if issubclass(poolclass, _sql.pool.QueuePool):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+
+    if DB_STATEMENT_TIMEOUT_MS and url.get_backend_name() == "postgresql":
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            }
+        else:
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+            }
+    return options
+
+
+engine = _sql.create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+_metrics.instrument_engine(engine)
 
 SessionLocal = _orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+
+if DATABASE_ASYNC:
+    async_engine = _asyncio.create_async_engine(
+        ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL)
+    )
+    _metrics.instrument_engine(async_engine.sync_engine)
+
+    # expire_on_commit=False: en modo asíncrono no se permite recargar atributos
+    # de forma implícita después del commit
+    AsyncSessionLocal = _asyncio.async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+
 Base = _declarative.declarative_base()
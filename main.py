@@ -1,17 +1,68 @@
-from datetime import timedelta
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Literal
+from uuid import UUID
 
 import sqlalchemy.orm as _orm
-from fastapi import Depends, FastAPI, Form, HTTPException
+from fastapi import (
+    Depends,
+    FastAPI,
+    Form,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import (
+    ORJSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 from fastapi.security import OAuth2PasswordRequestForm
 
+import metrics as _metrics
 import schemas.admin as _admin
 import schemas.estudiante as _estudiante
+import schemas.reportes as _reportes
+import schemas.trabajo as _trabajo
+import schemas.viajes as _viajes
 import services.admin_services as _adminServices
+import services.dashboard_service as _dashboardService
 import services.database as _databaseServices
+import services.export_service as _exportService
+import services.hashing_service as _hashingService
+import services.job_service as _jobService
+import services.qr_service as _qrService
+import services.qr_revocation_service as _qrRevocationService
+import services.qr_token_service as _qrTokenService
+import services.rate_limit_service as _rateLimitService
+import services.report_service as _reportService
+import services.search_service as _searchService
 import services.student_service as _studentService
+import services.viaje_service as _viajeService
+import services.write_behind_service as _writeBehindService
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await _writeBehindService.start()
+    await _searchService.start()
+    await _qrRevocationService.start()
+    await _jobService.start()
+    yield
+    await _jobService.stop()
+    await _qrRevocationService.stop()
+    await _searchService.stop()
+    await _writeBehindService.stop()
+    _hashingService.shutdown()
+
+
+# orjson serializa las respuestas ya validadas por los response_model
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
-app = FastAPI()
+app.add_middleware(_metrics.MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,14 +70,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After", "ETag"],
 )
 
 
-@app.post("/api/v1/token", tags=["Login"])
+@app.post("/api/v1/token", tags=["Login"], response_model=_admin.Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: _orm.Session = Depends(_databaseServices.get_db),
 ):
+    # Antes de cualquier consulta o bcrypt: rechazar un intento cuesta casi nada
+    await _rateLimitService.check_login(request, form_data.username)
+
     user = await _adminServices.authenticate_admin(
         form_data.username, form_data.password, db
     )
@@ -41,20 +97,64 @@ async def login(
 
 
 # Endpoints para la creación de estudiantes
-@app.post("/api/v1/estudiantes", tags=["Estudiante"])
+@app.post(
+    "/api/v1/estudiantes",
+    tags=["Estudiante"],
+    response_model=_estudiante.EstudianteResumen,
+)
 async def create_student(
     student: _estudiante.EstudianteCreate,
-    user: _estudiante.Estudiante = Depends(_adminServices.get_current_user),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
     db: _orm.session = Depends(_databaseServices.get_db),
 ):
     user = await _studentService.create_student(student=student, db=db)
     return user
 
 
-@app.get("/api/v1/estudiantes/{identificacion}", tags=["Estudiante"])
+@app.post(
+    "/api/v1/estudiantes/importar",
+    tags=["Estudiante"],
+    response_model=_estudiante.ResultadoImportacion,
+)
+async def import_students(
+    archivo: UploadFile,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _studentService.import_students(archivo=archivo, db=db, admin=user)
+
+
+# Declarado antes de /{identificacion}: si no, "search" se tomaría como una
+# identificación
+@app.get(
+    "/api/v1/estudiantes/search",
+    tags=["Estudiante"],
+    response_model=list[_estudiante.EstudianteListado],
+)
+async def search_students(
+    response: Response,
+    q: str = Query(..., min_length=2, max_length=100),
+    after: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    estudiantes, next_after = await _searchService.search_students(
+        q=q, db=db, admin=user, after=after, limit=limit
+    )
+    if next_after is not None:
+        response.headers["X-Next-After"] = next_after
+    return estudiantes
+
+
+@app.get(
+    "/api/v1/estudiantes/{identificacion}",
+    tags=["Estudiante"],
+    response_model=_estudiante.EstudianteResumen,
+)
 async def get_user_by_id(
     identificacion: str,
-    user: _estudiante.Estudiante = Depends(_adminServices.get_current_user),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
     db: _orm.session = Depends(_databaseServices.get_db),
 ):
     student = await _studentService.get_user_by_identificacion(
@@ -69,55 +169,380 @@ async def get_user_by_id(
     return student
 
 
-@app.get("/api/v1/estudiantes", tags=["Estudiante"])
+@app.get("/api/v1/estudiantes/{identificacion}/qr", tags=["Estudiante"])
+async def get_student_qr(
+    identificacion: str,
+    request: Request,
+    fmt: str = Query("png", alias="format", pattern="^(png|svg)$"),
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    token = await _studentService.qr_token(identificacion=identificacion, db=db)
+    if token is None:
+        raise HTTPException(
+            status_code=404, detail="El estudiante no se encuentra registrado"
+        )
+
+    content, etag = await _qrService.render(
+        identificacion=identificacion, token=token, fmt=fmt
+    )
+    headers = {"ETag": etag, "Cache-Control": _qrService.cache_control()}
+
+    if _qrService.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(
+        content=content, media_type=_qrService.MEDIA_TYPES[fmt], headers=headers
+    )
+
+
+@app.post(
+    "/api/v1/estudiantes/{identificacion}/qr/regenerar",
+    tags=["Estudiante"],
+    response_model=_estudiante.TokenQR,
+)
+async def regenerate_student_qr(
+    identificacion: str,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _studentService.regenerate_qr(
+        identificacion=identificacion, db=db, admin=user
+    )
+
+
+@app.get(
+    "/api/v1/qr/validar", tags=["Estudiante"], response_model=_estudiante.ValidacionQR
+)
+async def validate_qr(
+    t: str,
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    # Verifica firma, expiración y revocación sin consultar la base de datos
+    try:
+        token = await _qrRevocationService.validate(t)
+    except _qrTokenService.InvalidToken as e:
+        return _estudiante.ValidacionQR(valido=False, motivo=str(e))
+
+    return _estudiante.ValidacionQR(
+        valido=True,
+        estudiante_id=token.estudiante_id,
+        identificacion=token.identificacion,
+        version=token.version,
+        expira=datetime.fromtimestamp(token.exp, timezone.utc),
+    )
+
+
+@app.get(
+    "/api/v1/estudiantes",
+    tags=["Estudiante"],
+    response_model=list[_estudiante.EstudianteListado],
+)
 async def get_students(
+    response: Response,
+    after: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    stream: bool = False,
     db: _orm.session = Depends(_databaseServices.get_db),
-    user: _estudiante.Estudiante = Depends(_adminServices.get_current_user),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
 ):
-    estudiantes = await _studentService.get_all_students(db=db, admin=user)
+    if stream:
+        # NDJSON: una línea por estudiante, sin cargar la tabla completa en memoria
+        return StreamingResponse(
+            _studentService.stream_students(admin=user, after=after),
+            media_type="application/x-ndjson",
+        )
+
+    estudiantes, next_after = await _studentService.get_all_students(
+        db=db, admin=user, after=after, limit=limit
+    )
+    if next_after is not None:
+        response.headers["X-Next-After"] = next_after
     return estudiantes
 
 
-@app.put("/api/v1/estudiantes/tickets/{identification}", tags=["Estudiante"])
-def update_tickets(
+@app.get(
+    "/api/v1/estudiantes/{identificacion}/viajes",
+    tags=["Viaje"],
+    response_model=list[_viajes.Viaje],
+)
+async def get_student_trips(
+    identificacion: str,
+    response: Response,
+    after: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    desde: date | None = None,
+    hasta: date | None = None,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    viajes, next_after = await _viajeService.trip_history(
+        identificacion=identificacion,
+        db=db,
+        admin=user,
+        after=after,
+        limit=limit,
+        desde=desde,
+        hasta=hasta,
+    )
+    if next_after is not None:
+        response.headers["X-Next-After"] = next_after
+    return viajes
+
+
+@app.put(
+    "/api/v1/estudiantes/tickets/{identification}",
+    tags=["Estudiante"],
+    response_model=_estudiante.EstudianteResumen,
+)
+async def update_tickets(
     student_id: str = Form(...),
     nro_tickets: str = Form(...),
     db: _orm.session = Depends(_databaseServices.get_db),
-    user: _estudiante.Estudiante = Depends(_adminServices.get_current_user),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
 ):
     tickets = int(nro_tickets)
-    estudiante = _studentService.update_tickets(
+    estudiante = await _studentService.update_tickets(
         db=db, student_identification=student_id, tickets_number=tickets, admin=user
     )
     return estudiante
 
 
-@app.put("/api/v1/estudiantes/tickets/delete/{identificacion}", tags=["Estudiante"])
-def discount_ticket(
+@app.put(
+    "/api/v1/estudiantes/tickets",
+    tags=["Estudiante"],
+    response_model=_estudiante.ResultadoRecarga,
+)
+async def bulk_update_tickets(
+    recarga: _estudiante.RecargaMasiva,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _studentService.bulk_update_tickets(recarga=recarga, db=db, admin=user)
+
+
+@app.put(
+    "/api/v1/estudiantes/tickets/delete/{identificacion}",
+    tags=["Estudiante"],
+    response_model=_estudiante.EstudianteResumen,
+)
+async def discount_ticket(
     identification: str = Form(...),
     db: _orm.session = Depends(_databaseServices.get_db),
-    user: _estudiante.Estudiante = Depends(_adminServices.get_current_user),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
 ):
-    estudiante = _studentService.discount_ticket(
+    estudiante = await _studentService.discount_ticket(
         student_identification=identification, db=db, admin=user
     )
     return estudiante
 
 
-@app.delete("/api/v1/estudiantes", tags=["Estudiante"])
-def delete_student(
+@app.post(
+    "/api/v1/viajes/sincronizar",
+    tags=["Viaje"],
+    response_model=_viajes.ResultadoSincronizacion,
+)
+async def sync_scans(
+    sincronizacion: _viajes.SincronizacionEscaneos,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _viajeService.sync_scans(
+        sincronizacion=sincronizacion, db=db, admin=user
+    )
+
+
+# Endpoints de reportes de viajes
+@app.get(
+    "/api/v1/reportes/viajes/dia",
+    tags=["Reportes"],
+    response_model=list[_reportes.ConteoDia],
+)
+async def trips_per_day(
+    desde: date | None = None,
+    hasta: date | None = None,
+    institucion: str | None = None,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _reportService.trips_per_day(
+        db=db, admin=user, desde=desde, hasta=hasta, institucion=institucion
+    )
+
+
+@app.get(
+    "/api/v1/reportes/viajes/institucion",
+    tags=["Reportes"],
+    response_model=list[_reportes.ConteoInstitucion],
+)
+async def trips_per_institution(
+    desde: date | None = None,
+    hasta: date | None = None,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _reportService.trips_per_institution(
+        db=db, admin=user, desde=desde, hasta=hasta
+    )
+
+
+@app.get(
+    "/api/v1/reportes/viajes/administrador",
+    tags=["Reportes"],
+    response_model=list[_reportes.ConteoAdministrador],
+)
+async def trips_per_admin(
+    desde: date | None = None,
+    hasta: date | None = None,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _reportService.trips_per_admin(
+        db=db, admin=user, desde=desde, hasta=hasta
+    )
+
+
+@app.get(
+    "/api/v1/reportes/viajes/estudiante/{identificacion}",
+    tags=["Reportes"],
+    response_model=list[_reportes.ConteoDia],
+)
+async def trips_per_student(
+    identificacion: str,
+    desde: date | None = None,
+    hasta: date | None = None,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _reportService.trips_per_student(
+        identificacion=identificacion, db=db, admin=user, desde=desde, hasta=hasta
+    )
+
+
+@app.post(
+    "/api/v1/reportes/viajes/reconstruir",
+    tags=["Reportes"],
+    response_model=dict[str, int],
+)
+async def rebuild_trip_rollups(
+    desde: date,
+    hasta: date,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _reportService.rebuild_rollups(
+        db=db, desde=desde, hasta=hasta, admin=user
+    )
+
+
+@app.get("/api/v1/dashboard", tags=["Reportes"], response_model=_reportes.Dashboard)
+async def get_dashboard(
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _dashboardService.get_dashboard(db=db, admin=user)
+
+
+# Exportaciones en streaming: el archivo se envía a medida que se leen las filas
+@app.get("/api/v1/reportes/exportar/estudiantes", tags=["Reportes"])
+async def export_students(
+    formato: Literal["csv", "xlsx"] = "csv",
+    institucion: str | None = None,
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    nombre = _exportService.filename("estudiantes", formato, institucion)
+    return StreamingResponse(
+        _exportService.export_students(
+            admin=user, formato=formato, institucion=institucion
+        ),
+        media_type=_exportService.MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+    )
+
+
+@app.get("/api/v1/reportes/exportar/viajes", tags=["Reportes"])
+async def export_trips(
+    formato: Literal["csv", "xlsx"] = "csv",
+    desde: date | None = None,
+    hasta: date | None = None,
+    institucion: str | None = None,
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    nombre = _exportService.filename("viajes", formato, institucion, desde, hasta)
+    return StreamingResponse(
+        _exportService.export_trips(
+            admin=user,
+            formato=formato,
+            desde=desde,
+            hasta=hasta,
+            institucion=institucion,
+        ),
+        media_type=_exportService.MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+    )
+
+
+# Trabajos en segundo plano: se encolan y se consulta su estado
+@app.post(
+    "/api/v1/trabajos",
+    tags=["Trabajos"],
+    response_model=_trabajo.Trabajo,
+    status_code=202,
+)
+async def create_job(
+    job: _trabajo.TrabajoCreate,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _jobService.create_job(job=job, db=db, admin=user)
+
+
+@app.get(
+    "/api/v1/trabajos/{trabajo_id}",
+    tags=["Trabajos"],
+    response_model=_trabajo.Trabajo,
+)
+async def get_job(
+    trabajo_id: UUID,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return await _jobService.get_job(trabajo_id=trabajo_id, db=db, admin=user)
+
+
+@app.get("/api/v1/trabajos/{trabajo_id}/archivo", tags=["Trabajos"])
+async def get_job_file(
+    trabajo_id: UUID,
+    db: _orm.session = Depends(_databaseServices.get_db),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    contenido, nombre, media_type, tamano = await _jobService.job_file(
+        trabajo_id=trabajo_id, db=db, admin=user
+    )
+    return StreamingResponse(
+        contenido,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{nombre}"',
+            "Content-Length": str(tamano),
+        },
+    )
+
+
+@app.delete("/api/v1/estudiantes", tags=["Estudiante"], response_model=dict[str, str])
+async def delete_student(
     identification: str,
     db: _orm.session = Depends(_databaseServices.get_db),
-    user: _estudiante.Estudiante = Depends(_adminServices.get_current_user),
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
 ):
-    estudiante = _studentService.delete_student(
+    estudiante = await _studentService.delete_student(
         student_identification=identification, db=db, admin=user
     )
     return estudiante
 
 
 # Endpoints para la creación de administradores
-@app.post("/api/v1/administrador", tags=["Administrador"])
+@app.post("/api/v1/administrador", tags=["Administrador"], response_model=_admin.Admin)
 async def create_admin(
     admin: _admin.AdminCreate,
     db: _orm.session = Depends(_databaseServices.get_db),
@@ -127,7 +552,9 @@ async def create_admin(
     return user
 
 
-@app.delete("/api/v1/administrador", tags=["Administrador"])
+@app.delete(
+    "/api/v1/administrador", tags=["Administrador"], response_model=dict[str, str]
+)
 async def delete_admin(
     admin_id: str,
     db: _orm.session = Depends(_databaseServices.get_db),
@@ -137,3 +564,52 @@ async def delete_admin(
         admin_identification=admin_id, admin=user, db=db
     )
     return admin_deleted
+
+
+def _collect_cache_metrics():
+    principal = _adminServices.principal_cache.stats()
+    _metrics.cache_events_total.set(principal["hits"], cache="principal", result="hit")
+    _metrics.cache_events_total.set(
+        principal["misses"], cache="principal", result="miss"
+    )
+
+    estudiante = _studentService.student_cache.stats()
+    _metrics.cache_events_total.set(
+        estudiante["hits"], cache="estudiante", result="hit"
+    )
+    _metrics.cache_events_total.set(
+        estudiante["misses"], cache="estudiante", result="miss"
+    )
+
+    qr = _qrService.cache_info()
+    _metrics.cache_events_total.set(qr.hits, cache="qr", result="hit")
+    _metrics.cache_events_total.set(qr.misses, cache="qr", result="miss")
+
+
+_metrics.register_collector(_collect_cache_metrics)
+
+
+@app.get("/healthz", tags=["Sistema"])
+async def healthz(response: Response):
+    health = await _databaseServices.health()
+    if health["status"] != "ok":
+        response.status_code = 503
+    return health
+
+
+@app.get("/metrics", tags=["Sistema"], response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(
+        _metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/api/v1/cache/stats", tags=["Sistema"])
+async def cache_stats(
+    user: _admin.Admin = Depends(_adminServices.get_current_user),
+):
+    return {
+        "principal": _adminServices.principal_cache.stats(),
+        "estudiante": _studentService.student_cache.stats(),
+        "qr_version": _qrRevocationService.versions.stats(),
+    }
@@ -0,0 +1,55 @@
+# Tareas de operación que no corren al arrancar la API:
+#
+#   python manage.py init-db        crea o actualiza el esquema de la base
+#   python manage.py archive [...]  archiva viajes antiguos (ver services/archive_service)
+#   python manage.py worker [-n N]  procesa trabajos en segundo plano (services/job_service)
+import argparse
+import json
+import sys
+
+
+def init_db(args):
+    import services.database as _databaseServices
+
+    cambios = _databaseServices.upgrade_database()
+    print(json.dumps({"cambios": cambios}, ensure_ascii=False))
+
+
+def archive(args):
+    import services.archive_service as _archiveService
+
+    sys.argv = [sys.argv[0], *args.argumentos]
+    _archiveService.main()
+
+
+def worker(args):
+    import asyncio
+    import logging
+
+    import services.job_service as _jobService
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_jobService.serve(args.workers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tareas de operación")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    comandos.add_parser(
+        "init-db", help="Crea las tablas e índices que falten"
+    ).set_defaults(func=init_db)
+    archivar = comandos.add_parser("archive", help="Archiva viajes antiguos")
+    archivar.add_argument("argumentos", nargs=argparse.REMAINDER)
+    archivar.set_defaults(func=archive)
+    trabajos = comandos.add_parser("worker", help="Procesa trabajos en segundo plano")
+    trabajos.add_argument(
+        "-n", "--workers", type=int, help="Trabajos simultáneos (JOBS_WORKERS)"
+    )
+    trabajos.set_defaults(func=worker)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
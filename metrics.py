@@ -0,0 +1,290 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+
+# Métricas en formato de texto de Prometheus, sin dependencias externas. Los
+# valores son por proceso: con varios workers de uvicorn cada uno expone los suyos.
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+_registry: list = []
+_collectors: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(
+                    f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                )
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # [conteo por bucket..., +Inf, suma]
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def snapshot(self, **labels) -> tuple[int, float]:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                return 0, 0.0
+            return sum(counts[:-1]), counts[-1]
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            for key, counts in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts[:-1]):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(
+                        f"{self.name}_bucket"
+                        f"{_format_labels(self.labelnames, key, le)} {cumulative}"
+                    )
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {counts[-1]}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def register_collector(collector):
+    # `collector` se llama en cada scrape para refrescar métricas derivadas
+    # (p. ej. estadísticas de cachés) justo antes de renderizar
+    _collectors.append(collector)
+
+
+def render() -> str:
+    for collector in _collectors:
+        collector()
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+http_requests_total = Counter(
+    "http_requests_total", "Requests HTTP atendidos", ("method", "route", "status")
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Duración de los requests HTTP",
+    ("method", "route"),
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests HTTP en curso", ("method",)
+)
+db_queries_per_request = Histogram(
+    "db_queries_per_request",
+    "Sentencias SQL ejecutadas por request",
+    ("route",),
+    buckets=COUNT_BUCKETS,
+)
+db_time_per_request_seconds = Histogram(
+    "db_time_per_request_seconds",
+    "Tiempo total en la base de datos por request",
+    ("route",),
+)
+db_query_duration_seconds = Histogram(
+    "db_query_duration_seconds", "Duración de cada sentencia SQL"
+)
+db_pool_checkout_wait_seconds = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Espera para obtener una conexión del pool",
+)
+password_hashing_seconds = Histogram(
+    "password_hashing_seconds",
+    "Duración de bcrypt incluyendo la espera en el pool de hashing",
+    ("operation",),
+)
+cache_events_total = Counter(
+    "cache_events_total", "Aciertos y fallos por caché", ("cache", "result")
+)
+write_behind_pending = Gauge(
+    "write_behind_pending", "Descuentos confirmados pendientes de escribir en la base"
+)
+write_behind_flushed_total = Counter(
+    "write_behind_flushed_total", "Descuentos escritos en la base por el flusher"
+)
+write_behind_rejected_total = Counter(
+    "write_behind_rejected_total",
+    "Descuentos diferidos que la base rechazó y quedaron apartados",
+)
+login_throttled_total = Counter(
+    "login_throttled_total",
+    "Intentos de login rechazados por límite, por identificación o por IP",
+    ("scope",),
+)
+jobs_finished_total = Counter(
+    "jobs_finished_total",
+    "Intentos de trabajos en segundo plano terminados, por tipo y estado",
+    ("tipo", "estado"),
+)
+job_duration_seconds = Histogram(
+    "job_duration_seconds", "Duración de cada intento de un trabajo", ("tipo",)
+)
+
+
+# Estadísticas de base de datos del request en curso
+_request_db_stats: contextvars.ContextVar = contextvars.ContextVar(
+    "request_db_stats", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_start
+    db_query_duration_seconds.observe(elapsed)
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+
+
+def instrument_engine(engine):
+    import sqlalchemy as _sql
+
+    _sql.event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    _sql.event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@functools.cache
+def timed_pool(poolclass):
+    # Subclase del pool que mide cuánto se espera por una conexión
+    class TimedPool(poolclass):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                db_pool_checkout_wait_seconds.observe(time.perf_counter() - start)
+
+    TimedPool.__name__ = f"Timed{poolclass.__name__}"
+    return TimedPool
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in ("/metrics", "/healthz"):
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        stats = [0, 0.0]
+        token = _request_db_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec(method=method)
+            _request_db_stats.reset(token)
+
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            http_requests_total.inc(method=method, route=path, status=status)
+            http_request_duration_seconds.observe(elapsed, method=method, route=path)
+            db_queries_per_request.observe(stats[0], route=path)
+            db_time_per_request_seconds.observe(stats[1], route=path)
@@ -3,12 +3,10 @@ from uuid import uuid4 as _uuid4
 
 import sqlalchemy as _sql
 import sqlalchemy.orm as _orm
-from passlib.context import CryptContext
 from sqlalchemy.dialects.postgresql import UUID
 
 import database as _database
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import services.hashing_service as _hashingService
 
 
 class Estudiante(_database.Base):
@@ -26,7 +24,12 @@ class Estudiante(_database.Base):
     hashed_password = _sql.Column(_sql.String, nullable=False)
     numero_tiquetes = _sql.Column(_sql.Integer, default=0, nullable=False)
     numero_viajes = _sql.Column(_sql.Integer, default=0, nullable=False)
-    codigoQR = _sql.Column(_sql.String, nullable=False)
+    # Columna heredada: el QR ahora se genera bajo demanda en
+    # GET /api/v1/estudiantes/{identificacion}/qr y ya no se guarda por fila
+    codigoQR = _orm.deferred(_sql.Column(_sql.String, nullable=False, default=""))
+    # Versión del token firmado del QR; regenerar el QR la incrementa y revoca
+    # los tokens anteriores
+    version_qr = _sql.Column(_sql.Integer, default=1, nullable=False)
     fecha_creacion = _sql.Column(_sql.DateTime, default=_dt.datetime.utcnow)
     activo = _sql.Column(_sql.Boolean, default=True, nullable=False)
     actualiza = _sql.Column(
@@ -36,7 +39,38 @@ class Estudiante(_database.Base):
     viaje = _orm.relationship("Viaje", back_populates="estudiante")
 
     def verify_password(self, password: str) -> bool:
-        return pwd_context.verify(password, self.hashed_password)
+        return _hashingService.pwd_context().verify(password, self.hashed_password)
+
+
+def search_text():
+    # Texto en el que busca GET /api/v1/estudiantes/search. La consulta debe usar
+    # esta misma expresión para que Postgres aproveche el índice trigram.
+    espacio = _sql.literal_column("' '")
+    return (
+        Estudiante.identificacion
+        + espacio
+        + Estudiante.nombres
+        + espacio
+        + Estudiante.apellidos
+        + espacio
+        + Estudiante.institucion
+    ).self_group()
+
+
+# Solo Postgres (extensión pg_trgm); en otros motores la búsqueda usa el índice en
+# memoria de services/search_service.py
+_sql.Index(
+    "ix_estudiante_busqueda_trgm",
+    search_text().label("busqueda"),
+    postgresql_using="gin",
+    postgresql_ops={"busqueda": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
+
+_sql.event.listen(
+    _database.Base.metadata,
+    "before_create",
+    _sql.DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
 
 
 class Administrador(_database.Base):
@@ -60,11 +94,18 @@ class Administrador(_database.Base):
     viaje = _orm.relationship("Viaje", back_populates="administrador")
 
     def verify_password(self, password: str) -> bool:
-        return pwd_context.verify(password, self.hashed_password)
+        return _hashingService.pwd_context().verify(password, self.hashed_password)
 
 
 class Viaje(_database.Base):
     __tablename__ = "viaje"
+    __table_args__ = (
+        # viaje_id desempata la paginación del historial por (fecha_viaje, viaje_id)
+        _sql.Index(
+            "ix_viaje_estudiante_fecha_id", "estudiante_id", "fecha_viaje", "viaje_id"
+        ),
+        _sql.Index("ix_viaje_administrador_fecha", "administrador_id", "fecha_viaje"),
+    )
 
     viaje_id = _sql.Column(UUID(as_uuid=True), primary_key=True, default=_uuid4)
     fecha_viaje = _sql.Column(_sql.DateTime, default=_dt.datetime.utcnow)
@@ -79,6 +120,9 @@ class Viaje(_database.Base):
         _sql.ForeignKey("administrador.administrador_id"),
         nullable=False,
     )
+    # Clave generada por el dispositivo que escaneó; evita aplicar dos veces un
+    # escaneo sincronizado más de una vez
+    clave_idempotencia = _sql.Column(_sql.String, unique=True, nullable=True)
     fecha_creacion = _sql.Column(_sql.DateTime, default=_dt.datetime.utcnow)
     activo = _sql.Column(_sql.Boolean, default=True, nullable=False)
     actualiza = _sql.Column(
@@ -87,3 +131,96 @@ class Viaje(_database.Base):
 
     estudiante = _orm.relationship("Estudiante", back_populates="viaje")
     administrador = _orm.relationship("Administrador", back_populates="viaje")
+
+
+class ViajeResumenDiario(_database.Base):
+    # Conteo de viajes por día, institución y administrador. Se actualiza en la
+    # misma transacción que inserta cada viaje (services/report_service.py).
+    __tablename__ = "viaje_resumen_diario"
+
+    fecha = _sql.Column(_sql.Date, primary_key=True)
+    institucion = _sql.Column(_sql.String, primary_key=True)
+    administrador_id = _sql.Column(
+        UUID(as_uuid=True),
+        _sql.ForeignKey("administrador.administrador_id"),
+        primary_key=True,
+    )
+    total = _sql.Column(_sql.Integer, default=0, nullable=False)
+
+
+class Contador(_database.Base):
+    # Contadores del tablero (services/dashboard_service.py). Cada contador se
+    # reparte en varias filas (fragmentos) y cada cambio suma en una al azar:
+    # los descuentos simultáneos no esperan por el bloqueo de una misma fila.
+    # El valor es la suma de sus fragmentos.
+    __tablename__ = "contador"
+
+    nombre = _sql.Column(_sql.String, primary_key=True)
+    fragmento = _sql.Column(_sql.Integer, primary_key=True)
+    valor = _sql.Column(_sql.BigInteger, default=0, nullable=False)
+
+
+class Trabajo(_database.Base):
+    # Trabajo en segundo plano (services/job_service.py). `disponible_desde` es
+    # cuándo puede tomarlo un worker: el siguiente reintento si está pendiente, o
+    # el vencimiento de la reserva si está en curso, para recuperar los trabajos
+    # de un worker que se cayó.
+    __tablename__ = "trabajo"
+    __table_args__ = (
+        _sql.Index("ix_trabajo_estado_disponible", "estado", "disponible_desde"),
+    )
+
+    trabajo_id = _sql.Column(UUID(as_uuid=True), primary_key=True, default=_uuid4)
+    tipo = _sql.Column(_sql.String, nullable=False)
+    parametros = _sql.Column(_sql.JSON, nullable=False, default=dict)
+    # pendiente, en_curso, completado o fallido
+    estado = _sql.Column(_sql.String, nullable=False, default="pendiente")
+    intentos = _sql.Column(_sql.Integer, nullable=False, default=0)
+    max_intentos = _sql.Column(_sql.Integer, nullable=False, default=3)
+    disponible_desde = _sql.Column(
+        _sql.DateTime, nullable=False, default=_dt.datetime.utcnow
+    )
+    resultado = _sql.Column(_sql.JSON, nullable=True)
+    error = _sql.Column(_sql.String, nullable=True)
+    administrador_id = _sql.Column(
+        UUID(as_uuid=True),
+        _sql.ForeignKey("administrador.administrador_id"),
+        nullable=True,
+    )
+    fecha_inicio = _sql.Column(_sql.DateTime, nullable=True)
+    fecha_fin = _sql.Column(_sql.DateTime, nullable=True)
+    fecha_creacion = _sql.Column(_sql.DateTime, default=_dt.datetime.utcnow)
+    actualiza = _sql.Column(
+        _sql.DateTime, default=_dt.datetime.utcnow, onupdate=_dt.datetime.utcnow
+    )
+
+
+class TrabajoArchivo(_database.Base):
+    # Archivo generado por un trabajo, en partes de tamaño fijo. Se guarda en la
+    # base y no en disco para que cualquier proceso de la API pueda entregar lo
+    # que generó otro worker. `intento` separa las partes de dos workers que
+    # tomaron el mismo trabajo (reserva vencida).
+    __tablename__ = "trabajo_archivo"
+
+    trabajo_id = _sql.Column(
+        UUID(as_uuid=True),
+        _sql.ForeignKey("trabajo.trabajo_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    intento = _sql.Column(_sql.Integer, primary_key=True)
+    parte = _sql.Column(_sql.Integer, primary_key=True)
+    contenido = _sql.Column(_sql.LargeBinary, nullable=False)
+
+
+class RevocacionQR(_database.Base):
+    # Versión mínima aceptada del QR de un estudiante (services/
+    # qr_revocation_service.py). Sin llave foránea: la revocación de un
+    # estudiante eliminado debe sobrevivirle. `expira` es cuándo ya no queda
+    # ningún token emitido antes de la revocación.
+    __tablename__ = "qr_revocacion"
+    __table_args__ = (_sql.Index("ix_qr_revocacion_fecha", "fecha"),)
+
+    estudiante_id = _sql.Column(UUID(as_uuid=True), primary_key=True)
+    version_minima = _sql.Column(_sql.Integer, nullable=False)
+    fecha = _sql.Column(_sql.DateTime, nullable=False, default=_dt.datetime.utcnow)
+    expira = _sql.Column(_sql.DateTime, nullable=False)
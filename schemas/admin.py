@@ -45,3 +45,8 @@ class Admin(_AdminBase):
     administrador_id: UUID
 
     model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+class Token(_pydantic.BaseModel):
+    access_token: str
+    token_type: str
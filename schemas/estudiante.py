@@ -1,8 +1,9 @@
+import datetime as _dt
 import re
 from uuid import UUID
 
 import pydantic as _pydantic
-from pydantic import field_validator
+from pydantic import Field, field_validator, model_validator
 
 
 class _EstudianteBase(_pydantic.BaseModel):
@@ -44,6 +45,82 @@ class EstudianteCreate(_EstudianteBase):
 
 class Estudiante(_EstudianteBase):
     estudiante_id: UUID
-    codigo_QR: str
 
     model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+class EstudianteResumen(_EstudianteBase):
+    # Detalle de un estudiante: sin contraseña ni QR
+    estudiante_id: UUID
+    numero_tiquetes: int
+    numero_viajes: int
+    activo: bool
+
+    model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+class EstudianteListado(_pydantic.BaseModel):
+    # Fila del listado paginado; los datos de contacto quedan en el detalle
+    estudiante_id: UUID
+    tipo_identificacion: str
+    identificacion: str
+    nombres: str
+    apellidos: str
+    institucion: str
+    numero_tiquetes: int
+    activo: bool
+
+    model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+class RecargaTiquetes(_pydantic.BaseModel):
+    identificacion: str
+    tiquetes: int = Field(ge=0)
+
+
+class RecargaMasiva(_pydantic.BaseModel):
+    # Se envía una lista de recargas, o bien una institución y un número de
+    # tiquetes para todos sus estudiantes
+    recargas: list[RecargaTiquetes] | None = None
+    institucion: str | None = None
+    tiquetes: int | None = Field(default=None, ge=0)
+
+    @model_validator(mode="after")
+    def validate_recarga(self):
+        if self.recargas is None and self.institucion is None:
+            raise ValueError("Debe enviar 'recargas' o 'institucion'.")
+        if self.recargas is not None and self.institucion is not None:
+            raise ValueError("Envíe 'recargas' o 'institucion', no ambos.")
+        if self.institucion is not None and self.tiquetes is None:
+            raise ValueError("Debe indicar 'tiquetes' para la institución.")
+        return self
+
+
+class ResultadoRecarga(_pydantic.BaseModel):
+    actualizados: int
+    no_encontrados: list[str]
+
+
+class ErrorImportacion(_pydantic.BaseModel):
+    fila: int
+    identificacion: str | None = None
+    detalle: str
+
+
+class ResultadoImportacion(_pydantic.BaseModel):
+    procesados: int
+    insertados: int
+    errores: list[ErrorImportacion]
+
+
+class TokenQR(_pydantic.BaseModel):
+    token: str
+
+
+class ValidacionQR(_pydantic.BaseModel):
+    valido: bool
+    estudiante_id: UUID | None = None
+    identificacion: str | None = None
+    version: int | None = None
+    expira: _dt.datetime | None = None
+    motivo: str | None = None
@@ -0,0 +1,36 @@
+import datetime as _dt
+from uuid import UUID
+
+import pydantic as _pydantic
+
+
+class ConteoDia(_pydantic.BaseModel):
+    fecha: _dt.date
+    total: int
+
+    model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+class ConteoInstitucion(_pydantic.BaseModel):
+    institucion: str
+    total: int
+
+    model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+class ConteoAdministrador(_pydantic.BaseModel):
+    administrador_id: UUID
+    identificacion: str
+    nombres: str
+    apellidos: str
+    total: int
+
+    model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+class Dashboard(_pydantic.BaseModel):
+    estudiantes_activos: int
+    tiquetes_pendientes: int
+    fecha: _dt.date
+    viajes_hoy: int
+    viajes_por_administrador: list[ConteoAdministrador]
@@ -0,0 +1,64 @@
+import datetime as _dt
+from typing import Any, Literal
+from uuid import UUID
+
+import pydantic as _pydantic
+from pydantic import Field, model_validator
+
+
+class TrabajoCreate(_pydantic.BaseModel):
+    tipo: str
+    parametros: dict[str, Any] = Field(default_factory=dict)
+    max_intentos: int | None = Field(default=None, ge=1, le=10)
+
+
+class Trabajo(_pydantic.BaseModel):
+    trabajo_id: UUID
+    tipo: str
+    parametros: dict[str, Any]
+    estado: Literal["pendiente", "en_curso", "completado", "fallido"]
+    intentos: int
+    max_intentos: int
+    disponible_desde: _dt.datetime
+    resultado: dict[str, Any] | None = None
+    error: str | None = None
+    administrador_id: UUID | None = None
+    fecha_inicio: _dt.datetime | None = None
+    fecha_fin: _dt.datetime | None = None
+    fecha_creacion: _dt.datetime
+
+    model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+# Parámetros de cada tipo de trabajo
+
+
+class ParametrosRegenerarQR(_pydantic.BaseModel):
+    # Una lista de identificaciones, o todos los estudiantes de una institución
+    identificaciones: list[str] | None = Field(default=None, min_length=1)
+    institucion: str | None = None
+
+    @model_validator(mode="after")
+    def validate_destino(self):
+        if self.identificaciones is None and self.institucion is None:
+            raise ValueError("Debe enviar 'identificaciones' o 'institucion'.")
+        if self.identificaciones is not None and self.institucion is not None:
+            raise ValueError("Envíe 'identificaciones' o 'institucion', no ambos.")
+        return self
+
+
+class ParametrosReconstruirResumen(_pydantic.BaseModel):
+    desde: _dt.date
+    hasta: _dt.date
+
+
+class ParametrosExportar(_pydantic.BaseModel):
+    objeto: Literal["estudiantes", "viajes"]
+    formato: Literal["csv", "xlsx"] = "csv"
+    desde: _dt.date | None = None
+    hasta: _dt.date | None = None
+    institucion: str | None = None
+
+
+class SinParametros(_pydantic.BaseModel):
+    pass
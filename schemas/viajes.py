@@ -1,6 +1,9 @@
 import datetime as _dt
+from typing import Literal
 from uuid import UUID
+
 import pydantic as _pydantic
+from pydantic import Field
 
 
 class _ViajeBase(_pydantic.BaseModel):
@@ -14,11 +17,34 @@ class ViajeCreate(_ViajeBase):
 
 class Viaje(_ViajeBase):
     viaje_id: UUID
-    fecha_viaje: str
-    hora: str
+    fecha_viaje: _dt.datetime
+    hora: _dt.time
     estudiante_id: UUID
     administrador_id: UUID
     fecha_creacion: _dt.datetime
     activo: bool
 
     model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+class Escaneo(_pydantic.BaseModel):
+    clave: str = Field(min_length=1, max_length=128)
+    identificacion: str
+    fecha: _dt.datetime
+
+
+class SincronizacionEscaneos(_pydantic.BaseModel):
+    dispositivo: str | None = None
+    escaneos: list[Escaneo]
+
+
+class ResultadoEscaneo(_pydantic.BaseModel):
+    clave: str
+    estado: Literal["aplicado", "duplicado", "sin_tiquetes", "no_encontrado"]
+
+
+class ResultadoSincronizacion(_pydantic.BaseModel):
+    aplicados: int
+    duplicados: int
+    rechazados: int
+    resultados: list[ResultadoEscaneo]
@@ -1,45 +1,63 @@
-import os
 from datetime import datetime, timedelta
 from typing import Union
 
 import fastapi.security as _security
+import sqlalchemy as _sql
 import sqlalchemy.orm as _orm
-from dotenv import load_dotenv
 from fastapi import Depends, HTTPException
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 
+import config as _config
 import models as _models
 import schemas.admin as _admin
+import services.cache_service as _cacheServices
 import services.database as _databaseServices
+import services.hashing_service as _hashingService
 
-load_dotenv()
 
-ALGORITHM = os.getenv("ALGORITHM")
-JWT_SECRET = os.getenv("JWT_SECRET")
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+ALGORITHM = _config.getenv("ALGORITHM")
+JWT_SECRET = _config.getenv("JWT_SECRET")
 
 OAuth2_scheme = _security.OAuth2PasswordBearer("/api/v1/token")
 
+# Administradores autenticados recientemente, por identificación. Evita consultar
+# la base de datos en cada request protegido. Con varios workers debe ser
+# compartida (redis://...): así editar o eliminar un administrador invalida su
+# entrada en todos, no solo en el que atendió el cambio.
+PRINCIPAL_CACHE_URL = _config.getenv("PRINCIPAL_CACHE_URL")
+PRINCIPAL_CACHE_SIZE = int(_config.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+PRINCIPAL_CACHE_TTL = float(_config.getenv("PRINCIPAL_CACHE_TTL", "60"))
+
+principal_cache = _cacheServices.create_backend(
+    url=PRINCIPAL_CACHE_URL,
+    maxsize=PRINCIPAL_CACHE_SIZE,
+    ttl=PRINCIPAL_CACHE_TTL,
+    namespace="principal",
+)
+
 
 async def get_current_user(
     db: _orm.Session = Depends(_databaseServices.get_db),
     token: str = Depends(OAuth2_scheme),
 ):
+    # python-jose (y su backend criptográfico) se carga con el primer token
+    from jose import JWTError, jwt
+
     try:
         token_decode = jwt.decode(token, key=JWT_SECRET, algorithms=[ALGORITHM])
         user_id = token_decode.get("id")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token payload")
 
-        user = (
-            db.query(_models.Administrador)
-            .filter(_models.Administrador.identificacion == user_id)
-            .first()
-        )
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
+        cached = await principal_cache.get(user_id)
+        if cached is not None:
+            user = _admin.Admin.model_validate_json(cached)
+        else:
+            administrador = await get_admin_by_identification(id=user_id, db=db)
+            if administrador is None:
+                raise HTTPException(status_code=401, detail="User not found")
+
+            user = _admin.Admin.model_validate(administrador)
+            await principal_cache.set(user_id, user.model_dump_json())
 
     except JWTError:
         raise HTTPException(
@@ -70,12 +88,12 @@ async def create_admin(
         cargo=admin.cargo,
         empresa=admin.empresa,
         email=admin.email,
-        hashed_password=pwd_context.hash(admin.hashed_password),
+        hashed_password=await _hashingService.hash_password(admin.hashed_password),
     )
 
     db.add(admin_obj)
-    db.commit()
-    db.refresh(admin_obj)
+    await _databaseServices.commit(db)
+    await _databaseServices.refresh(db, admin_obj)
     return admin_obj
 
 
@@ -93,8 +111,9 @@ async def delete_admin(
             detail=f"El administrador con idenficación {admin_identification} no se encuentra registrada",
         )
 
-    db.delete(administrador)
-    db.commit()
+    await _databaseServices.delete(db, administrador)
+    await _databaseServices.commit(db)
+    await principal_cache.delete(administrador.identificacion)
 
     return {
         "detail": f"Administrador con identificación {administrador.identificacion} y nombre {administrador.nombres + ' ' + administrador.apellidos} fue eliminado exitosamente."
@@ -102,11 +121,13 @@ async def delete_admin(
 
 
 async def get_admin_by_identification(id: str, db: _orm.session):
-    return (
-        db.query(_models.Administrador)
-        .filter(_models.Administrador.identificacion == id)
-        .first()
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(_models.Administrador).where(
+            _models.Administrador.identificacion == id
+        ),
     )
+    return result.scalars().first()
 
 
 async def authenticate_admin(
@@ -121,7 +142,7 @@ async def authenticate_admin(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    if not user.verify_password(password):
+    if not await _hashingService.verify_password(password, user.hashed_password):
         raise HTTPException(
             status_code=401,
             detail="Could not validate credentials",
@@ -132,6 +153,8 @@ async def authenticate_admin(
 
 
 def create_token(data: dict, time_expire: Union[datetime, None] = None):
+    from jose import jwt
+
     data_copy = data.copy()
 
     if time_expire is None:
@@ -174,9 +197,12 @@ async def edit_admin(
     administrador.email = admin.email
 
     if admin.hashed_password:
-        administrador.hashed_password = pwd_context.hash(admin.hashed_password)
+        administrador.hashed_password = await _hashingService.hash_password(
+            admin.hashed_password
+        )
 
-    db.commit()
-    db.refresh(administrador)
+    await _databaseServices.commit(db)
+    await principal_cache.delete(administrador.identificacion)
+    await _databaseServices.refresh(db, administrador)
 
     return administrador
@@ -0,0 +1,368 @@
+import asyncio
+import csv
+import datetime as _dt
+import gzip
+import io
+import os
+from collections import Counter
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from fastapi.concurrency import run_in_threadpool
+
+import config as _config
+import models as _models
+import services.database as _databaseServices
+
+
+# Los viajes más antiguos que el horizonte salen de la tabla `viaje` hacia
+# archivos CSV comprimidos, uno por mes: ARCHIVE_DIR/viaje/AAAA-MM.csv.gz. Junto
+# a cada uno, AAAA-MM.estudiantes lista los estudiante_id con viajes en el mes:
+# el historial de un estudiante solo descomprime los meses en que aparece.
+ARCHIVE_DIR = _config.getenv("ARCHIVE_DIR", "archivo")
+ARCHIVE_HORIZON_DAYS = int(_config.getenv("ARCHIVE_HORIZON_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(_config.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+
+_COLUMNS = (
+    "viaje_id",
+    "estudiante_id",
+    "identificacion",
+    "institucion",
+    "administrador_id",
+    "fecha_viaje",
+    "hora",
+    "clave_idempotencia",
+    "fecha_creacion",
+    "activo",
+)
+
+
+def _directory() -> str:
+    return os.path.join(ARCHIVE_DIR, "viaje")
+
+
+def _month_path(mes: str) -> str:
+    return os.path.join(_directory(), f"{mes}.csv.gz")
+
+
+def _students_path(mes: str) -> str:
+    return os.path.join(_directory(), f"{mes}.estudiantes")
+
+
+def _cutoff_path() -> str:
+    return os.path.join(_directory(), "_corte")
+
+
+def cutoff() -> _dt.datetime | None:
+    # Fecha de corte del último archivado: solo los viajes anteriores a ella
+    # pueden estar en los archivos
+    try:
+        with open(_cutoff_path()) as f:
+            return _dt.datetime.fromisoformat(f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def _write_cutoff(corte: _dt.datetime):
+    actual = cutoff()
+    if actual is not None and actual >= corte:
+        return
+    os.makedirs(_directory(), exist_ok=True)
+    temporal = _cutoff_path() + ".tmp"
+    with open(temporal, "w") as f:
+        f.write(corte.isoformat())
+    os.replace(temporal, _cutoff_path())
+
+
+def _append_month(mes: str, rows: list[dict]):
+    # Cada ejecución agrega un miembro gzip al final del archivo del mes; gzip
+    # lee los miembros concatenados como un solo flujo
+    path = _month_path(mes)
+    nuevo = not os.path.exists(path)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=_COLUMNS)
+    if nuevo:
+        writer.writeheader()
+    writer.writerows(rows)
+
+    with open(path, "ab") as f:
+        f.write(gzip.compress(buffer.getvalue().encode()))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _append_students(mes: str, rows: list[dict]):
+    # Va antes que los viajes: una caída entre ambos deja un estudiante de más
+    # en la lista (se lee el mes sin encontrar nada), nunca uno de menos
+    estudiantes = dict.fromkeys(row["estudiante_id"] for row in rows)
+    with open(_students_path(mes), "a", encoding="utf-8") as f:
+        f.write("".join(f"{estudiante_id}\n" for estudiante_id in estudiantes))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_batch(rows: list[dict]):
+    os.makedirs(_directory(), exist_ok=True)
+    por_mes: dict[str, list[dict]] = {}
+    for row in rows:
+        por_mes.setdefault(row["fecha_viaje"][:7], []).append(row)
+    for mes, filas in por_mes.items():
+        _append_students(mes, filas)
+        _append_month(mes, filas)
+
+
+def _serialize(row) -> dict:
+    return {
+        "viaje_id": str(row.viaje_id),
+        "estudiante_id": str(row.estudiante_id),
+        "identificacion": row.identificacion,
+        "institucion": row.institucion,
+        "administrador_id": str(row.administrador_id),
+        "fecha_viaje": row.fecha_viaje.isoformat(),
+        "hora": row.hora.isoformat(),
+        "clave_idempotencia": row.clave_idempotencia or "",
+        "fecha_creacion": row.fecha_creacion.isoformat() if row.fecha_creacion else "",
+        "activo": int(row.activo),
+    }
+
+
+def _parse(row: dict) -> dict:
+    return {
+        "viaje_id": UUID(row["viaje_id"]),
+        "estudiante_id": UUID(row["estudiante_id"]),
+        "identificacion": row["identificacion"],
+        "institucion": row["institucion"],
+        "administrador_id": UUID(row["administrador_id"]),
+        "fecha_viaje": _dt.datetime.fromisoformat(row["fecha_viaje"]),
+        "hora": _dt.time.fromisoformat(row["hora"]),
+        "clave_idempotencia": row["clave_idempotencia"] or None,
+        "fecha_creacion": _dt.datetime.fromisoformat(row["fecha_creacion"])
+        if row["fecha_creacion"]
+        else None,
+        "activo": row["activo"] == "1",
+    }
+
+
+async def archive_trips(
+    db: _orm.session,
+    antes: _dt.datetime | None = None,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> dict:
+    if antes is None:
+        hoy = _dt.datetime.utcnow().date() - _dt.timedelta(days=ARCHIVE_HORIZON_DAYS)
+        antes = _dt.datetime.combine(hoy, _dt.time.min)
+
+    # El corte se publica antes de mover filas: mientras el archivado avanza los
+    # lectores consultan ambos lados y descartan repetidos por viaje_id
+    await run_in_threadpool(_write_cutoff, antes)
+
+    statement = (
+        _sql.select(
+            _models.Viaje.viaje_id,
+            _models.Viaje.estudiante_id,
+            _models.Estudiante.identificacion,
+            _models.Estudiante.institucion,
+            _models.Viaje.administrador_id,
+            _models.Viaje.fecha_viaje,
+            _models.Viaje.hora,
+            _models.Viaje.clave_idempotencia,
+            _models.Viaje.fecha_creacion,
+            _models.Viaje.activo,
+        )
+        .join(_models.Estudiante)
+        .where(_models.Viaje.fecha_viaje < antes)
+        .order_by(_models.Viaje.fecha_viaje, _models.Viaje.viaje_id)
+        .limit(batch_size)
+    )
+
+    archivados = 0
+    while True:
+        result = await _databaseServices.execute(db, statement)
+        rows = result.all()
+        if not rows:
+            break
+
+        # Primero el archivo (con fsync) y luego el DELETE: una caída entre
+        # ambos deja el lote repetido, nunca perdido
+        await run_in_threadpool(_write_batch, [_serialize(row) for row in rows])
+        await _databaseServices.execute(
+            db,
+            _sql.delete(_models.Viaje)
+            .where(_models.Viaje.viaje_id.in_([row.viaje_id for row in rows]))
+            .execution_options(synchronize_session=False),
+        )
+        await _databaseServices.commit(db)
+        archivados += len(rows)
+
+    return {"archivados": archivados, "antes": antes.isoformat()}
+
+
+def _months(desde: _dt.date | None, hasta: _dt.date | None) -> list[str]:
+    # Meses archivados dentro del rango, del más reciente al más antiguo
+    try:
+        nombres = os.listdir(_directory())
+    except FileNotFoundError:
+        return []
+    meses = sorted(
+        (n[: -len(".csv.gz")] for n in nombres if n.endswith(".csv.gz")),
+        reverse=True,
+    )
+    return [
+        mes
+        for mes in meses
+        if (desde is None or mes >= desde.strftime("%Y-%m"))
+        and (hasta is None or mes <= hasta.strftime("%Y-%m"))
+    ]
+
+
+def _read_month(mes: str):
+    with gzip.open(_month_path(mes), "rt", newline="") as f:
+        for row in csv.DictReader(f):
+            yield _parse(row)
+
+
+def _has_student(mes: str, estudiante_id: UUID) -> bool:
+    # Los meses archivados antes de que existiera la lista se leen completos
+    try:
+        with open(_students_path(mes), encoding="utf-8") as f:
+            return f"{estudiante_id}\n" in f.read()
+    except FileNotFoundError:
+        return True
+
+
+def covers(desde: _dt.date | None) -> bool:
+    # True si un rango que empieza en `desde` alcanza meses archivados
+    corte = cutoff()
+    return corte is not None and (desde is None or desde < corte.date())
+
+
+def _trip_history(
+    estudiante_id: UUID,
+    limit: int,
+    desde: _dt.date | None,
+    hasta: _dt.date | None,
+    after: tuple[_dt.datetime, UUID] | None,
+) -> list[dict]:
+    if after is not None:
+        hasta = min(hasta, after[0].date()) if hasta else after[0].date()
+
+    viajes: dict[UUID, dict] = {}
+    for mes in _months(desde, hasta):
+        if not _has_student(mes, estudiante_id):
+            continue
+        for viaje in _read_month(mes):
+            if viaje["estudiante_id"] != estudiante_id:
+                continue
+            fecha = viaje["fecha_viaje"]
+            if desde is not None and fecha.date() < desde:
+                continue
+            if hasta is not None and fecha.date() > hasta:
+                continue
+            if after is not None and (fecha, viaje["viaje_id"]) >= after:
+                continue
+            viajes[viaje["viaje_id"]] = viaje
+        # Los meses anteriores solo tienen viajes más antiguos
+        if len(viajes) >= limit:
+            break
+
+    ordenados = sorted(
+        viajes.values(), key=lambda v: (v["fecha_viaje"], v["viaje_id"]), reverse=True
+    )
+    return ordenados[:limit]
+
+
+async def trip_history(
+    estudiante_id: UUID,
+    limit: int,
+    desde: _dt.date | None = None,
+    hasta: _dt.date | None = None,
+    after: tuple[_dt.datetime, UUID] | None = None,
+) -> list[dict]:
+    return await run_in_threadpool(
+        _trip_history, estudiante_id, limit, desde, hasta, after
+    )
+
+
+def _month_trips(
+    mes: str,
+    desde: _dt.date | None,
+    hasta: _dt.date | None,
+    institucion: str | None,
+) -> list[dict]:
+    viajes = {}
+    for viaje in _read_month(mes):
+        fecha = viaje["fecha_viaje"].date()
+        if desde is not None and fecha < desde:
+            continue
+        if hasta is not None and fecha > hasta:
+            continue
+        if institucion is not None and viaje["institucion"] != institucion:
+            continue
+        viajes[viaje["viaje_id"]] = viaje
+    # Un mes puede tener varios miembros gzip (una ejecución cada uno)
+    return sorted(viajes.values(), key=lambda v: (v["fecha_viaje"], v["viaje_id"]))
+
+
+async def trips(
+    desde: _dt.date | None = None,
+    hasta: _dt.date | None = None,
+    institucion: str | None = None,
+    chunk_size: int = ARCHIVE_BATCH_SIZE,
+):
+    # Viajes archivados en el rango, del más antiguo al más reciente, en
+    # particiones de `chunk_size`. En memoria queda a lo sumo un mes.
+    for mes in reversed(_months(desde, hasta)):
+        viajes = await run_in_threadpool(_month_trips, mes, desde, hasta, institucion)
+        for inicio in range(0, len(viajes), chunk_size):
+            yield viajes[inicio : inicio + chunk_size]
+
+
+def _daily_counts(
+    desde: _dt.date, hasta: _dt.date, estudiante_id: UUID | None
+) -> Counter:
+    # {(fecha, institucion, administrador_id): viajes}, igual que el resumen diario
+    conteos = Counter()
+    vistos = set()
+    for mes in _months(desde, hasta):
+        if estudiante_id is not None and not _has_student(mes, estudiante_id):
+            continue
+        for viaje in _read_month(mes):
+            fecha = viaje["fecha_viaje"].date()
+            if fecha < desde or fecha > hasta or viaje["viaje_id"] in vistos:
+                continue
+            if estudiante_id is not None and viaje["estudiante_id"] != estudiante_id:
+                continue
+            vistos.add(viaje["viaje_id"])
+            conteos[(fecha, viaje["institucion"], viaje["administrador_id"])] += 1
+    return conteos
+
+
+async def daily_counts(
+    desde: _dt.date, hasta: _dt.date, estudiante_id: UUID | None = None
+) -> Counter:
+    return await run_in_threadpool(_daily_counts, desde, hasta, estudiante_id)
+
+
+def main():
+    import argparse
+    import json
+
+    import database as _database
+
+    parser = argparse.ArgumentParser(
+        description="Archiva los viajes anteriores al horizonte en ARCHIVE_DIR"
+    )
+    parser.add_argument("--horizonte-dias", type=int, default=ARCHIVE_HORIZON_DAYS)
+    parser.add_argument("--lote", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    hoy = _dt.datetime.utcnow().date() - _dt.timedelta(days=args.horizonte_dias)
+    antes = _dt.datetime.combine(hoy, _dt.time.min)
+    with _database.SessionLocal() as db:
+        resultado = asyncio.run(archive_trips(db, antes=antes, batch_size=args.lote))
+    print(json.dumps(resultado))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import datetime as _dt
+import random
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql as _postgresql
+from sqlalchemy.dialects import sqlite as _sqlite
+
+import config as _config
+import models as _models
+import services.database as _databaseServices
+import services.report_service as _reportService
+from schemas import admin as _admin
+from schemas import reportes as _reportes
+
+# GET /api/v1/dashboard lee contadores mantenidos en cada cambio, no agregados
+# sobre estudiante y viaje: su costo no depende del tamaño de las tablas. Los
+# viajes salen del resumen diario (viaje_resumen_diario).
+# Filas por contador; más fragmentos, menos espera entre descuentos simultáneos
+DASHBOARD_COUNTER_SHARDS = int(_config.getenv("DASHBOARD_COUNTER_SHARDS", "8"))
+# Cada cuánto se encola la conciliación de los contadores contra las tablas
+# (trabajo conciliar_contadores); 0 la desactiva
+DASHBOARD_RECONCILE_SECONDS = float(
+    _config.getenv("DASHBOARD_RECONCILE_SECONDS", "300")
+)
+
+ESTUDIANTES_ACTIVOS = "estudiantes_activos"
+TIQUETES_PENDIENTES = "tiquetes_pendientes"
+
+_CONTADOR = _models.Contador.__table__
+
+_UPSERTS = {"postgresql": _postgresql.insert, "sqlite": _sqlite.insert}
+
+
+async def _add_rows(db: _orm.session, rows: list[dict]):
+    if not rows:
+        return
+
+    upsert = _UPSERTS.get(db.bind.dialect.name)
+    if upsert is not None:
+        statement = upsert(_CONTADOR)
+        statement = statement.on_conflict_do_update(
+            index_elements=["nombre", "fragmento"],
+            set_={"valor": _CONTADOR.c.valor + statement.excluded.valor},
+        )
+        await _databaseServices.execute(db, statement, rows)
+        return
+
+    for row in rows:
+        result = await _databaseServices.execute(
+            db,
+            _sql.update(_CONTADOR)
+            .where(
+                _CONTADOR.c.nombre == row["nombre"],
+                _CONTADOR.c.fragmento == row["fragmento"],
+            )
+            .values(valor=_CONTADOR.c.valor + row["valor"]),
+        )
+        if result.rowcount == 0:
+            await _databaseServices.execute(db, _sql.insert(_CONTADOR), row)
+
+
+async def add(
+    db: _orm.session, estudiantes_activos: int = 0, tiquetes_pendientes: int = 0
+):
+    # Se llama dentro de la transacción del cambio, antes del commit: el
+    # contador se confirma o se descarta junto con él
+    deltas = {
+        ESTUDIANTES_ACTIVOS: estudiantes_activos,
+        TIQUETES_PENDIENTES: tiquetes_pendientes,
+    }
+    await _add_rows(
+        db,
+        [
+            {
+                "nombre": nombre,
+                "fragmento": random.randrange(DASHBOARD_COUNTER_SHARDS),
+                "valor": delta,
+            }
+            for nombre, delta in deltas.items()
+            if delta
+        ],
+    )
+
+
+async def reconcile(db: _orm.session) -> dict:
+    # Corrige los contadores con los valores reales, p. ej. tras cambios hechos
+    # fuera de la API o en una base que ya tenía datos. Reales y contadores se
+    # leen en una sola sentencia, así la diferencia no incluye cambios a medias.
+    reales = {
+        ESTUDIANTES_ACTIVOS: _sql.select(_sql.func.count())
+        .where(_models.Estudiante.activo)
+        .scalar_subquery(),
+        TIQUETES_PENDIENTES: _sql.select(
+            _sql.func.coalesce(_sql.func.sum(_models.Estudiante.numero_tiquetes), 0)
+        ).scalar_subquery(),
+    }
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(
+            *(
+                (
+                    real
+                    - _sql.select(
+                        _sql.func.coalesce(_sql.func.sum(_CONTADOR.c.valor), 0)
+                    )
+                    .where(_CONTADOR.c.nombre == nombre)
+                    .scalar_subquery()
+                ).label(nombre)
+                for nombre, real in reales.items()
+            )
+        ),
+    )
+    diferencias = {
+        nombre: int(valor) for nombre, valor in result.one()._mapping.items()
+    }
+    await _add_rows(
+        db,
+        [
+            {"nombre": nombre, "fragmento": 0, "valor": diferencia}
+            for nombre, diferencia in diferencias.items()
+            if diferencia
+        ],
+    )
+    await _databaseServices.commit(db)
+    return {"correcciones": diferencias}
+
+
+async def get_dashboard(db: _orm.session, admin: _admin.Admin) -> _reportes.Dashboard:
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(_CONTADOR.c.nombre, _sql.func.sum(_CONTADOR.c.valor)).group_by(
+            _CONTADOR.c.nombre
+        ),
+    )
+    contadores = {nombre: int(valor) for nombre, valor in result}
+
+    hoy = _dt.datetime.utcnow().date()
+    por_administrador = await _reportService.trips_per_admin(
+        db=db, admin=admin, desde=hoy, hasta=hoy
+    )
+    return _reportes.Dashboard(
+        estudiantes_activos=contadores.get(ESTUDIANTES_ACTIVOS, 0),
+        tiquetes_pendientes=contadores.get(TIQUETES_PENDIENTES, 0),
+        fecha=hoy,
+        viajes_hoy=sum(conteo.total for conteo in por_administrador),
+        viajes_por_administrador=por_administrador,
+    )
@@ -1,12 +1,211 @@
+import time
+
+import sqlalchemy as _sql
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
 import database as _database
+import metrics as _metrics
+
+
+# Índices que reemplazó otro en models.py y que upgrade_database elimina
+_OBSOLETE_INDEXES = {"viaje": ("ix_viaje_estudiante_fecha",)}
+
 
 def create_database():
+    import models  # noqa: F401  registra las tablas en Base.metadata
+
     return _database.Base.metadata.create_all(bind=_database.engine)
 
 
-def get_db():
+def _add_column(conn, table, column):
+    dialect = conn.dialect
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+    ddl += column.type.compile(dialect=dialect)
+    default = column.default.arg if column.default is not None else None
+    if default is not None and not callable(default):
+        literal = _sql.literal(default, column.type).compile(
+            dialect=dialect, compile_kwargs={"literal_binds": True}
+        )
+        ddl += f" DEFAULT {literal}"
+    elif not column.nullable:
+        raise RuntimeError(
+            f"No se puede agregar {table.name}.{column.name}: NOT NULL sin valor "
+            "por defecto"
+        )
+    if not column.nullable:
+        ddl += " NOT NULL"
+    conn.execute(_sql.text(ddl))
+
+    # ADD COLUMN no admite UNIQUE en todos los motores: se crea como índice único
+    if column.unique:
+        _sql.Index(f"uq_{table.name}_{column.name}", column, unique=True).create(conn)
+
+
+def upgrade_database() -> list[str]:
+    # Lleva una base existente al esquema de models.py sin borrar datos: crea las
+    # tablas e índices que falten, agrega columnas nuevas y quita índices
+    # obsoletos. Es idempotente; se ejecuta como paso del despliegue
+    # (`python manage.py init-db`), no al arrancar la aplicación.
+    import models  # noqa: F401  registra las tablas en Base.metadata
+
+    cambios = []
+    with _database.engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(_sql.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        existentes = set(_sql.inspect(conn).get_table_names())
+        for table in _database.Base.metadata.sorted_tables:
+            if table.name not in existentes:
+                table.create(conn)
+                cambios.append(f"tabla {table.name}")
+                continue
+
+            inspector = _sql.inspect(conn)
+            columnas = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columnas:
+                    _add_column(conn, table, column)
+                    cambios.append(f"columna {table.name}.{column.name}")
+
+            indices = {i["name"] for i in _sql.inspect(conn).get_indexes(table.name)}
+            for index in table.indexes:
+                # Índices propios de otro motor (opciones postgresql_*), p. ej.
+                # el trigram de Postgres
+                motores = {clave.split("_", 1)[0] for clave in index.dialect_kwargs}
+                if motores - {conn.dialect.name}:
+                    continue
+                if index.name not in indices:
+                    index.create(conn)
+                    cambios.append(f"índice {index.name}")
+            for nombre in _OBSOLETE_INDEXES.get(table.name, ()):
+                if nombre in indices:
+                    conn.execute(_sql.text(f"DROP INDEX {nombre}"))
+                    cambios.append(f"sin índice {nombre}")
+    return cambios
+
+
+async def get_db():
+    if _database.DATABASE_ASYNC:
+        async with _database.AsyncSessionLocal() as db:
+            yield db
+        return
+
     db = _database.SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await run_in_threadpool(db.close)
+
+
+# Las siguientes funciones permiten que los servicios esperen (await) las
+# operaciones de base de datos sin importar el modo configurado. En modo síncrono
+# la llamada se ejecuta en el threadpool para no bloquear el event loop.
+
+
+async def execute(db, statement, params=None):
+    if isinstance(db, AsyncSession):
+        return await db.execute(statement, params)
+    return await run_in_threadpool(db.execute, statement, params)
+
+
+async def commit(db):
+    if isinstance(db, AsyncSession):
+        return await db.commit()
+    return await run_in_threadpool(db.commit)
+
+
+async def rollback(db):
+    if isinstance(db, AsyncSession):
+        return await db.rollback()
+    return await run_in_threadpool(db.rollback)
+
+
+async def refresh(db, instance):
+    if isinstance(db, AsyncSession):
+        return await db.refresh(instance)
+    return await run_in_threadpool(db.refresh, instance)
+
+
+async def delete(db, instance):
+    if isinstance(db, AsyncSession):
+        return await db.delete(instance)
+    return await run_in_threadpool(db.delete, instance)
+
+
+async def stream(statement, chunk_size: int = 500):
+    # Recorre el resultado con un cursor del lado del servidor (yield_per) usando
+    # su propia sesión: las dependencias con yield se cierran antes de que
+    # StreamingResponse termine de enviar el cuerpo.
+    statement = statement.execution_options(yield_per=chunk_size)
+
+    if _database.DATABASE_ASYNC:
+        async with _database.AsyncSessionLocal() as db:
+            result = await db.stream(statement)
+            async for partition in result.partitions():
+                yield partition
+        return
+
+    db = _database.SessionLocal()
+    try:
+        result = await run_in_threadpool(db.execute, statement)
+        partitions = result.partitions()
+        while True:
+            partition = await run_in_threadpool(next, partitions, None)
+            if partition is None:
+                break
+            yield partition
+    finally:
+        await run_in_threadpool(db.close)
+
+
+def _pool_stats(pool) -> dict:
+    stats = {"class": type(pool).__name__}
+    if isinstance(pool, _sql.pool.QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+        )
+    return stats
+
+
+def pool_stats() -> dict:
+    pools = {"sync": _pool_stats(_database.engine.pool)}
+    if _database.async_engine is not None:
+        pools["async"] = _pool_stats(_database.async_engine.pool)
+
+    count, total = _metrics.db_pool_checkout_wait_seconds.snapshot()
+    pools["checkout_wait"] = {
+        "count": count,
+        "total_seconds": round(total, 6),
+        "avg_ms": round(total / count * 1000, 3) if count else 0.0,
+    }
+    return pools
+
+
+async def health() -> dict:
+    start = time.perf_counter()
+    try:
+        if _database.DATABASE_ASYNC:
+            async with _database.async_engine.connect() as conn:
+                await conn.execute(_sql.text("SELECT 1"))
+        else:
+
+            def ping():
+                with _database.engine.connect() as conn:
+                    conn.execute(_sql.text("SELECT 1"))
+
+            await run_in_threadpool(ping)
+        database = {"status": "ok"}
+    except Exception as e:
+        database = {"status": "error", "error": type(e).__name__}
+    database["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+    return {
+        "status": database["status"],
+        "database": database,
+        "pool": pool_stats(),
+    }
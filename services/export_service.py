@@ -0,0 +1,325 @@
+import contextlib
+import csv
+import datetime as _dt
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+import sqlalchemy as _sql
+from fastapi import HTTPException
+
+import config as _config
+import models as _models
+import services.archive_service as _archiveService
+import services.database as _databaseServices
+from schemas import admin as _admin
+
+# Exportaciones de estudiantes y viajes en CSV o XLSX. Las filas se leen con un
+# cursor del lado del servidor (yield_per) y cada partición se escribe y se envía
+# antes de leer la siguiente, así la memoria no depende del número de filas.
+EXPORT_CHUNK_SIZE = int(_config.getenv("EXPORT_CHUNK_SIZE", "2000"))
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+_ESTUDIANTE_COLUMNS = (
+    _models.Estudiante.tipo_identificacion,
+    _models.Estudiante.identificacion,
+    _models.Estudiante.nombres,
+    _models.Estudiante.apellidos,
+    _models.Estudiante.institucion,
+    _models.Estudiante.email,
+    _models.Estudiante.telefono,
+    _models.Estudiante.numero_tiquetes,
+    _models.Estudiante.numero_viajes,
+    _models.Estudiante.activo,
+    _models.Estudiante.fecha_creacion,
+)
+
+_VIAJE_COLUMNS = (
+    _models.Viaje.viaje_id,
+    _models.Viaje.fecha_viaje,
+    _models.Estudiante.identificacion,
+    _models.Estudiante.nombres,
+    _models.Estudiante.apellidos,
+    _models.Estudiante.institucion,
+    _models.Administrador.identificacion.label("administrador"),
+)
+
+
+def _value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (_dt.date, _dt.time)):
+        return value.isoformat()
+    return value
+
+
+class _Sink(io.RawIOBase):
+    # Destino no buscable de zipfile: acumula lo escrito hasta que se envía.
+    # zipfile detecta que no puede hacer seek y escribe descriptores de datos
+    # después de cada archivo en lugar de reescribir los encabezados.
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" '
+        'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+        'relationships"><Relationship Id="rId1" Type="http://schemas.'
+        "openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+        '" Target="xl/workbook.xml"/></Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+        ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/'
+        'relationships"><sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/>'
+        "</sheets></workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+        'relationships"><Relationship Id="rId1" Type="http://schemas.'
+        "openxmlformats.org/officeDocument/2006/relationships/worksheet"
+        '" Target="worksheets/sheet1.xml"/></Relationships>'
+    ),
+}
+
+# Caracteres que XML 1.0 no admite, ni siquiera escapados
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_cell(value) -> str:
+    value = _value(value)
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f"<c><v>{value}</v></c>"
+    texto = escape(_INVALID_XML.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _xlsx_rows(rows) -> str:
+    return "".join(
+        "<row>" + "".join(_xlsx_cell(value) for value in row) + "</row>" for row in rows
+    )
+
+
+async def _xlsx(encabezado: list[str], particiones, hoja: str):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as libro:
+        for nombre, contenido in _XLSX_PARTS.items():
+            libro.writestr(nombre, contenido.replace("{hoja}", escape(hoja)))
+
+        # force_zip64: el tamaño de la hoja no se conoce al empezar a escribirla
+        with libro.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/'
+                b'spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_rows([encabezado]).encode())
+            yield sink.drain()
+            async for partition in particiones:
+                sheet.write(_xlsx_rows(partition).encode())
+                yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+async def _csv(encabezado: list[str], particiones):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel abra el CSV como UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(encabezado)
+    async for partition in particiones:
+        writer.writerows([_value(value) for value in row] for row in partition)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+async def _chain(*iterables):
+    for iterable in iterables:
+        async for item in iterable:
+            yield item
+
+
+def _render(statement, formato: str, hoja: str, anteriores=None):
+    # `anteriores`: particiones que se envían antes de las de la consulta
+    encabezado = [column.name for column in statement.selected_columns]
+    particiones = _databaseServices.stream(statement, chunk_size=EXPORT_CHUNK_SIZE)
+    if anteriores is not None:
+        particiones = _chain(anteriores, particiones)
+    if formato == "xlsx":
+        return _xlsx(encabezado, particiones, hoja)
+    return _csv(encabezado, particiones)
+
+
+def students_statement(institucion: str | None = None):
+    statement = _sql.select(*_ESTUDIANTE_COLUMNS).order_by(
+        _models.Estudiante.identificacion
+    )
+    if institucion is not None:
+        statement = statement.where(_models.Estudiante.institucion == institucion)
+    return statement
+
+
+def trips_statement(
+    desde: _dt.date | None = None,
+    hasta: _dt.date | None = None,
+    institucion: str | None = None,
+):
+    if desde is not None and hasta is not None and desde > hasta:
+        raise HTTPException(
+            status_code=400, detail="'desde' debe ser anterior o igual a 'hasta'"
+        )
+
+    statement = (
+        _sql.select(*_VIAJE_COLUMNS)
+        .join(_models.Estudiante, _models.Viaje.estudiante)
+        .join(_models.Administrador, _models.Viaje.administrador)
+        .order_by(_models.Viaje.fecha_viaje, _models.Viaje.viaje_id)
+    )
+    if desde is not None:
+        statement = statement.where(
+            _models.Viaje.fecha_viaje >= _dt.datetime.combine(desde, _dt.time.min)
+        )
+    if hasta is not None:
+        fin = _dt.datetime.combine(hasta + _dt.timedelta(days=1), _dt.time.min)
+        statement = statement.where(_models.Viaje.fecha_viaje < fin)
+    if institucion is not None:
+        statement = statement.where(_models.Estudiante.institucion == institucion)
+    return statement
+
+
+async def _archived_trips(
+    desde: _dt.date | None, hasta: _dt.date | None, institucion: str | None
+):
+    # Viajes ya archivados (services/archive_service.py), en las mismas columnas
+    # que trips_statement. El archivo guarda ids: nombres y administrador se
+    # buscan por partición.
+    async with contextlib.asynccontextmanager(_databaseServices.get_db)() as db:
+        async for viajes in _archiveService.trips(
+            desde, hasta, institucion, chunk_size=EXPORT_CHUNK_SIZE
+        ):
+            # Mientras el archivado avanza un viaje puede estar en ambos lados:
+            # se exporta la copia de la tabla
+            result = await _databaseServices.execute(
+                db,
+                _sql.select(_models.Viaje.viaje_id).where(
+                    _models.Viaje.viaje_id.in_([v["viaje_id"] for v in viajes])
+                ),
+            )
+            en_tabla = set(result.scalars().all())
+            viajes = [v for v in viajes if v["viaje_id"] not in en_tabla]
+            if not viajes:
+                continue
+
+            result = await _databaseServices.execute(
+                db,
+                _sql.select(
+                    _models.Estudiante.estudiante_id,
+                    _models.Estudiante.nombres,
+                    _models.Estudiante.apellidos,
+                ).where(
+                    _models.Estudiante.estudiante_id.in_(
+                        {v["estudiante_id"] for v in viajes}
+                    )
+                ),
+            )
+            estudiantes = {row.estudiante_id: row for row in result}
+            result = await _databaseServices.execute(
+                db,
+                _sql.select(
+                    _models.Administrador.administrador_id,
+                    _models.Administrador.identificacion,
+                ).where(
+                    _models.Administrador.administrador_id.in_(
+                        {v["administrador_id"] for v in viajes}
+                    )
+                ),
+            )
+            administradores = dict(result.all())
+
+            filas = []
+            for v in viajes:
+                # El estudiante pudo eliminarse después de archivar el viaje
+                estudiante = estudiantes.get(v["estudiante_id"])
+                filas.append(
+                    (
+                        v["viaje_id"],
+                        v["fecha_viaje"],
+                        v["identificacion"],
+                        estudiante.nombres if estudiante else None,
+                        estudiante.apellidos if estudiante else None,
+                        v["institucion"],
+                        administradores.get(v["administrador_id"]),
+                    )
+                )
+            yield filas
+
+
+def filename(nombre: str, formato: str, *partes) -> str:
+    sufijo = "_".join(str(parte) for parte in partes if parte is not None)
+    sufijo = re.sub(r"[^\w.-]+", "-", sufijo)
+    return f"{nombre}_{sufijo}.{formato}" if sufijo else f"{nombre}.{formato}"
+
+
+def export_students(
+    admin: _admin.Admin, formato: str = "csv", institucion: str | None = None
+):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return _render(students_statement(institucion), formato, "Estudiantes")
+
+
+def export_trips(
+    admin: _admin.Admin,
+    formato: str = "csv",
+    desde: _dt.date | None = None,
+    hasta: _dt.date | None = None,
+    institucion: str | None = None,
+):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    statement = trips_statement(desde, hasta, institucion)
+    # Los viajes anteriores al corte del archivado salen primero, de los archivos
+    anteriores = (
+        _archived_trips(desde, hasta, institucion)
+        if _archiveService.covers(desde)
+        else None
+    )
+    return _render(statement, formato, "Viajes", anteriores)
@@ -0,0 +1,121 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+import config as _config
+import metrics as _metrics
+
+
+# "process" evita el GIL durante bcrypt; "thread" es más liviano para pocos núcleos
+HASHING_EXECUTOR = _config.getenv("HASHING_EXECUTOR", "thread").lower()
+HASHING_WORKERS = int(_config.getenv("HASHING_WORKERS", str(os.cpu_count() or 2)))
+# Máximo de operaciones en espera o en curso antes de responder 503
+HASHING_MAX_PENDING = int(_config.getenv("HASHING_MAX_PENDING", "64"))
+
+
+@functools.cache
+def pwd_context():
+    # Único CryptContext del proceso; passlib y bcrypt se cargan con el primer hash
+    # y no al importar la aplicación
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+_executor: Executor | None = None
+_executor_lock = threading.Lock()
+_pending = 0
+
+
+def _hash(password: str) -> str:
+    return pwd_context().hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return pwd_context().verify(password, hashed_password)
+
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if HASHING_EXECUTOR == "process":
+                    _executor = ProcessPoolExecutor(max_workers=HASHING_WORKERS)
+                else:
+                    _executor = ThreadPoolExecutor(
+                        max_workers=HASHING_WORKERS, thread_name_prefix="hashing"
+                    )
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def pending() -> int:
+    return _pending
+
+
+async def _submit(fn, operation: str, *args):
+    global _pending
+    if _pending >= HASHING_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="El servidor está ocupado, intente de nuevo en unos segundos",
+            headers={"Retry-After": "1"},
+        )
+
+    _pending += 1
+    start = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), fn, *args)
+    finally:
+        _pending -= 1
+        _metrics.password_hashing_seconds.observe(
+            time.perf_counter() - start, operation=operation
+        )
+
+
+async def hash_password(password: str) -> str:
+    return await _submit(_hash, "hash", password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await _submit(_verify, "verify", password, hashed_password)
+
+
+def _hash_many(passwords: list[str]) -> list[str]:
+    return [pwd_context().hash(password) for password in passwords]
+
+
+async def hash_many(passwords: list[str]) -> list[str]:
+    # Para cargas masivas: reparte el lote en a lo sumo la mitad de los workers,
+    # así los logins siguen teniendo workers libres. No aplica HASHING_MAX_PENDING
+    # porque quien llama ya espera el resultado del lote completo.
+    if not passwords:
+        return []
+
+    parts = max(1, min(HASHING_WORKERS // 2, len(passwords)))
+    size = -(-len(passwords) // parts)
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(get_executor(), _hash_many, passwords[i : i + size])
+            for i in range(0, len(passwords), size)
+        )
+    )
+    _metrics.password_hashing_seconds.observe(
+        time.perf_counter() - start, operation="hash_many"
+    )
+    return [hashed for part in results for hashed in part]
@@ -0,0 +1,536 @@
+import asyncio
+import contextlib
+import datetime as _dt
+import logging
+import signal
+import time
+from uuid import UUID
+
+import pydantic as _pydantic
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from fastapi import HTTPException
+
+import config as _config
+import metrics as _metrics
+import models as _models
+import services.dashboard_service as _dashboardService
+import services.database as _databaseServices
+import services.export_service as _exportService
+import services.report_service as _reportService
+import services.student_service as _studentService
+from schemas import admin as _admin
+from schemas import trabajo as _trabajo
+
+# Trabajos en segundo plano guardados en la tabla trabajo: el handler HTTP
+# encola y responde 202, y un pool de JOBS_WORKERS tareas por proceso los
+# ejecuta. Con JOBS_WORKERS=0 la API solo encola y los trabajos corren en un
+# proceso aparte (python manage.py worker), que se escala sin tocar los workers
+# de uvicorn. Varios procesos pueden tomar trabajos de la misma tabla.
+JOBS_WORKERS = int(_config.getenv("JOBS_WORKERS", "2"))
+# Espera máxima entre consultas cuando no hay trabajos; al encolar en el mismo
+# proceso se despierta a los workers sin esperar
+JOBS_POLL_SECONDS = float(_config.getenv("JOBS_POLL_SECONDS", "1"))
+JOBS_MAX_ATTEMPTS = int(_config.getenv("JOBS_MAX_ATTEMPTS", "3"))
+# Espera antes del primer reintento; se duplica en cada intento fallido
+JOBS_RETRY_SECONDS = float(_config.getenv("JOBS_RETRY_SECONDS", "30"))
+JOBS_RETRY_MAX_SECONDS = 3600
+# Un trabajo en curso por más tiempo se considera abandonado (el worker se
+# cayó) y otro worker lo vuelve a tomar
+JOBS_LEASE_SECONDS = float(_config.getenv("JOBS_LEASE_SECONDS", "900"))
+# Los archivos de las exportaciones se guardan en la tabla trabajo_archivo, en
+# partes de este tamaño
+JOBS_FILE_PART_BYTES = 1 << 20
+
+_logger = logging.getLogger(__name__)
+
+_ACTIVOS = ("pendiente", "en_curso")
+
+_Trabajo = _models.Trabajo
+
+
+class JobError(Exception):
+    # Falla que no se resuelve reintentando; el trabajo pasa a fallido de una vez
+    pass
+
+
+# tipo -> (handler, modelo de los parámetros)
+_handlers: dict[str, tuple] = {}
+
+
+def register(tipo: str, parametros: type[_pydantic.BaseModel]):
+    # Un handler recibe (trabajo, parametros, db, admin) y devuelve un dict con
+    # el resultado. `admin` es quien encoló el trabajo, o None.
+    def decorator(handler):
+        _handlers[tipo] = (handler, parametros)
+        return handler
+
+    return decorator
+
+
+# tipo -> segundos entre ejecuciones de los trabajos periódicos
+_periodicos: dict[str, float] = {}
+
+
+def schedule(tipo: str, segundos: float):
+    # Encola `tipo` (sin parámetros) al arrancar y luego cada `segundos`, salvo
+    # que ya haya uno pendiente o en curso
+    if segundos > 0:
+        _periodicos[tipo] = segundos
+
+
+_workers: list[asyncio.Task] = []
+_scheduler: asyncio.Task | None = None
+_nuevo = asyncio.Event()
+
+
+def _session():
+    return contextlib.asynccontextmanager(_databaseServices.get_db)()
+
+
+def _validation_detail(error: _pydantic.ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(parte) for parte in item['loc']) or 'parametros'}: "
+        f"{item['msg']}"
+        for item in error.errors()
+    )
+
+
+async def enqueue(
+    db: _orm.session,
+    tipo: str,
+    parametros: dict,
+    admin: _admin.Admin | None,
+    max_intentos: int | None = None,
+) -> _trabajo.Trabajo:
+    if tipo not in _handlers:
+        raise HTTPException(
+            status_code=400, detail=f"Tipo de trabajo desconocido: {tipo}"
+        )
+    try:
+        parametros = _handlers[tipo][1].model_validate(parametros)
+    except _pydantic.ValidationError as error:
+        raise HTTPException(status_code=400, detail=_validation_detail(error))
+
+    trabajo = _Trabajo(
+        tipo=tipo,
+        parametros=parametros.model_dump(mode="json"),
+        estado="pendiente",
+        intentos=0,
+        max_intentos=max_intentos or JOBS_MAX_ATTEMPTS,
+        disponible_desde=_dt.datetime.utcnow(),
+        administrador_id=admin.administrador_id if admin else None,
+    )
+    db.add(trabajo)
+    await _databaseServices.commit(db)
+    await _databaseServices.refresh(db, trabajo)
+    _nuevo.set()
+    return _trabajo.Trabajo.model_validate(trabajo)
+
+
+async def create_job(
+    job: _trabajo.TrabajoCreate, db: _orm.session, admin: _admin.Admin
+) -> _trabajo.Trabajo:
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return await enqueue(db, job.tipo, job.parametros, admin, job.max_intentos)
+
+
+async def _get_job(trabajo_id: UUID, db: _orm.session) -> _trabajo.Trabajo:
+    result = await _databaseServices.execute(
+        db, _sql.select(_Trabajo).where(_Trabajo.trabajo_id == trabajo_id)
+    )
+    trabajo = result.scalar()
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="El trabajo no existe")
+    return _trabajo.Trabajo.model_validate(trabajo)
+
+
+async def get_job(
+    trabajo_id: UUID, db: _orm.session, admin: _admin.Admin
+) -> _trabajo.Trabajo:
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return await _get_job(trabajo_id, db)
+
+
+async def _file_parts(trabajo_id: UUID, intento: int, partes: int):
+    # Una parte por consulta, con su propia sesión: la descarga no carga el
+    # archivo completo y no depende de la sesión de la petición
+    async with _session() as db:
+        for parte in range(partes):
+            result = await _databaseServices.execute(
+                db,
+                _sql.select(_models.TrabajoArchivo.contenido).where(
+                    _models.TrabajoArchivo.trabajo_id == trabajo_id,
+                    _models.TrabajoArchivo.intento == intento,
+                    _models.TrabajoArchivo.parte == parte,
+                ),
+            )
+            yield result.scalar_one()
+
+
+async def job_file(trabajo_id: UUID, db: _orm.session, admin: _admin.Admin):
+    # Contenido (iterador de partes), nombre de descarga, tipo y tamaño del
+    # archivo generado por un trabajo
+    trabajo = await get_job(trabajo_id, db, admin)
+    if trabajo.tipo != "exportar":
+        raise HTTPException(status_code=404, detail="El trabajo no genera archivos")
+    if trabajo.estado != "completado":
+        raise HTTPException(status_code=409, detail=f"El trabajo está {trabajo.estado}")
+
+    resultado = trabajo.resultado
+    return (
+        _file_parts(trabajo.trabajo_id, resultado["intento"], resultado["partes"]),
+        resultado["archivo"],
+        _exportService.MEDIA_TYPES[trabajo.parametros["formato"]],
+        resultado["bytes"],
+    )
+
+
+# Ciclo de vida de un trabajo
+
+
+async def _claim(db) -> _trabajo.Trabajo | None:
+    # Toma el trabajo disponible más antiguo. En Postgres SKIP LOCKED evita que
+    # dos workers esperen por la misma fila; el UPDATE condicionado garantiza
+    # que solo uno lo toma en cualquier motor.
+    while True:
+        ahora = _dt.datetime.utcnow()
+        disponible = _sql.and_(
+            _Trabajo.estado.in_(_ACTIVOS), _Trabajo.disponible_desde <= ahora
+        )
+        result = await _databaseServices.execute(
+            db,
+            _sql.select(_Trabajo.trabajo_id)
+            .where(disponible)
+            .order_by(_Trabajo.disponible_desde)
+            .limit(1)
+            .with_for_update(skip_locked=True),
+        )
+        trabajo_id = result.scalar()
+        if trabajo_id is None:
+            await _databaseServices.rollback(db)
+            return None
+
+        result = await _databaseServices.execute(
+            db,
+            _sql.update(_Trabajo)
+            .where(_Trabajo.trabajo_id == trabajo_id, disponible)
+            .values(
+                estado="en_curso",
+                intentos=_Trabajo.intentos + 1,
+                disponible_desde=ahora + _dt.timedelta(seconds=JOBS_LEASE_SECONDS),
+                fecha_inicio=ahora,
+                fecha_fin=None,
+            )
+            .execution_options(synchronize_session=False),
+        )
+        await _databaseServices.commit(db)
+        if result.rowcount == 1:
+            return await _get_job(trabajo_id, db)
+
+
+async def _finish(trabajo: _trabajo.Trabajo, **values):
+    # Solo si la reserva sigue siendo de este worker: si venció y otro worker
+    # tomó el trabajo, ese intento es el que cuenta
+    async with _session() as db:
+        await _databaseServices.execute(
+            db,
+            _sql.update(_Trabajo)
+            .where(
+                _Trabajo.trabajo_id == trabajo.trabajo_id,
+                _Trabajo.estado == "en_curso",
+                _Trabajo.intentos == trabajo.intentos,
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False),
+        )
+        await _databaseServices.commit(db)
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, (JobError, _pydantic.ValidationError)):
+        return True
+    return isinstance(error, HTTPException) and 400 <= error.status_code < 500
+
+
+def _error_text(error: Exception) -> str:
+    if isinstance(error, HTTPException):
+        return str(error.detail)
+    return f"{type(error).__name__}: {error}"
+
+
+async def _load_admin(db, administrador_id: UUID | None) -> _admin.Admin | None:
+    if administrador_id is None:
+        return None
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(_models.Administrador).where(
+            _models.Administrador.administrador_id == administrador_id,
+            _models.Administrador.activo,
+        ),
+    )
+    administrador = result.scalar()
+    return _admin.Admin.model_validate(administrador) if administrador else None
+
+
+async def _execute(trabajo: _trabajo.Trabajo) -> dict:
+    if trabajo.tipo not in _handlers:
+        raise JobError(f"Tipo de trabajo desconocido: {trabajo.tipo}")
+    if trabajo.intentos > trabajo.max_intentos:
+        # Reserva vencida en el último intento permitido
+        raise JobError("Se agotaron los intentos")
+
+    handler, modelo = _handlers[trabajo.tipo]
+    parametros = modelo.model_validate(trabajo.parametros)
+    async with _session() as db:
+        admin = await _load_admin(db, trabajo.administrador_id)
+        return await handler(trabajo, parametros, db, admin)
+
+
+async def _run(trabajo: _trabajo.Trabajo):
+    inicio = time.perf_counter()
+    try:
+        resultado = await _execute(trabajo)
+    except asyncio.CancelledError:
+        # Se detuvo el proceso: el trabajo vuelve a la cola sin gastar el intento
+        await _finish(
+            trabajo,
+            estado="pendiente",
+            intentos=trabajo.intentos - 1,
+            disponible_desde=_dt.datetime.utcnow(),
+        )
+        raise
+    except Exception as error:
+        ahora = _dt.datetime.utcnow()
+        if _is_permanent(error) or trabajo.intentos >= trabajo.max_intentos:
+            estado = "fallido"
+            # Los errores de parámetros o de permisos no necesitan la traza
+            _logger.error(
+                "Falló el trabajo %s (%s): %s",
+                trabajo.trabajo_id,
+                trabajo.tipo,
+                _error_text(error),
+                exc_info=not _is_permanent(error),
+            )
+            await _finish(
+                trabajo, estado=estado, error=_error_text(error), fecha_fin=ahora
+            )
+        else:
+            estado = "reintento"
+            espera = min(
+                JOBS_RETRY_SECONDS * 2 ** (trabajo.intentos - 1),
+                JOBS_RETRY_MAX_SECONDS,
+            )
+            _logger.warning(
+                "Trabajo %s (%s) falló, se reintenta en %ss: %s",
+                trabajo.trabajo_id,
+                trabajo.tipo,
+                espera,
+                error,
+            )
+            await _finish(
+                trabajo,
+                estado="pendiente",
+                error=_error_text(error),
+                disponible_desde=ahora + _dt.timedelta(seconds=espera),
+            )
+    else:
+        estado = "completado"
+        await _finish(
+            trabajo,
+            estado=estado,
+            resultado=resultado,
+            error=None,
+            fecha_fin=_dt.datetime.utcnow(),
+        )
+    _metrics.jobs_finished_total.inc(tipo=trabajo.tipo, estado=estado)
+    _metrics.job_duration_seconds.observe(
+        time.perf_counter() - inicio, tipo=trabajo.tipo
+    )
+
+
+async def _worker():
+    while True:
+        try:
+            async with _session() as db:
+                trabajo = await _claim(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _logger.exception("No se pudo consultar la cola de trabajos")
+            trabajo = None
+
+        if trabajo is None:
+            _nuevo.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(_nuevo.wait(), JOBS_POLL_SECONDS)
+            continue
+
+        try:
+            await _run(trabajo)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _logger.exception("No se pudo registrar el trabajo %s", trabajo.trabajo_id)
+
+
+async def _enqueue_periodic(tipo: str):
+    async with _session() as db:
+        result = await _databaseServices.execute(
+            db,
+            _sql.select(_Trabajo.trabajo_id)
+            .where(_Trabajo.tipo == tipo, _Trabajo.estado.in_(_ACTIVOS))
+            .limit(1),
+        )
+        if result.first() is None:
+            await enqueue(db, tipo, {}, None)
+
+
+async def _schedule_periodic():
+    siguiente = dict.fromkeys(_periodicos, 0.0)
+    while True:
+        for tipo, segundos in _periodicos.items():
+            if time.monotonic() < siguiente[tipo]:
+                continue
+            try:
+                await _enqueue_periodic(tipo)
+            except Exception:
+                _logger.exception("No se pudo encolar el trabajo periódico %s", tipo)
+            siguiente[tipo] = time.monotonic() + segundos
+        await asyncio.sleep(max(0, min(siguiente.values()) - time.monotonic()))
+
+
+async def start(workers: int | None = None):
+    # Los periódicos se encolan donde hay workers: en la API, o en el proceso
+    # de `manage.py worker` si la API corre con JOBS_WORKERS=0
+    global _scheduler
+    workers = JOBS_WORKERS if workers is None else workers
+    while len(_workers) < workers:
+        _workers.append(asyncio.create_task(_worker()))
+    if _workers and _periodicos and _scheduler is None:
+        _scheduler = asyncio.create_task(_schedule_periodic())
+
+
+async def stop():
+    global _scheduler
+    tareas = [*_workers, *([_scheduler] if _scheduler else [])]
+    for tarea in tareas:
+        tarea.cancel()
+    await asyncio.gather(*tareas, return_exceptions=True)
+    _workers.clear()
+    _scheduler = None
+
+
+async def serve(workers: int | None = None):
+    # Proceso dedicado a los trabajos (python manage.py worker)
+    detener = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, detener.set)
+
+    await start(workers)
+    _logger.info("Procesando trabajos con %s workers", len(_workers))
+    try:
+        await detener.wait()
+    finally:
+        await stop()
+
+
+# Tipos de trabajo
+
+
+@register("regenerar_qr", _trabajo.ParametrosRegenerarQR)
+async def _regenerate_qr(trabajo, parametros, db, admin):
+    return await _studentService.regenerate_qrs(
+        db=db,
+        admin=admin,
+        identificaciones=parametros.identificaciones,
+        institucion=parametros.institucion,
+    )
+
+
+@register("reconstruir_resumen", _trabajo.ParametrosReconstruirResumen)
+async def _rebuild_rollups(trabajo, parametros, db, admin):
+    return await _reportService.rebuild_rollups(
+        db=db, desde=parametros.desde, hasta=parametros.hasta, admin=admin
+    )
+
+
+@register("exportar", _trabajo.ParametrosExportar)
+async def _export(trabajo, parametros, db, admin):
+    if parametros.objeto == "viajes":
+        cuerpo = _exportService.export_trips(
+            admin=admin,
+            formato=parametros.formato,
+            desde=parametros.desde,
+            hasta=parametros.hasta,
+            institucion=parametros.institucion,
+        )
+        nombre = _exportService.filename(
+            "viajes",
+            parametros.formato,
+            parametros.institucion,
+            parametros.desde,
+            parametros.hasta,
+        )
+    else:
+        cuerpo = _exportService.export_students(
+            admin=admin, formato=parametros.formato, institucion=parametros.institucion
+        )
+        nombre = _exportService.filename(
+            "estudiantes", parametros.formato, parametros.institucion
+        )
+
+    # Todas las partes se confirman juntas: si el intento falla no queda un
+    # archivo a medias
+    archivo = _models.TrabajoArchivo.__table__
+    buffer = bytearray()
+    partes = total = 0
+
+    async def write(contenido: bytes):
+        nonlocal partes
+        await _databaseServices.execute(
+            db,
+            _sql.insert(archivo).values(
+                trabajo_id=trabajo.trabajo_id,
+                intento=trabajo.intentos,
+                parte=partes,
+                contenido=contenido,
+            ),
+        )
+        partes += 1
+
+    async for chunk in cuerpo:
+        buffer += chunk
+        total += len(chunk)
+        while len(buffer) >= JOBS_FILE_PART_BYTES:
+            await write(bytes(buffer[:JOBS_FILE_PART_BYTES]))
+            del buffer[:JOBS_FILE_PART_BYTES]
+    if buffer or not partes:
+        await write(bytes(buffer))
+
+    # Partes de intentos anteriores que no llegaron a completarse
+    await _databaseServices.execute(
+        db,
+        _sql.delete(archivo).where(
+            archivo.c.trabajo_id == trabajo.trabajo_id,
+            archivo.c.intento != trabajo.intentos,
+        ),
+    )
+    await _databaseServices.commit(db)
+    return {
+        "archivo": nombre,
+        "bytes": total,
+        "partes": partes,
+        "intento": trabajo.intentos,
+    }
+
+
+@register("conciliar_contadores", _trabajo.SinParametros)
+async def _reconcile_counters(trabajo, parametros, db, admin):
+    return await _dashboardService.reconcile(db)
+
+
+schedule("conciliar_contadores", _dashboardService.DASHBOARD_RECONCILE_SECONDS)
@@ -0,0 +1,182 @@
+import asyncio
+import contextlib
+import datetime as _dt
+import logging
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from sqlalchemy.dialects import postgresql as _postgresql
+from sqlalchemy.dialects import sqlite as _sqlite
+
+import config as _config
+import models as _models
+import services.cache_service as _cacheServices
+import services.database as _databaseServices
+import services.qr_token_service as _qrTokenService
+
+# Versión mínima aceptada del QR por estudiante; regenerar el QR o eliminar al
+# estudiante la eleva. La tabla qr_revocacion es la fuente y se escribe en la
+# transacción del cambio. La validación no consulta la base: lee una copia en
+# el backend de caché (QR_REVOCATION_URL; redis://... la comparte entre
+# workers), que además cada proceso recarga de la tabla cada
+# QR_REVOCATION_REFRESH_SECONDS.
+QR_REVOCATION_URL = _config.getenv("QR_REVOCATION_URL")
+QR_REVOCATION_CACHE_SIZE = int(_config.getenv("QR_REVOCATION_CACHE_SIZE", "100000"))
+QR_REVOCATION_REFRESH_SECONDS = float(
+    _config.getenv("QR_REVOCATION_REFRESH_SECONDS", "60")
+)
+
+# Un token dura a lo sumo dos periodos (qr_token_service.expiration): después
+# de eso ya no queda ninguno anterior a la revocación
+_VIGENCIA = _dt.timedelta(days=2 * _qrTokenService.QR_TOKEN_PERIOD_DAYS)
+# Margen de la recarga incremental para transacciones que confirmaron tarde
+_MARGEN = _dt.timedelta(seconds=30)
+# Versión mínima de un estudiante eliminado: ningún token la alcanza
+ELIMINADO = 2**31 - 1
+
+_REVOCACION = _models.RevocacionQR.__table__
+
+_UPSERTS = {"postgresql": _postgresql.insert, "sqlite": _sqlite.insert}
+
+_logger = logging.getLogger(__name__)
+
+versions = _cacheServices.create_backend(
+    url=QR_REVOCATION_URL,
+    maxsize=QR_REVOCATION_CACHE_SIZE,
+    ttl=_VIGENCIA.total_seconds(),
+    namespace="qr_version",
+)
+
+_ultima_recarga: _dt.datetime | None = None
+_refresher: asyncio.Task | None = None
+
+
+async def revoke(db: _orm.session, minimas: dict[UUID, int]):
+    # Se llama dentro de la transacción del cambio, antes del commit; después
+    # del commit, publish() lo hace visible sin esperar la recarga
+    if not minimas:
+        return
+
+    ahora = _dt.datetime.utcnow()
+    rows = [
+        {
+            "estudiante_id": estudiante_id,
+            "version_minima": version,
+            "fecha": ahora,
+            "expira": ahora + _VIGENCIA,
+        }
+        for estudiante_id, version in minimas.items()
+    ]
+
+    upsert = _UPSERTS.get(db.bind.dialect.name)
+    if upsert is not None:
+        statement = upsert(_REVOCACION)
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=["estudiante_id"],
+            set_={
+                "version_minima": _sql.case(
+                    (
+                        _REVOCACION.c.version_minima > excluded.version_minima,
+                        _REVOCACION.c.version_minima,
+                    ),
+                    else_=excluded.version_minima,
+                ),
+                "fecha": excluded.fecha,
+                "expira": excluded.expira,
+            },
+        )
+        await _databaseServices.execute(db, statement, rows)
+        return
+
+    for row in rows:
+        result = await _databaseServices.execute(
+            db,
+            _sql.update(_REVOCACION)
+            .where(_REVOCACION.c.estudiante_id == row["estudiante_id"])
+            .values(
+                version_minima=_sql.case(
+                    (
+                        _REVOCACION.c.version_minima > row["version_minima"],
+                        _REVOCACION.c.version_minima,
+                    ),
+                    else_=row["version_minima"],
+                ),
+                fecha=row["fecha"],
+                expira=row["expira"],
+            ),
+        )
+        if result.rowcount == 0:
+            await _databaseServices.execute(db, _sql.insert(_REVOCACION), row)
+
+
+async def publish(minimas: dict[UUID, int]):
+    for estudiante_id, version in minimas.items():
+        await versions.set(str(estudiante_id), str(version))
+
+
+async def validate(token: str) -> _qrTokenService.TokenQR:
+    # Firma, expiración y versión mínima, sin consultar la base
+    token_qr = _qrTokenService.decode(token)
+    minima = await versions.get(str(token_qr.estudiante_id))
+    if minima is not None and token_qr.version < int(minima):
+        raise _qrTokenService.InvalidToken("Token revocado")
+    return token_qr
+
+
+async def refresh(db: _orm.session) -> int:
+    # Copia al backend las revocaciones vigentes: todas la primera vez y luego
+    # solo las nuevas. Cubre lo que publish() no alcanzó a escribir y, con el
+    # backend en memoria, lo que se revocó en otros procesos.
+    global _ultima_recarga
+    ahora = _dt.datetime.utcnow()
+    await _databaseServices.execute(
+        db, _sql.delete(_REVOCACION).where(_REVOCACION.c.expira < ahora)
+    )
+    await _databaseServices.commit(db)
+
+    statement = _sql.select(
+        _REVOCACION.c.estudiante_id, _REVOCACION.c.version_minima
+    ).where(_REVOCACION.c.expira >= ahora)
+    if _ultima_recarga is not None:
+        statement = statement.where(_REVOCACION.c.fecha >= _ultima_recarga - _MARGEN)
+    result = await _databaseServices.execute(db, statement)
+    minimas = dict(result.all())
+    await publish(minimas)
+    _ultima_recarga = ahora
+    return len(minimas)
+
+
+def _session():
+    return contextlib.asynccontextmanager(_databaseServices.get_db)()
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(QR_REVOCATION_REFRESH_SECONDS)
+        try:
+            async with _session() as db:
+                await refresh(db)
+        except Exception:
+            _logger.exception("No se pudieron recargar las revocaciones de QR")
+
+
+async def start():
+    # La primera recarga se espera: desde el arranque se rechazan los QR ya
+    # revocados
+    global _refresher, _ultima_recarga
+    _ultima_recarga = None
+    async with _session() as db:
+        await refresh(db)
+    _refresher = asyncio.create_task(_run())
+
+
+async def stop():
+    global _refresher
+    if _refresher is None:
+        return
+    _refresher.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await _refresher
+    _refresher = None
@@ -0,0 +1,72 @@
+import functools
+import hashlib
+import io
+
+from fastapi.concurrency import run_in_threadpool
+
+import config as _config
+
+
+QR_BASE_URL = _config.getenv(
+    "QR_BASE_URL", "https://tiquetes-frontend.vercel.app/tickets"
+)
+# Número de imágenes codificadas que se mantienen en memoria por proceso
+QR_CACHE_SIZE = int(_config.getenv("QR_CACHE_SIZE", "1024"))
+# Segundos que el navegador puede usar la imagen sin revalidar. Con 0 (por
+# defecto) siempre revalida con If-None-Match: un QR regenerado se ve de
+# inmediato y, si no cambió, la respuesta es un 304 sin cuerpo.
+QR_CACHE_MAX_AGE = int(_config.getenv("QR_CACHE_MAX_AGE", "0"))
+
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def cache_control() -> str:
+    if QR_CACHE_MAX_AGE > 0:
+        return f"private, max-age={QR_CACHE_MAX_AGE}"
+    return "private, no-cache"
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # If-None-Match es una lista separada por comas o "*"; la comparación es
+    # débil (W/"x" equivale a "x")
+    if not if_none_match:
+        return False
+    etag = etag.removeprefix("W/")
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*" or candidato.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def qr_data(identificacion: str, token: str) -> str:
+    return f"{QR_BASE_URL}/{identificacion}?t={token}"
+
+
+@functools.lru_cache(maxsize=QR_CACHE_SIZE)
+def _render(data: str, fmt: str) -> tuple[bytes, str]:
+    # qrcode y PIL se importan con la primera imagen, no al arrancar
+    import qrcode
+    import qrcode.image.svg
+
+    buffer = io.BytesIO()
+    if fmt == "svg":
+        qrcode.make(data, image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qrcode.make(data).save(buffer, format="PNG")
+
+    content = buffer.getvalue()
+    etag = '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+    return content, etag
+
+
+async def render(
+    identificacion: str, token: str, fmt: str = "png"
+) -> tuple[bytes, str]:
+    # La imagen depende solo de los datos codificados, así que se puede cachear;
+    # el token solo cambia al pasar de periodo o al regenerar el QR
+    return await run_in_threadpool(_render, qr_data(identificacion, token), fmt)
+
+
+def cache_info():
+    return _render.cache_info()
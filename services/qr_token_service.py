@@ -0,0 +1,81 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import NamedTuple
+from uuid import UUID
+
+import config as _config
+
+
+# Tokens firmados que viajan en el QR: estudiante_id|version|exp|identificacion
+# más un HMAC truncado. Este módulo no usa la base de datos, así que también sirve
+# como librería de validación en los escáneres (solo necesitan QR_TOKEN_SECRET).
+# La revocación (versión mínima por estudiante) la comprueba el servidor:
+# qr_revocation_service.validate.
+QR_TOKEN_SECRET = (
+    _config.getenv("QR_TOKEN_SECRET") or _config.getenv("JWT_SECRET") or ""
+)
+# La expiración se alinea a periodos fijos: dentro de un mismo periodo el token
+# (y la imagen del QR) de un estudiante no cambia y se puede cachear
+QR_TOKEN_PERIOD_DAYS = int(_config.getenv("QR_TOKEN_PERIOD_DAYS", "30"))
+
+_SIGNATURE_BYTES = 16
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class TokenQR(NamedTuple):
+    estudiante_id: UUID
+    identificacion: str
+    version: int
+    exp: int
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _signature(payload: bytes) -> bytes:
+    return hmac.new(QR_TOKEN_SECRET.encode(), payload, hashlib.sha256).digest()[
+        :_SIGNATURE_BYTES
+    ]
+
+
+def expiration(now: float | None = None) -> int:
+    # Fin del periodo siguiente al actual: un token dura entre uno y dos periodos
+    period = QR_TOKEN_PERIOD_DAYS * 86400
+    now = time.time() if now is None else now
+    return (int(now) // period + 2) * period
+
+
+def sign(
+    estudiante_id: UUID, identificacion: str, version: int, exp: int | None = None
+) -> str:
+    exp = expiration() if exp is None else exp
+    payload = f"{estudiante_id.hex}|{version}|{exp}|{identificacion}".encode()
+    return f"{_b64encode(payload)}.{_b64encode(_signature(payload))}"
+
+
+def decode(token: str, now: float | None = None) -> TokenQR:
+    try:
+        payload_b64, signature_b64 = token.split(".")
+        payload = _b64decode(payload_b64)
+        signature = _b64decode(signature_b64)
+    except ValueError:
+        raise InvalidToken("Token mal formado")
+
+    if not hmac.compare_digest(signature, _signature(payload)):
+        raise InvalidToken("Firma inválida")
+
+    estudiante_id, version, exp, identificacion = payload.decode().split("|", 3)
+    token_qr = TokenQR(UUID(estudiante_id), identificacion, int(version), int(exp))
+    if token_qr.exp < (time.time() if now is None else now):
+        raise InvalidToken("Token expirado")
+    return token_qr
@@ -0,0 +1,154 @@
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+
+import config as _config
+import metrics as _metrics
+
+
+# Límite de intentos de login con token bucket, por identificación y por IP. Se
+# revisa antes de consultar la base y de correr bcrypt, así un ataque de fuerza
+# bruta no acapara los workers de hashing que también usan los demás logins.
+LOGIN_RATE_LIMIT = _config.getenv("LOGIN_RATE_LIMIT", "true").lower() == "true"
+# Vacío o memory:// = memoria del proceso; redis://host:6379/0 comparte los
+# contadores entre workers y réplicas (requiere instalar `redis`)
+LOGIN_RATE_LIMIT_URL = _config.getenv("LOGIN_RATE_LIMIT_URL", "memory://")
+# Intentos seguidos permitidos (capacidad) y recarga por minuto de cada bucket
+LOGIN_RATE_ID_BURST = int(_config.getenv("LOGIN_RATE_ID_BURST", "5"))
+LOGIN_RATE_ID_PER_MINUTE = float(_config.getenv("LOGIN_RATE_ID_PER_MINUTE", "5"))
+LOGIN_RATE_IP_BURST = int(_config.getenv("LOGIN_RATE_IP_BURST", "20"))
+LOGIN_RATE_IP_PER_MINUTE = float(_config.getenv("LOGIN_RATE_IP_PER_MINUTE", "30"))
+# Buckets en memoria como máximo; se descartan los menos usados
+LOGIN_RATE_MAX_KEYS = int(_config.getenv("LOGIN_RATE_MAX_KEYS", "100000"))
+# true solo detrás de un proxy propio que agrega X-Forwarded-For
+LOGIN_RATE_TRUST_FORWARDED = (
+    _config.getenv("LOGIN_RATE_TRUST_FORWARDED", "false").lower() == "true"
+)
+
+
+# Backends del estado de los buckets. `take` consume un intento y devuelve 0 si
+# se permite, o los segundos que faltan para el siguiente intento. Cualquier
+# objeto con este método async sirve como reemplazo, p. ej. en pruebas locales.
+
+
+class MemoryBucketBackend:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        # clave -> (intentos disponibles, instante de la última recarga)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        # Sin await: el event loop hace atómica la lectura y la escritura
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        # Un bucket descartado vuelve lleno: solo se pierde el límite de claves
+        # que llevan tiempo sin intentos
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "size": len(self._buckets)}
+
+
+# Mismo algoritmo que MemoryBucketBackend, atómico dentro de Redis
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(retry_after)
+"""
+
+
+class RedisBucketBackend:
+    def __init__(self, url: str, namespace: str):
+        # Dependencia opcional: solo se necesita si se configura una URL redis://
+        import redis.asyncio as _redis
+
+        self.namespace = namespace
+        self._client = _redis.Redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        retry_after = await self._take(
+            keys=[f"{self.namespace}:{key}"], args=[capacity, rate, time.time()]
+        )
+        return float(retry_after)
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+def create_backend(url: str | None, maxsize: int, namespace: str):
+    if not url or url.startswith("memory://"):
+        return MemoryBucketBackend(maxsize=maxsize)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBucketBackend(url=url, namespace=namespace)
+    raise ValueError(f"Backend de límite de intentos no soportado: {url}")
+
+
+login_buckets = create_backend(
+    LOGIN_RATE_LIMIT_URL, maxsize=LOGIN_RATE_MAX_KEYS, namespace="login"
+)
+
+
+def client_ip(request: Request) -> str:
+    if LOGIN_RATE_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            # El último valor lo agrega nuestro proxy; los anteriores los puede
+            # inventar el cliente
+            return forwarded.rsplit(",", 1)[-1].strip()
+    return request.client.host if request.client else "desconocida"
+
+
+async def check_login(request: Request, identificacion: str):
+    if not LOGIN_RATE_LIMIT:
+        return
+
+    limits = (
+        ("ip", client_ip(request), LOGIN_RATE_IP_BURST, LOGIN_RATE_IP_PER_MINUTE),
+        (
+            "identificacion",
+            identificacion,
+            LOGIN_RATE_ID_BURST,
+            LOGIN_RATE_ID_PER_MINUTE,
+        ),
+    )
+    for scope, value, burst, per_minute in limits:
+        retry_after = await login_buckets.take(
+            f"{scope}:{value}", burst, per_minute / 60
+        )
+        if retry_after > 0:
+            _metrics.login_throttled_total.inc(scope=scope)
+            segundos = math.ceil(retry_after)
+            raise HTTPException(
+                status_code=429,
+                detail="Demasiados intentos de inicio de sesión. Intente de nuevo "
+                f"en {segundos} segundos.",
+                headers={"Retry-After": str(segundos)},
+            )
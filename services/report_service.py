@@ -0,0 +1,261 @@
+import datetime as _dt
+from collections import Counter
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql as _postgresql
+from sqlalchemy.dialects import sqlite as _sqlite
+
+import models as _models
+import services.archive_service as _archiveService
+import services.database as _databaseServices
+from schemas import admin as _admin
+from schemas import reportes as _reportes
+
+_RESUMEN = _models.ViajeResumenDiario.__table__
+
+# Rango por defecto de los reportes cuando no se envía `desde`
+DEFAULT_RANGE_DAYS = 30
+
+_UPSERTS = {"postgresql": _postgresql.insert, "sqlite": _sqlite.insert}
+
+
+async def record_trips(db: _orm.session, conteos: Counter):
+    # conteos: {(fecha, institucion, administrador_id): viajes}. Se llama dentro de
+    # la transacción que inserta los viajes, así el resumen nunca queda desfasado.
+    if not conteos:
+        return
+
+    rows = [
+        {
+            "fecha": fecha,
+            "institucion": institucion,
+            "administrador_id": administrador_id,
+            "total": total,
+        }
+        for (fecha, institucion, administrador_id), total in sorted(
+            conteos.items(), key=lambda item: (item[0][0], item[0][1], str(item[0][2]))
+        )
+    ]
+
+    upsert = _UPSERTS.get(db.bind.dialect.name)
+    if upsert is not None:
+        statement = upsert(_RESUMEN)
+        statement = statement.on_conflict_do_update(
+            index_elements=["fecha", "institucion", "administrador_id"],
+            set_={"total": _RESUMEN.c.total + statement.excluded.total},
+        )
+        await _databaseServices.execute(db, statement, rows)
+        return
+
+    for row in rows:
+        result = await _databaseServices.execute(
+            db,
+            _sql.update(_RESUMEN)
+            .where(
+                _RESUMEN.c.fecha == row["fecha"],
+                _RESUMEN.c.institucion == row["institucion"],
+                _RESUMEN.c.administrador_id == row["administrador_id"],
+            )
+            .values(total=_RESUMEN.c.total + row["total"]),
+        )
+        if result.rowcount == 0:
+            await _databaseServices.execute(db, _sql.insert(_RESUMEN), row)
+
+
+async def rebuild_rollups(
+    db: _orm.session, desde: _dt.date, hasta: _dt.date, admin: _admin.Admin
+):
+    # Recalcula el resumen desde la tabla viaje, p. ej. para cargar el historial
+    # existente antes de que existiera el resumen
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    inicio, fin = _datetime_range(desde, hasta)
+    fecha = _sql.func.date(_models.Viaje.fecha_viaje, type_=_sql.Date)
+
+    await _databaseServices.execute(
+        db,
+        _sql.delete(_RESUMEN).where(
+            _RESUMEN.c.fecha >= desde, _RESUMEN.c.fecha <= hasta
+        ),
+    )
+    result = await _databaseServices.execute(
+        db,
+        _sql.insert(_RESUMEN).from_select(
+            ["fecha", "institucion", "administrador_id", "total"],
+            _sql.select(
+                fecha,
+                _models.Estudiante.institucion,
+                _models.Viaje.administrador_id,
+                _sql.func.count(),
+            )
+            .join(_models.Estudiante)
+            .where(_models.Viaje.fecha_viaje >= inicio, _models.Viaje.fecha_viaje < fin)
+            .group_by(
+                fecha, _models.Estudiante.institucion, _models.Viaje.administrador_id
+            ),
+        ),
+    )
+
+    # Los viajes ya archivados no están en la tabla; se suman desde los archivos
+    archivados = Counter()
+    if _archiveService.covers(desde):
+        archivados = await _archiveService.daily_counts(desde=desde, hasta=hasta)
+        await record_trips(db, archivados)
+
+    await _databaseServices.commit(db)
+    return {"filas": result.rowcount, "filas_archivo": len(archivados)}
+
+
+def _date_range(desde: _dt.date | None, hasta: _dt.date | None):
+    hasta = hasta or _dt.datetime.utcnow().date()
+    desde = desde or hasta - _dt.timedelta(days=DEFAULT_RANGE_DAYS)
+    if desde > hasta:
+        raise HTTPException(
+            status_code=400, detail="'desde' debe ser anterior o igual a 'hasta'"
+        )
+    return desde, hasta
+
+
+def _datetime_range(desde: _dt.date, hasta: _dt.date):
+    inicio = _dt.datetime.combine(desde, _dt.time.min)
+    fin = _dt.datetime.combine(hasta + _dt.timedelta(days=1), _dt.time.min)
+    return inicio, fin
+
+
+async def trips_per_day(
+    db: _orm.session,
+    admin: _admin.Admin,
+    desde: _dt.date | None = None,
+    hasta: _dt.date | None = None,
+    institucion: str | None = None,
+):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    desde, hasta = _date_range(desde, hasta)
+    statement = (
+        _sql.select(_RESUMEN.c.fecha, _sql.func.sum(_RESUMEN.c.total).label("total"))
+        .where(_RESUMEN.c.fecha >= desde, _RESUMEN.c.fecha <= hasta)
+        .group_by(_RESUMEN.c.fecha)
+        .order_by(_RESUMEN.c.fecha)
+    )
+    if institucion is not None:
+        statement = statement.where(_RESUMEN.c.institucion == institucion)
+
+    result = await _databaseServices.execute(db, statement)
+    return [_reportes.ConteoDia.model_validate(row) for row in result]
+
+
+async def trips_per_institution(
+    db: _orm.session,
+    admin: _admin.Admin,
+    desde: _dt.date | None = None,
+    hasta: _dt.date | None = None,
+):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    desde, hasta = _date_range(desde, hasta)
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(
+            _RESUMEN.c.institucion, _sql.func.sum(_RESUMEN.c.total).label("total")
+        )
+        .where(_RESUMEN.c.fecha >= desde, _RESUMEN.c.fecha <= hasta)
+        .group_by(_RESUMEN.c.institucion)
+        .order_by(_RESUMEN.c.institucion),
+    )
+    return [_reportes.ConteoInstitucion.model_validate(row) for row in result]
+
+
+async def trips_per_admin(
+    db: _orm.session,
+    admin: _admin.Admin,
+    desde: _dt.date | None = None,
+    hasta: _dt.date | None = None,
+):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    desde, hasta = _date_range(desde, hasta)
+    totales = (
+        _sql.select(
+            _RESUMEN.c.administrador_id,
+            _sql.func.sum(_RESUMEN.c.total).label("total"),
+        )
+        .where(_RESUMEN.c.fecha >= desde, _RESUMEN.c.fecha <= hasta)
+        .group_by(_RESUMEN.c.administrador_id)
+        .subquery()
+    )
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(
+            _models.Administrador.administrador_id,
+            _models.Administrador.identificacion,
+            _models.Administrador.nombres,
+            _models.Administrador.apellidos,
+            totales.c.total,
+        )
+        .join(
+            totales,
+            totales.c.administrador_id == _models.Administrador.administrador_id,
+        )
+        .order_by(totales.c.total.desc()),
+    )
+    return [_reportes.ConteoAdministrador.model_validate(row) for row in result]
+
+
+async def trips_per_student(
+    identificacion: str,
+    db: _orm.session,
+    admin: _admin.Admin,
+    desde: _dt.date | None = None,
+    hasta: _dt.date | None = None,
+):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(_models.Estudiante.estudiante_id).where(
+            _models.Estudiante.identificacion == identificacion
+        ),
+    )
+    estudiante_id: UUID | None = result.scalar()
+    if estudiante_id is None:
+        raise HTTPException(
+            status_code=404, detail="El estudiante no se encuentra registrado"
+        )
+
+    # Se resuelve con el índice (estudiante_id, fecha_viaje, viaje_id)
+    desde, hasta = _date_range(desde, hasta)
+    inicio, fin = _datetime_range(desde, hasta)
+    fecha = _sql.func.date(_models.Viaje.fecha_viaje, type_=_sql.Date).label("fecha")
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(fecha, _sql.func.count().label("total"))
+        .where(
+            _models.Viaje.estudiante_id == estudiante_id,
+            _models.Viaje.fecha_viaje >= inicio,
+            _models.Viaje.fecha_viaje < fin,
+        )
+        .group_by(fecha)
+        .order_by(fecha),
+    )
+    if not _archiveService.covers(desde):
+        return [_reportes.ConteoDia.model_validate(row) for row in result]
+
+    totales = Counter({row.fecha: row.total for row in result})
+    archivados = await _archiveService.daily_counts(
+        desde=desde, hasta=hasta, estudiante_id=estudiante_id
+    )
+    for (dia, _, _), total in archivados.items():
+        totales[dia] += total
+    return [
+        _reportes.ConteoDia(fecha=dia, total=total)
+        for dia, total in sorted(totales.items())
+    ]
@@ -0,0 +1,444 @@
+import asyncio
+import bisect
+import contextlib
+import functools
+import logging
+import math
+import operator
+import time
+import unicodedata
+from array import array
+from typing import NamedTuple
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+import config as _config
+import database as _database
+import models as _models
+import services.database as _databaseServices
+from schemas import admin as _admin
+from schemas import estudiante as _student
+
+# Búsqueda de estudiantes por prefijo, subcadena o parecido (errores de tipeo)
+# sobre identificacion, nombres, apellidos e institucion. En Postgres usa el
+# índice GIN de pg_trgm (models.search_text); en otros motores, un índice de
+# trigramas en memoria del proceso. Los estudiantes creados, importados o
+# eliminados en el proceso se aplican al índice al momento; se reconstruye
+# completo cada SEARCH_INDEX_TTL o tras SEARCH_INDEX_MAX_CHANGES cambios locales.
+SEARCH_MIN_SIMILARITY = float(_config.getenv("SEARCH_MIN_SIMILARITY", "0.5"))
+# Segundos antes de reconstruir el índice en memoria; cubre los cambios hechos
+# por otros workers
+SEARCH_INDEX_TTL = float(_config.getenv("SEARCH_INDEX_TTL", "300"))
+SEARCH_INDEX_MAX_CHANGES = int(_config.getenv("SEARCH_INDEX_MAX_CHANGES", "1000"))
+
+_logger = logging.getLogger(__name__)
+
+_LISTADO_COLUMNS = tuple(
+    getattr(_models.Estudiante, name)
+    for name in _student.EstudianteListado.model_fields
+)
+
+
+class Documento(NamedTuple):
+    estudiante_id: UUID
+    identificacion: str
+    nombres: str
+    apellidos: str
+    institucion: str
+
+
+def document(estudiante) -> Documento:
+    # Desde un modelo, un esquema o un dict con las columnas del estudiante
+    if isinstance(estudiante, dict):
+        return Documento(*(estudiante[campo] for campo in Documento._fields))
+    return Documento(*(getattr(estudiante, campo) for campo in Documento._fields))
+
+
+def _normalize(texto: str) -> str:
+    # Minúsculas y sin tildes: "Muñoz" y "munoz" son la misma búsqueda
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _trigrams(texto: str) -> set[str]:
+    # Igual que pg_trgm: cada palabra se rellena con dos espacios al inicio y
+    # uno al final, así los primeros trigramas representan el prefijo
+    trigramas = set()
+    for palabra in texto.split():
+        palabra = f"  {palabra} "
+        trigramas.update(palabra[i : i + 3] for i in range(len(palabra) - 2))
+    return trigramas
+
+
+def _bitmap(docs) -> int:
+    bits = bytearray(docs[-1] // 8 + 1)
+    for doc in docs:
+        bits[doc >> 3] |= 1 << (doc & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _iter_bits(bits: int):
+    # Posiciones de los bits encendidos, de menor a mayor
+    while bits:
+        bajo = bits & -bits
+        yield bajo.bit_length() - 1
+        bits ^= bajo
+
+
+def _count_equal(planos: list[int], n: int) -> int:
+    # Documentos cuyo conteo (en binario, un entero por bit) es exactamente n
+    if n >> len(planos):
+        return 0
+    mascara = -1
+    for i, plano in enumerate(planos):
+        mascara &= plano if n >> i & 1 else ~plano
+    return mascara
+
+
+class NgramIndex:
+    # Los documentos se numeran en orden de identificación: así los que empiezan
+    # por un prefijo forman un rango contiguo, y recorrer un mapa de bits de menor
+    # a mayor ya da los empates ordenados por identificación.
+    #
+    # Esa numeración no admite inserciones, así que los cambios locales van
+    # aparte: los agregados en un índice pequeño que se rehace en cada cambio y
+    # los eliminados en un conjunto. search() combina ambos por relevancia.
+    # add/remove reemplazan esas referencias en lugar de modificarlas, así una
+    # búsqueda en el threadpool no ve un cambio a medias.
+
+    def __init__(self, rows):
+        self._agregados: tuple[Documento, ...] = ()
+        self._extra: NgramIndex | None = None
+        self._eliminados: frozenset[UUID] = frozenset()
+        filas = sorted(rows, key=lambda row: _normalize(row.identificacion))
+        self.ids: list[UUID] = [row.estudiante_id for row in filas]
+        self.identificaciones: list[str] = [
+            _normalize(row.identificacion) for row in filas
+        ]
+        self.textos: list[str] = []
+
+        postings: dict[str, array] = {}
+        for doc, row in enumerate(filas):
+            texto = _normalize(
+                f"{row.identificacion} {row.nombres} {row.apellidos} {row.institucion}"
+            )
+            self.textos.append(texto)
+            for trigrama in _trigrams(texto):
+                lista = postings.get(trigrama)
+                if lista is None:
+                    lista = postings[trigrama] = array("I")
+                lista.append(doc)
+
+        # Un trigrama presente en más de 1/32 de los documentos ocupa menos como
+        # mapa de bits (un bit por documento) que como array (4 bytes por
+        # documento), y además se combina sin recorrerlo en Python
+        denso = len(filas) // 32
+        self._postings: dict[str, array | int] = {
+            trigrama: _bitmap(lista) if len(lista) > denso else lista
+            for trigrama, lista in postings.items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def changes(self) -> int:
+        return len(self._agregados) + len(self._eliminados)
+
+    def add(self, documentos: list[Documento]):
+        nuevos = {documento.estudiante_id for documento in documentos}
+        self._agregados = tuple(
+            d for d in self._agregados if d.estudiante_id not in nuevos
+        ) + tuple(documentos)
+        self._extra = NgramIndex(self._agregados)
+        self._eliminados = self._eliminados - nuevos
+
+    def remove(self, ids: list[UUID]):
+        self._eliminados = self._eliminados | set(ids)
+        agregados = tuple(
+            d for d in self._agregados if d.estudiante_id not in self._eliminados
+        )
+        if len(agregados) != len(self._agregados):
+            self._agregados = agregados
+            self._extra = NgramIndex(agregados) if agregados else None
+
+    def _bits(self, trigrama: str) -> int:
+        lista = self._postings.get(trigrama)
+        if lista is None:
+            return 0
+        return lista if isinstance(lista, int) else _bitmap(lista)
+
+    def search(self, q: str, limit: int, min_similarity: float) -> list[UUID]:
+        # Orden: identificaciones que empiezan por q, textos que contienen q y
+        # luego por proporción de trigramas de q presentes en el texto
+        extra, eliminados = self._extra, self._eliminados
+        resultados = [
+            r
+            for r in self._ranked(q, limit + len(eliminados), min_similarity)
+            if r[1] not in eliminados
+        ]
+        if extra is not None:
+            resultados = sorted(
+                resultados + extra._ranked(q, limit, min_similarity),
+                key=operator.itemgetter(0),
+            )
+        ids = []
+        for _, estudiante_id in resultados:
+            # Un agregado que la base ya tenía (p. ej. tras una reconstrucción)
+            if estudiante_id not in ids:
+                ids.append(estudiante_id)
+        return ids[:limit]
+
+    def _ranked(self, q: str, limit: int, min_similarity: float) -> list[tuple]:
+        # [(clave de orden, estudiante_id)]; las claves de dos índices se
+        # comparan entre sí: (0, identificación) prefijo, (1, identificación)
+        # contiene q, (2, -trigramas en común, identificación) parecido
+        q = _normalize(q).strip()
+        trigramas = _trigrams(q)
+        if not trigramas:
+            return []
+
+        inicio = bisect.bisect_left(self.identificaciones, q)
+        fin = bisect.bisect_left(self.identificaciones, q + "\uffff")
+        docs = [(0, doc) for doc in range(inicio, min(fin, inicio + limit))]
+        excluidos = ((1 << fin) - 1) ^ ((1 << inicio) - 1)
+
+        bitmaps = {t: self._bits(t) for t in trigramas}
+        interiores = [bits for t, bits in bitmaps.items() if " " not in t]
+        if interiores and len(docs) < limit:
+            # Todo texto que contiene q tiene sus trigramas interiores
+            candidatos = functools.reduce(operator.and_, interiores) & ~excluidos
+            for doc in _iter_bits(candidatos):
+                if q in self.textos[doc]:
+                    docs.append((1, doc))
+                    excluidos |= 1 << doc
+                    if len(docs) >= limit:
+                        break
+
+        if len(docs) < limit:
+            # Conteo de trigramas por documento como suma binaria de los mapas
+            # de bits: planos[i] tiene el bit i del conteo de cada documento
+            planos: list[int] = []
+            for acarreo in bitmaps.values():
+                for i, plano in enumerate(planos):
+                    planos[i] = plano ^ acarreo
+                    acarreo &= plano
+                    if not acarreo:
+                        break
+                if acarreo:
+                    planos.append(acarreo)
+
+            minimo = max(1, math.ceil(min_similarity * len(trigramas)))
+            for n in range(len(trigramas), minimo - 1, -1):
+                for doc in _iter_bits(_count_equal(planos, n) & ~excluidos):
+                    docs.append((2, doc, -n))
+                    if len(docs) >= limit:
+                        break
+                if len(docs) >= limit:
+                    break
+
+        return [
+            ((nivel, *resto, self.identificaciones[doc]), self.ids[doc])
+            for nivel, doc, *resto in docs[:limit]
+        ]
+
+
+_index: NgramIndex | None = None
+_built_at = 0.0
+_stale = False
+_lock = asyncio.Lock()
+_refresh: asyncio.Task | None = None
+# Cambios locales hechos mientras se construye un índice: la consulta pudo
+# leerlos o no, así que se vuelven a aplicar al índice nuevo
+_pendientes: list | None = None
+
+
+def mark_stale():
+    # Fuerza una reconstrucción completa en la próxima búsqueda
+    global _stale
+    _stale = True
+
+
+def _apply(index: NgramIndex, cambio):
+    operacion, valores = cambio
+    getattr(index, operacion)(valores)
+    if index.changes > SEARCH_INDEX_MAX_CHANGES:
+        mark_stale()
+
+
+def _change(cambio):
+    if _pendientes is not None:
+        _pendientes.append(cambio)
+    if _index is not None:
+        _apply(_index, cambio)
+
+
+def add_students(estudiantes):
+    # Tras el commit de create_student o import_students
+    documentos = [document(estudiante) for estudiante in estudiantes]
+    if documentos:
+        _change(("add", documentos))
+
+
+def remove_students(ids: list[UUID]):
+    # Tras el commit de delete_student
+    if ids:
+        _change(("remove", list(ids)))
+
+
+async def _build(db) -> NgramIndex:
+    global _index, _built_at, _stale, _pendientes
+    async with _lock:
+        if _index is not None and not _needs_refresh():
+            return _index
+        _stale = False
+        _pendientes = []
+        try:
+            inicio = time.monotonic()
+            result = await _databaseServices.execute(
+                db,
+                _sql.select(
+                    _models.Estudiante.estudiante_id,
+                    _models.Estudiante.identificacion,
+                    _models.Estudiante.nombres,
+                    _models.Estudiante.apellidos,
+                    _models.Estudiante.institucion,
+                ),
+            )
+            index = await run_in_threadpool(NgramIndex, result.all())
+            for cambio in _pendientes:
+                _apply(index, cambio)
+            _index, _built_at = index, inicio
+        finally:
+            _pendientes = None
+        return _index
+
+
+def _needs_refresh() -> bool:
+    return _stale or time.monotonic() - _built_at > SEARCH_INDEX_TTL
+
+
+async def _rebuild():
+    # En segundo plano y con su propia sesión, sin retener la del request
+    global _refresh
+    try:
+        async with contextlib.asynccontextmanager(_databaseServices.get_db)() as db:
+            await _build(db)
+    except Exception:
+        _logger.exception("No se pudo construir el índice de búsqueda")
+    finally:
+        _refresh = None
+
+
+async def _memory_index(db) -> NgramIndex:
+    global _refresh
+    if _index is None:
+        return await _build(db)
+    # Mientras se reconstruye se sigue respondiendo con el índice anterior, que
+    # ya tiene los cambios locales
+    if _needs_refresh() and _refresh is None:
+        _refresh = asyncio.create_task(_rebuild())
+    return _index
+
+
+def _uses_memory_index() -> bool:
+    return _database.engine.dialect.name != "postgresql"
+
+
+async def start():
+    # Construye el índice en segundo plano para que la primera búsqueda no lo
+    # espere completo; no retrasa el arranque
+    global _refresh
+    if _uses_memory_index() and _refresh is None:
+        _refresh = asyncio.create_task(_rebuild())
+
+
+async def stop():
+    global _refresh
+    if _refresh is None:
+        return
+    _refresh.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await _refresh
+    _refresh = None
+
+
+async def _search_memory(q: str, db, offset: int, limit: int) -> list[UUID]:
+    index = await _memory_index(db)
+    return await run_in_threadpool(
+        index.search, q, offset + limit + 1, SEARCH_MIN_SIMILARITY
+    )
+
+
+async def _search_trigram(q: str, db, offset: int, limit: int):
+    texto = _models.search_text()
+    escapado = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    # El umbral de `%>` (word_similarity) es una opción de la sesión
+    await _databaseServices.execute(
+        db,
+        _sql.select(
+            _sql.func.set_config(
+                "pg_trgm.word_similarity_threshold", str(SEARCH_MIN_SIMILARITY), True
+            )
+        ),
+    )
+    statement = (
+        _sql.select(*_LISTADO_COLUMNS)
+        .where(_sql.or_(texto.ilike(f"%{escapado}%"), texto.op("%>")(q)))
+        .order_by(
+            _models.Estudiante.identificacion.ilike(f"{escapado}%").desc(),
+            _sql.func.word_similarity(q, texto).desc(),
+            _models.Estudiante.identificacion,
+        )
+        .offset(offset)
+        .limit(limit + 1)
+    )
+    result = await _databaseServices.execute(db, statement)
+    return [_student.EstudianteListado.model_validate(row._mapping) for row in result]
+
+
+def _parse_cursor(after: str | None) -> int:
+    if after is None:
+        return 0
+    if not after.isdigit():
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return int(after)
+
+
+async def search_students(
+    q: str,
+    db: _orm.session,
+    admin: _admin.Admin,
+    after: str | None = None,
+    limit: int = 20,
+):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    # Los resultados van por relevancia, así que el cursor es la posición
+    offset = _parse_cursor(after)
+
+    if not _uses_memory_index():
+        estudiantes = await _search_trigram(q, db, offset, limit)
+    else:
+        ids = (await _search_memory(q, db, offset, limit))[offset:]
+        # El índice solo tiene el texto de búsqueda; los datos salen de la base
+        result = await _databaseServices.execute(
+            db,
+            _sql.select(*_LISTADO_COLUMNS).where(
+                _models.Estudiante.estudiante_id.in_(ids)
+            ),
+        )
+        filas = {row.estudiante_id: row for row in result}
+        estudiantes = [
+            _student.EstudianteListado.model_validate(filas[i]._mapping)
+            for i in ids
+            if i in filas
+        ]
+
+    next_after = str(offset + limit) if len(estudiantes) > limit else None
+    return estudiantes[:limit], next_after
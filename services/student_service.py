@@ -1,33 +1,53 @@
+import csv
+import datetime as _dt
 import io
+from collections import Counter
+from uuid import uuid4 as _uuid4
 
-import qrcode
+import pydantic as _pydantic
 
 # Import the ORM since sqlalchemy
+import sqlalchemy as _sql
+import sqlalchemy.exc as _exc
 import sqlalchemy.orm as _orm
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 
-# Import the dotenv library to work with enviromental variables
-from dotenv import load_dotenv
-from fastapi import HTTPException
-from passlib.context import CryptContext
-
+import config as _config
 import models as _models
+import services.cache_service as _cacheServices
+import services.dashboard_service as _dashboardService
+import services.database as _databaseServices
+import services.hashing_service as _hashingService
+import services.qr_revocation_service as _qrRevocationService
+import services.qr_token_service as _qrTokenService
+import services.report_service as _reportService
+import services.search_service as _searchService
+import services.write_behind_service as _writeBehindService
 from schemas import admin as _admin
 from schemas import estudiante as _student
 
-# Create the context for the bcrypt's hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-load_dotenv()
+# Filas por transacción en la importación masiva
+IMPORT_BATCH_SIZE = int(_config.getenv("IMPORT_BATCH_SIZE", "500"))
+# Identificaciones por sentencia UPDATE en la recarga masiva
+RECARGA_CHUNK_SIZE = 1000
 
+# Caché de lectura de estudiantes por identificación. STUDENT_CACHE_URL vacío o
+# memory:// usa memoria del proceso; redis://... comparte la caché entre workers.
+STUDENT_CACHE_URL = _config.getenv("STUDENT_CACHE_URL")
+STUDENT_CACHE_SIZE = int(_config.getenv("STUDENT_CACHE_SIZE", "10000"))
+STUDENT_CACHE_TTL = float(_config.getenv("STUDENT_CACHE_TTL", "30"))
 
-async def create_student(student: _student.EstudianteCreate, db: _orm.session):
-    qr_data = f"https://tiquetes-frontend.vercel.app/tickets/{student.identificacion}"
+student_cache = _cacheServices.create_backend(
+    url=STUDENT_CACHE_URL,
+    maxsize=STUDENT_CACHE_SIZE,
+    ttl=STUDENT_CACHE_TTL,
+    namespace="estudiante",
+)
 
-    qr = qrcode.make(data=qr_data)
-    qr_byte_array = io.BytesIO()
-    qr.save(qr_byte_array, format="PNG")
-    qr_byte_array = qr_byte_array.getvalue()
 
+async def create_student(student: _student.EstudianteCreate, db: _orm.session):
     student_obj = _models.Estudiante(
         tipo_identificacion=student.tipo_identificacion,
         identificacion=student.identificacion,
@@ -37,37 +57,230 @@ async def create_student(student: _student.EstudianteCreate, db: _orm.session):
         telefono=student.telefono,
         direccion=student.direccion,
         email=student.email,
-        hashed_password=pwd_context.hash(student.hashed_password),
-        codigoQR=qr_byte_array,
+        hashed_password=await _hashingService.hash_password(student.hashed_password),
     )
 
     db.add(student_obj)
-    db.commit()
-    db.refresh(student_obj)
+    await _dashboardService.add(db, estudiantes_activos=1)
+    await _databaseServices.commit(db)
+    await _databaseServices.refresh(db, student_obj)
+    _searchService.add_students([student_obj])
     return student_obj
 
 
+async def _get_student(identificacion: str, db: _orm.session, for_update: bool = False):
+    statement = _sql.select(_models.Estudiante).where(
+        _models.Estudiante.identificacion == identificacion
+    )
+    if for_update:
+        # El saldo leído se usa para ajustar los contadores del tablero
+        statement = statement.with_for_update()
+    result = await _databaseServices.execute(db, statement)
+    return result.scalars().first()
+
+
 async def get_user_by_identificacion(
     identificacion: str, db: _orm.session, admin: _admin.Admin
 ):
     if not admin:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    return (
-        db.query(_models.Estudiante)
-        .filter(_models.Estudiante.identificacion == identificacion)
-        .first()
+    saldo = _writeBehindService.cached_balance(identificacion)
+    if saldo is not None:
+        return saldo
+
+    cached = await student_cache.get(identificacion)
+    if cached is not None:
+        return _student.EstudianteResumen.model_validate_json(cached)
+
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(*_RESUMEN_COLUMNS).where(
+            _models.Estudiante.identificacion == identificacion
+        ),
+    )
+    row = result.first()
+    if row is None:
+        return None
+
+    estudiante = _student.EstudianteResumen.model_validate(row._mapping)
+    await student_cache.set(identificacion, estudiante.model_dump_json())
+    return estudiante
+
+
+_RESUMEN_COLUMNS = (
+    _models.Estudiante.estudiante_id,
+    _models.Estudiante.tipo_identificacion,
+    _models.Estudiante.identificacion,
+    _models.Estudiante.nombres,
+    _models.Estudiante.apellidos,
+    _models.Estudiante.institucion,
+    _models.Estudiante.telefono,
+    _models.Estudiante.direccion,
+    _models.Estudiante.email,
+    _models.Estudiante.numero_tiquetes,
+    _models.Estudiante.numero_viajes,
+    _models.Estudiante.activo,
+)
+
+
+_LISTADO_COLUMNS = (
+    _models.Estudiante.estudiante_id,
+    _models.Estudiante.tipo_identificacion,
+    _models.Estudiante.identificacion,
+    _models.Estudiante.nombres,
+    _models.Estudiante.apellidos,
+    _models.Estudiante.institucion,
+    _models.Estudiante.numero_tiquetes,
+    _models.Estudiante.activo,
+)
+
+
+def _students_statement(after: str | None):
+    statement = _sql.select(*_LISTADO_COLUMNS).order_by(
+        _models.Estudiante.identificacion
+    )
+    if after is not None:
+        statement = statement.where(_models.Estudiante.identificacion > after)
+    return statement
+
+
+async def student_exists(identificacion: str, db: _orm.session) -> bool:
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(_models.Estudiante.estudiante_id).where(
+            _models.Estudiante.identificacion == identificacion
+        ),
+    )
+    return result.first() is not None
+
+
+async def qr_token(identificacion: str, db: _orm.session) -> str | None:
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(
+            _models.Estudiante.estudiante_id, _models.Estudiante.version_qr
+        ).where(_models.Estudiante.identificacion == identificacion),
+    )
+    row = result.first()
+    if row is None:
+        return None
+    return _qrTokenService.sign(row.estudiante_id, identificacion, row.version_qr)
+
+
+async def regenerate_qr(identificacion: str, db: _orm.session, admin: _admin.Admin):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    result = await _databaseServices.execute(
+        db,
+        _sql.update(_models.Estudiante)
+        .where(_models.Estudiante.identificacion == identificacion)
+        .values(version_qr=_models.Estudiante.version_qr + 1)
+        .returning(_models.Estudiante.estudiante_id, _models.Estudiante.version_qr)
+        .execution_options(synchronize_session=False),
     )
+    row = result.first()
+    if row is None:
+        await _databaseServices.rollback(db)
+        raise HTTPException(
+            status_code=404, detail="El estudiante no se encuentra registrado"
+        )
+    # Los QR impresos con versiones anteriores dejan de validar
+    minimas = {row.estudiante_id: row.version_qr}
+    await _qrRevocationService.revoke(db, minimas)
+    await _databaseServices.commit(db)
+    await _qrRevocationService.publish(minimas)
+
+    return {
+        "token": _qrTokenService.sign(row.estudiante_id, identificacion, row.version_qr)
+    }
+
+
+async def regenerate_qrs(
+    db: _orm.session,
+    admin: _admin.Admin,
+    identificaciones: list[str] | None = None,
+    institucion: str | None = None,
+):
+    # Versión masiva de regenerate_qr, para los trabajos en segundo plano
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if institucion is not None:
+        filtros = [[_models.Estudiante.institucion == institucion]]
+    else:
+        identificaciones = list(dict.fromkeys(identificaciones))
+        filtros = [
+            [
+                _models.Estudiante.identificacion.in_(
+                    identificaciones[i : i + RECARGA_CHUNK_SIZE]
+                )
+            ]
+            for i in range(0, len(identificaciones), RECARGA_CHUNK_SIZE)
+        ]
+
+    filas = []
+    for filtro in filtros:
+        result = await _databaseServices.execute(
+            db,
+            _sql.update(_models.Estudiante)
+            .where(*filtro)
+            .values(version_qr=_models.Estudiante.version_qr + 1)
+            .returning(
+                _models.Estudiante.estudiante_id,
+                _models.Estudiante.identificacion,
+                _models.Estudiante.version_qr,
+            )
+            .execution_options(synchronize_session=False),
+        )
+        filas.extend(result.all())
+    minimas = {row.estudiante_id: row.version_qr for row in filas}
+    await _qrRevocationService.revoke(db, minimas)
+    await _databaseServices.commit(db)
+    await _qrRevocationService.publish(minimas)
 
+    encontrados = {row.identificacion for row in filas}
+    return {
+        "regenerados": len(filas),
+        "no_encontrados": [i for i in identificaciones or [] if i not in encontrados],
+    }
 
-async def get_all_students(db: _orm.session, admin: _admin.Admin):
+
+async def get_all_students(
+    db: _orm.session,
+    admin: _admin.Admin,
+    after: str | None = None,
+    limit: int = 100,
+):
     if not admin:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    return db.query(_models.Estudiante).all()
+    result = await _databaseServices.execute(
+        db, _students_statement(after=after).limit(limit)
+    )
+    students = [
+        _student.EstudianteListado.model_validate(row._mapping) for row in result
+    ]
 
+    # Cursor para la siguiente página; None cuando no hay más registros
+    next_after = students[-1].identificacion if len(students) == limit else None
+    return students, next_after
+
+
+async def stream_students(admin: _admin.Admin, after: str | None = None):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    async for partition in _databaseServices.stream(_students_statement(after=after)):
+        yield "".join(
+            _student.EstudianteListado.model_validate(row._mapping).model_dump_json()
+            + "\n"
+            for row in partition
+        )
 
-def update_tickets(
+
+async def update_tickets(
     student_identification: str,
     tickets_number: int,
     db: _orm.session,
@@ -84,33 +297,123 @@ def update_tickets(
             status_code=400, detail="El numero de tiquetes debe ser mayor o igual a 0"
         )
 
-    estudiante = (
-        db.query(_models.Estudiante)
-        .filter(_models.Estudiante.identificacion == student_identification)
-        .first()
-    )
-
-    if estudiante is None:
-        HTTPException(
-            status_code=404,
-            detail=f"El estudiante con id {student_identification} no se encuentra registrado",
+    async with _writeBehindService.change(db, [student_identification]):
+        estudiante = await _get_student(
+            identificacion=student_identification, db=db, for_update=True
         )
 
-    estudiante.numero_tiquetes = tickets_number
-    estudiante.numero_viajes = 0
-    db.commit()
-    db.refresh(estudiante)
+        if estudiante is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"El estudiante con id {student_identification} no se encuentra registrado",
+            )
+
+        await _dashboardService.add(
+            db, tiquetes_pendientes=tickets_number - estudiante.numero_tiquetes
+        )
+        estudiante.numero_tiquetes = tickets_number
+        estudiante.numero_viajes = 0
+        await _databaseServices.commit(db)
+    await student_cache.delete(student_identification)
+    await _databaseServices.refresh(db, estudiante)
 
     return estudiante
 
 
-def discount_ticket(student_identification: str, db: _orm.session, admin: _admin.Admin):
-    estudiante = (
-        db.query(_models.Estudiante)
-        .filter(_models.Estudiante.identificacion == student_identification)
-        .first()
+async def _locked_tickets(db: _orm.session, condicion) -> dict[str, int]:
+    # Saldos actuales, bloqueados hasta el commit para calcular el cambio exacto
+    # de los contadores del tablero
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(
+            _models.Estudiante.identificacion, _models.Estudiante.numero_tiquetes
+        )
+        .where(condicion)
+        .with_for_update(),
     )
+    return dict(result.all())
 
+
+async def bulk_update_tickets(
+    recarga: _student.RecargaMasiva, db: _orm.session, admin: _admin.Admin
+):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    async with _writeBehindService.change(
+        db,
+        None
+        if recarga.institucion is not None
+        else [item.identificacion for item in recarga.recargas],
+    ):
+        if recarga.institucion is not None:
+            anteriores = await _locked_tickets(
+                db, _models.Estudiante.institucion == recarga.institucion
+            )
+            result = await _databaseServices.execute(
+                db,
+                _sql.update(_models.Estudiante)
+                .where(_models.Estudiante.institucion == recarga.institucion)
+                .values(numero_tiquetes=recarga.tiquetes, numero_viajes=0)
+                .returning(_models.Estudiante.identificacion)
+                .execution_options(synchronize_session=False),
+            )
+            actualizados = result.scalars().all()
+            await _dashboardService.add(
+                db,
+                tiquetes_pendientes=recarga.tiquetes * len(actualizados)
+                - sum(anteriores.values()),
+            )
+            await _databaseServices.commit(db)
+            await student_cache.delete(*actualizados)
+            return {"actualizados": len(actualizados), "no_encontrados": []}
+
+        # Si una identificación se repite, gana la última recarga
+        tiquetes = {item.identificacion: item.tiquetes for item in recarga.recargas}
+        identificaciones = list(tiquetes)
+        actualizados: set[str] = set()
+        diferencia = 0
+
+        for i in range(0, len(identificaciones), RECARGA_CHUNK_SIZE):
+            chunk = identificaciones[i : i + RECARGA_CHUNK_SIZE]
+            anteriores = await _locked_tickets(
+                db, _models.Estudiante.identificacion.in_(chunk)
+            )
+            diferencia += sum(
+                tiquetes[identificacion] - saldo
+                for identificacion, saldo in anteriores.items()
+            )
+            result = await _databaseServices.execute(
+                db,
+                _sql.update(_models.Estudiante)
+                .where(_models.Estudiante.identificacion.in_(chunk))
+                .values(
+                    numero_tiquetes=_sql.case(
+                        {
+                            identificacion: tiquetes[identificacion]
+                            for identificacion in chunk
+                        },
+                        value=_models.Estudiante.identificacion,
+                    ),
+                    numero_viajes=0,
+                )
+                .returning(_models.Estudiante.identificacion)
+                .execution_options(synchronize_session=False),
+            )
+            actualizados.update(result.scalars().all())
+
+        await _dashboardService.add(db, tiquetes_pendientes=diferencia)
+        await _databaseServices.commit(db)
+        await student_cache.delete(*actualizados)
+        return {
+            "actualizados": len(actualizados),
+            "no_encontrados": [i for i in identificaciones if i not in actualizados],
+        }
+
+
+async def discount_ticket(
+    student_identification: str, db: _orm.session, admin: _admin.Admin
+):
     if not admin:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
@@ -119,35 +422,104 @@ def discount_ticket(student_identification: str, db: _orm.session, admin: _admin
             status_code=400, detail="Identificacion del estudiante es requerida"
         )
 
-    if estudiante is None:
-        HTTPException(
-            status_code=404,
-            detail=f"El estudiante con id {student_identification} no se encuentra registrado",
+    if _writeBehindService.DISCOUNT_WRITE_BEHIND:
+        resumen = await _writeBehindService.discount(
+            identificacion=student_identification, db=db, admin=admin
+        )
+        await student_cache.set(student_identification, resumen.model_dump_json())
+        return resumen
+
+    # Descuento condicional en una sola sentencia: la fila queda bloqueada por el
+    # UPDATE, así que dos escaneos simultáneos no pueden gastar el mismo tiquete
+    ahora = _dt.datetime.utcnow()
+    descuento = (
+        _sql.update(_models.Estudiante)
+        .where(
+            _models.Estudiante.identificacion == student_identification,
+            _models.Estudiante.numero_tiquetes > 0,
         )
+        .values(
+            numero_tiquetes=_models.Estudiante.numero_tiquetes - 1,
+            numero_viajes=_models.Estudiante.numero_viajes + 1,
+            actualiza=ahora,
+        )
+        .returning(*_RESUMEN_COLUMNS)
+    )
+    viaje = {
+        "viaje_id": _uuid4(),
+        "administrador_id": admin.administrador_id,
+        "fecha_viaje": ahora,
+        "hora": ahora.time(),
+        "fecha_creacion": ahora,
+        "activo": True,
+        "actualiza": ahora,
+    }
+    en_cte = db.bind.dialect.name == "postgresql"
+    if en_cte:
+        # En Postgres el viaje se inserta en la misma sentencia (CTE que modifica
+        # datos): descuento y viaje en un solo viaje de ida y vuelta a la base
+        descuento = descuento.cte("descuento")
+        insercion = (
+            _sql.insert(_models.Viaje)
+            .from_select(
+                ["estudiante_id", *viaje],
+                _sql.select(
+                    descuento.c.estudiante_id,
+                    *(
+                        _sql.literal(valor, _models.Viaje.__table__.c[columna].type)
+                        for columna, valor in viaje.items()
+                    ),
+                ),
+                include_defaults=False,
+            )
+            .cte("viaje")
+        )
+        descuento = _sql.select(descuento).add_cte(insercion)
+
+    result = await _databaseServices.execute(
+        db, descuento.execution_options(synchronize_session=False)
+    )
+    estudiante = result.first()
+
+    if estudiante is None:
+        await _databaseServices.rollback(db)
+
+        if not await student_exists(identificacion=student_identification, db=db):
+            raise HTTPException(
+                status_code=404,
+                detail=f"El estudiante con id {student_identification} no se encuentra registrado",
+            )
 
-    if estudiante.numero_tiquetes <= 0:
         raise HTTPException(
             status_code=400,
             detail="El estudiante no tiene tiquetes disponibles para descontar",
         )
 
-    # Añadimos un registro de viaje
-    viaje_obj = _models.Viaje(
-        estudiante_id=estudiante.estudiante_id, administrador_id=admin.administrador_id
+    if not en_cte:
+        # Añadimos un registro de viaje en la misma transacción
+        await _databaseServices.execute(
+            db,
+            _sql.insert(_models.Viaje).values(
+                estudiante_id=estudiante.estudiante_id, **viaje
+            ),
+        )
+    await _reportService.record_trips(
+        db,
+        Counter({(ahora.date(), estudiante.institucion, admin.administrador_id): 1}),
     )
+    await _dashboardService.add(db, tiquetes_pendientes=-1)
 
-    db.add(viaje_obj)
+    await _databaseServices.commit(db)
 
-    estudiante.numero_tiquetes = estudiante.numero_tiquetes - 1
-    estudiante.numero_viajes = estudiante.numero_viajes + 1
+    # El UPDATE ya devolvió el estado nuevo: se escribe directo en la caché
+    resumen = _student.EstudianteResumen.model_validate(estudiante._mapping)
+    await student_cache.set(student_identification, resumen.model_dump_json())
+    return resumen
 
-    db.commit()
-    db.refresh(viaje_obj)
-    db.refresh(estudiante)
-    return estudiante
 
-
-def delete_student(student_identification: str, db: _orm.session, admin: _admin.Admin):
+async def delete_student(
+    student_identification: str, db: _orm.session, admin: _admin.Admin
+):
     if not admin:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
@@ -156,20 +528,194 @@ def delete_student(student_identification: str, db: _orm.session, admin: _admin.
             status_code=400, detail="Identificacion del estudiante es requerida"
         )
 
-    estudiante = (
-        db.query(_models.Estudiante)
-        .filter(_models.Estudiante.identificacion == student_identification)
-        .first()
-    )
-    if estudiante is None:
-        HTTPException(
-            status_code=404,
-            detail=f"El estudiante con id {student_identification} no se encuentra registrado",
+    async with _writeBehindService.change(db, [student_identification]):
+        estudiante = await _get_student(
+            identificacion=student_identification, db=db, for_update=True
         )
-
-    db.delete(estudiante)
-    db.commit()
+        if estudiante is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"El estudiante con id {student_identification} no se encuentra registrado",
+            )
+
+        await _dashboardService.add(
+            db,
+            estudiantes_activos=-1 if estudiante.activo else 0,
+            tiquetes_pendientes=-estudiante.numero_tiquetes,
+        )
+        # Sus QR dejan de validar aunque ya no exista la fila
+        minimas = {estudiante.estudiante_id: _qrRevocationService.ELIMINADO}
+        await _qrRevocationService.revoke(db, minimas)
+        await _databaseServices.delete(db, estudiante)
+        await _databaseServices.commit(db)
+    await _qrRevocationService.publish(minimas)
+    await student_cache.delete(student_identification)
+    _searchService.remove_students([estudiante.estudiante_id])
 
     return {
         "Detail": f"El estudiante con identificacion {estudiante.identificacion} y nombre {estudiante.nombres + ' ' + estudiante.apellidos} fue eliminado correctamente"
     }
+
+
+def _read_rows(archivo: UploadFile):
+    # Lee el archivo ya recibido fila por fila, sin cargarlo completo en memoria
+    text = io.TextIOWrapper(archivo.file, encoding="utf-8-sig", newline="")
+    nombre = (archivo.filename or "").lower()
+    if nombre.endswith((".jsonl", ".ndjson")) or "json" in (archivo.content_type or ""):
+        for line in text:
+            if line.strip():
+                yield line
+    else:
+        yield from csv.DictReader(text)
+
+
+def _next_batch(rows, size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            break
+    return batch
+
+
+def _validation_detail(error: _pydantic.ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in e['loc']) or 'fila'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+async def _existing_values(db: _orm.session, column, values: set[str]) -> set[str]:
+    if not values:
+        return set()
+    result = await _databaseServices.execute(
+        db, _sql.select(column).where(column.in_(values))
+    )
+    return set(result.scalars().all())
+
+
+async def _insert_students(db: _orm.session, rows: list[dict]):
+    # executemany en una sola transacción; si otra petición insertó los mismos
+    # datos entre la verificación y el insert, se reintenta fila por fila
+    try:
+        await _databaseServices.execute(db, _sql.insert(_models.Estudiante), rows)
+        await _dashboardService.add(db, estudiantes_activos=len(rows))
+        await _databaseServices.commit(db)
+        return []
+    except _exc.IntegrityError:
+        await _databaseServices.rollback(db)
+
+    errores = []
+    for row in rows:
+        try:
+            await _databaseServices.execute(db, _sql.insert(_models.Estudiante), row)
+            await _dashboardService.add(db, estudiantes_activos=1)
+            await _databaseServices.commit(db)
+        except _exc.IntegrityError:
+            await _databaseServices.rollback(db)
+            errores.append(row["identificacion"])
+    return errores
+
+
+async def import_students(archivo: UploadFile, db: _orm.session, admin: _admin.Admin):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    rows = _read_rows(archivo)
+    vistos_identificacion: set[str] = set()
+    vistos_email: set[str] = set()
+    errores = []
+    procesados = 0
+    insertados = 0
+
+    while True:
+        batch = await run_in_threadpool(_next_batch, rows, IMPORT_BATCH_SIZE)
+        if not batch:
+            break
+
+        validos: list[tuple[int, _student.EstudianteCreate]] = []
+        for raw in batch:
+            procesados += 1
+            try:
+                if isinstance(raw, str):
+                    student = _student.EstudianteCreate.model_validate_json(raw)
+                else:
+                    student = _student.EstudianteCreate.model_validate(raw)
+            except _pydantic.ValidationError as e:
+                errores.append({"fila": procesados, "detalle": _validation_detail(e)})
+                continue
+
+            if student.identificacion in vistos_identificacion:
+                detalle = "identificacion duplicada en el archivo"
+            elif student.email in vistos_email:
+                detalle = "email duplicado en el archivo"
+            else:
+                detalle = None
+                vistos_identificacion.add(student.identificacion)
+                vistos_email.add(student.email)
+
+            if detalle:
+                errores.append(
+                    {
+                        "fila": procesados,
+                        "identificacion": student.identificacion,
+                        "detalle": detalle,
+                    }
+                )
+                continue
+            validos.append((procesados, student))
+
+        registrados_id = await _existing_values(
+            db,
+            _models.Estudiante.identificacion,
+            {student.identificacion for _, student in validos},
+        )
+        registrados_email = await _existing_values(
+            db, _models.Estudiante.email, {student.email for _, student in validos}
+        )
+
+        nuevos = []
+        for fila, student in validos:
+            if student.identificacion in registrados_id:
+                detalle = "identificacion ya registrada"
+            elif student.email in registrados_email:
+                detalle = "email ya registrado"
+            else:
+                nuevos.append((fila, student))
+                continue
+            errores.append(
+                {
+                    "fila": fila,
+                    "identificacion": student.identificacion,
+                    "detalle": detalle,
+                }
+            )
+
+        hashes = await _hashingService.hash_many(
+            [student.hashed_password for _, student in nuevos]
+        )
+        # El id se asigna aquí para agregar las filas al índice de búsqueda
+        filas_nuevas = [
+            student.model_dump()
+            | {"estudiante_id": _uuid4(), "hashed_password": hashed}
+            for (_, student), hashed in zip(nuevos, hashes)
+        ]
+        fallidos = await _insert_students(db, filas_nuevas)
+        _searchService.add_students(
+            [row for row in filas_nuevas if row["identificacion"] not in fallidos]
+        )
+
+        for fila, student in nuevos:
+            if student.identificacion in fallidos:
+                errores.append(
+                    {
+                        "fila": fila,
+                        "identificacion": student.identificacion,
+                        "detalle": "identificacion o email ya registrado",
+                    }
+                )
+        insertados += len(nuevos) - len(fallidos)
+
+    # Se detectan en varias pasadas por lote; se reportan en el orden del archivo
+    errores.sort(key=lambda error: error["fila"])
+    return {"procesados": procesados, "insertados": insertados, "errores": errores}
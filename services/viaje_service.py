@@ -0,0 +1,286 @@
+import datetime as _dt
+from collections import Counter
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.exc as _exc
+import sqlalchemy.orm as _orm
+from fastapi import HTTPException
+
+import config as _config
+import models as _models
+import services.archive_service as _archiveService
+import services.dashboard_service as _dashboardService
+import services.database as _databaseServices
+import services.report_service as _reportService
+import services.student_service as _studentService
+import services.write_behind_service as _writeBehindService
+from schemas import admin as _admin
+from schemas import viajes as _viajes
+
+
+# Máximo de escaneos por sincronización
+SYNC_MAX_ESCANEOS = int(_config.getenv("SYNC_MAX_ESCANEOS", "1000"))
+
+
+def _utc(fecha: _dt.datetime) -> _dt.datetime:
+    # Las columnas de fecha guardan UTC sin zona horaria (datetime.utcnow)
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(_dt.timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+async def _apply_scans(
+    escaneos: list[_viajes.Escaneo], db: _orm.session, admin: _admin.Admin
+) -> dict[str, str]:
+    estados: dict[str, str] = {}
+
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(_models.Viaje.clave_idempotencia).where(
+            _models.Viaje.clave_idempotencia.in_([e.clave for e in escaneos])
+        ),
+    )
+    for clave in result.scalars().all():
+        estados[clave] = "duplicado"
+
+    pendientes = sorted(
+        (e for e in escaneos if e.clave not in estados), key=lambda e: _utc(e.fecha)
+    )
+    if not pendientes:
+        return estados
+
+    # Bloquea las filas de los estudiantes involucrados hasta el commit
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(
+            _models.Estudiante.estudiante_id,
+            _models.Estudiante.identificacion,
+            _models.Estudiante.institucion,
+            _models.Estudiante.numero_tiquetes,
+        )
+        .where(
+            _models.Estudiante.identificacion.in_(
+                {e.identificacion for e in pendientes}
+            )
+        )
+        .with_for_update(),
+    )
+    estudiantes = {row.identificacion: row for row in result}
+    saldos = {row.identificacion: row.numero_tiquetes for row in estudiantes.values()}
+
+    aplicados = []
+    for escaneo in pendientes:
+        if escaneo.identificacion not in estudiantes:
+            estados[escaneo.clave] = "no_encontrado"
+        elif saldos[escaneo.identificacion] <= 0:
+            estados[escaneo.clave] = "sin_tiquetes"
+        else:
+            saldos[escaneo.identificacion] -= 1
+            aplicados.append(escaneo)
+
+    if not aplicados:
+        return estados
+
+    descuentos = Counter(e.identificacion for e in aplicados)
+    descuento = _sql.case(descuentos, value=_models.Estudiante.identificacion)
+    result = await _databaseServices.execute(
+        db,
+        _sql.update(_models.Estudiante)
+        .where(
+            _models.Estudiante.identificacion.in_(descuentos),
+            _models.Estudiante.numero_tiquetes >= descuento,
+        )
+        .values(
+            numero_tiquetes=_models.Estudiante.numero_tiquetes - descuento,
+            numero_viajes=_models.Estudiante.numero_viajes + descuento,
+        )
+        .returning(_models.Estudiante.identificacion)
+        .execution_options(synchronize_session=False),
+    )
+    actualizados = set(result.scalars().all())
+
+    viajes = []
+    conteos = Counter()
+    for escaneo in aplicados:
+        if escaneo.identificacion not in actualizados:
+            # El saldo cambió entre la lectura y el UPDATE (sin FOR UPDATE, p. ej.
+            # SQLite); no se aplica ningún escaneo de ese estudiante
+            estados[escaneo.clave] = "sin_tiquetes"
+            continue
+
+        fecha = _utc(escaneo.fecha)
+        estudiante = estudiantes[escaneo.identificacion]
+        estados[escaneo.clave] = "aplicado"
+        conteos[(fecha.date(), estudiante.institucion, admin.administrador_id)] += 1
+        viajes.append(
+            {
+                "estudiante_id": estudiante.estudiante_id,
+                "administrador_id": admin.administrador_id,
+                "fecha_viaje": fecha,
+                "hora": fecha.time(),
+                "clave_idempotencia": escaneo.clave,
+            }
+        )
+
+    if viajes:
+        await _databaseServices.execute(db, _sql.insert(_models.Viaje), viajes)
+        await _reportService.record_trips(db, conteos)
+        await _dashboardService.add(db, tiquetes_pendientes=-len(viajes))
+
+    return estados
+
+
+async def sync_scans(
+    sincronizacion: _viajes.SincronizacionEscaneos,
+    db: _orm.session,
+    admin: _admin.Admin,
+):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if len(sincronizacion.escaneos) > SYNC_MAX_ESCANEOS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo {SYNC_MAX_ESCANEOS} escaneos por sincronización",
+        )
+
+    # Una clave repetida dentro del mismo lote cuenta como duplicado
+    escaneos = list({e.clave: e for e in reversed(sincronizacion.escaneos)}.values())
+    async with _writeBehindService.change(db, {e.identificacion for e in escaneos}):
+        # Si otro envío del mismo lote se confirma primero, el unique de
+        # clave_idempotencia falla; el reintento los verá como duplicados
+        for intento in range(2):
+            try:
+                estados = await _apply_scans(escaneos=escaneos, db=db, admin=admin)
+                await _databaseServices.commit(db)
+                break
+            except _exc.IntegrityError:
+                await _databaseServices.rollback(db)
+                if intento == 1:
+                    raise HTTPException(
+                        status_code=409,
+                        detail="Conflicto al sincronizar, intente de nuevo",
+                    )
+
+    await _studentService.student_cache.delete(
+        *{e.identificacion for e in escaneos if estados[e.clave] == "aplicado"}
+    )
+
+    resultados = []
+    vistas: set[str] = set()
+    for e in sincronizacion.escaneos:
+        estado = "duplicado" if e.clave in vistas else estados[e.clave]
+        vistas.add(e.clave)
+        resultados.append(_viajes.ResultadoEscaneo(clave=e.clave, estado=estado))
+
+    conteo = Counter(r.estado for r in resultados)
+    return _viajes.ResultadoSincronizacion(
+        aplicados=conteo["aplicado"],
+        duplicados=conteo["duplicado"],
+        rechazados=conteo["sin_tiquetes"] + conteo["no_encontrado"],
+        resultados=resultados,
+    )
+
+
+_HISTORIAL_COLUMNS = (
+    _models.Viaje.viaje_id,
+    _models.Viaje.fecha_viaje,
+    _models.Viaje.hora,
+    _models.Viaje.estudiante_id,
+    _models.Viaje.administrador_id,
+    _models.Viaje.fecha_creacion,
+    _models.Viaje.activo,
+)
+
+
+def _history_cursor(viaje: _viajes.Viaje) -> str:
+    return f"{viaje.fecha_viaje.isoformat()}_{viaje.viaje_id}"
+
+
+def _parse_history_cursor(after: str) -> tuple[_dt.datetime, UUID]:
+    try:
+        fecha, viaje_id = after.split("_")
+        return _dt.datetime.fromisoformat(fecha), UUID(viaje_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+async def trip_history(
+    identificacion: str,
+    db: _orm.session,
+    admin: _admin.Admin,
+    after: str | None = None,
+    limit: int = 100,
+    desde: _dt.date | None = None,
+    hasta: _dt.date | None = None,
+):
+    if not admin:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(_models.Estudiante.estudiante_id).where(
+            _models.Estudiante.identificacion == identificacion
+        ),
+    )
+    estudiante_id = result.scalar()
+    if estudiante_id is None:
+        raise HTTPException(
+            status_code=404, detail="El estudiante no se encuentra registrado"
+        )
+
+    # Más recientes primero; el índice (estudiante_id, fecha_viaje, viaje_id)
+    # resuelve filtro, orden y cursor sin recorrer el resto de la tabla
+    statement = (
+        _sql.select(*_HISTORIAL_COLUMNS)
+        .where(_models.Viaje.estudiante_id == estudiante_id)
+        .order_by(_models.Viaje.fecha_viaje.desc(), _models.Viaje.viaje_id.desc())
+        .limit(limit)
+    )
+    if desde is not None:
+        statement = statement.where(
+            _models.Viaje.fecha_viaje >= _dt.datetime.combine(desde, _dt.time.min)
+        )
+    if hasta is not None:
+        fin = _dt.datetime.combine(hasta + _dt.timedelta(days=1), _dt.time.min)
+        statement = statement.where(_models.Viaje.fecha_viaje < fin)
+    cursor = _parse_history_cursor(after) if after is not None else None
+    if cursor is not None:
+        statement = statement.where(
+            _sql.tuple_(_models.Viaje.fecha_viaje, _models.Viaje.viaje_id) < cursor
+        )
+
+    result = await _databaseServices.execute(db, statement)
+    filas = {row.viaje_id: row._mapping for row in result}
+
+    # Los archivos solo tienen viajes anteriores al corte: se leen si la página
+    # quedó corta o si ya llegó a fechas anteriores al corte (archivado en
+    # curso). Una página llena de viajes recientes no los toca. Un viaje en
+    # ambos lados se toma una vez.
+    corte = _archiveService.cutoff()
+    if _archiveService.covers(desde) and (
+        len(filas) < limit or next(reversed(filas.values()))["fecha_viaje"] < corte
+    ):
+        archivados = await _archiveService.trip_history(
+            estudiante_id=estudiante_id,
+            limit=limit,
+            desde=desde,
+            hasta=hasta,
+            after=cursor,
+        )
+        for viaje in archivados:
+            filas.setdefault(viaje["viaje_id"], viaje)
+        filas = dict(
+            sorted(
+                filas.items(),
+                key=lambda item: (item[1]["fecha_viaje"], item[0]),
+                reverse=True,
+            )[:limit]
+        )
+
+    viajes = [_viajes.Viaje.model_validate(fila) for fila in filas.values()]
+
+    # Cursor para la siguiente página; None cuando no hay más registros
+    next_after = _history_cursor(viajes[-1]) if len(viajes) == limit else None
+    return viajes, next_after
@@ -0,0 +1,425 @@
+import asyncio
+import contextlib
+import datetime as _dt
+import json
+import logging
+import os
+import uuid
+from collections import Counter
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.exc as _exc
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+import config as _config
+import metrics as _metrics
+import models as _models
+import services.dashboard_service as _dashboardService
+import services.database as _databaseServices
+import services.report_service as _reportService
+from schemas import admin as _admin
+from schemas import estudiante as _student
+
+
+# Modo opcional para picos de abordaje: discount_ticket valida contra un saldo en
+# memoria, anota el descuento en un diario local y responde; un flusher aplica
+# los descuentos acumulados en una sola transacción cada DISCOUNT_FLUSH_MS o
+# cada DISCOUNT_FLUSH_MAX descuentos. El saldo en memoria es la fuente de verdad
+# mientras haya pendientes, así que requiere un único proceso atendiendo
+# descuentos (uvicorn con un solo worker).
+DISCOUNT_WRITE_BEHIND = (
+    _config.getenv("DISCOUNT_WRITE_BEHIND", "false").lower() == "true"
+)
+DISCOUNT_JOURNAL_DIR = _config.getenv("DISCOUNT_JOURNAL_DIR", "diario")
+DISCOUNT_FLUSH_MS = float(_config.getenv("DISCOUNT_FLUSH_MS", "5"))
+DISCOUNT_FLUSH_MAX = int(_config.getenv("DISCOUNT_FLUSH_MAX", "500"))
+
+_logger = logging.getLogger(__name__)
+
+_RESUMEN_COLUMNS = tuple(
+    getattr(_models.Estudiante, name)
+    for name in _student.EstudianteResumen.model_fields
+)
+
+_saldos: dict[str, _student.EstudianteResumen] = {}
+_pendientes: list[dict] = []
+# Segmentos del diario rotados cuyos descuentos aún no se confirman en la base
+_segmentos: list[str] = []
+_journal = None
+_secuencia = 0
+_flush_lock = asyncio.Lock()
+_lleno = asyncio.Event()
+_detener = asyncio.Event()
+_flusher: asyncio.Task | None = None
+# Identificaciones con un cambio de saldo en curso (None = todas); sus descuentos
+# esperan a que el cambio se confirme. _generacion aumenta con cada cambio, así
+# un saldo leído mientras empezaba uno se descarta.
+_en_cambio: list[set[str] | None] = []
+_cambio_terminado = asyncio.Condition()
+_generacion = 0
+
+
+def _journal_path() -> str:
+    return os.path.join(DISCOUNT_JOURNAL_DIR, "descuentos.log")
+
+
+def _rejected_path() -> str:
+    return os.path.join(DISCOUNT_JOURNAL_DIR, "rechazados.log")
+
+
+def _open_journal():
+    global _journal
+    os.makedirs(DISCOUNT_JOURNAL_DIR, exist_ok=True)
+    _journal = open(_journal_path(), "a", encoding="utf-8")
+
+
+def _append(entrada: dict):
+    # write + flush por descuento: sobrevive a una caída del proceso. El fsync
+    # (caída del sistema operativo) se hace por lote al rotar el segmento.
+    if _journal is None:
+        _open_journal()
+    _journal.write(json.dumps(entrada) + "\n")
+    _journal.flush()
+
+
+def _rotate():
+    global _journal
+    if _journal is None:
+        return list(_segmentos), None
+
+    journal = _journal
+    _journal = None
+    segmento = os.path.join(DISCOUNT_JOURNAL_DIR, f"descuentos-{_secuencia:012d}.log")
+    os.replace(_journal_path(), segmento)
+    _segmentos.append(segmento)
+    return list(_segmentos), journal
+
+
+def _close(journal):
+    if journal is None:
+        return
+    journal.flush()
+    os.fsync(journal.fileno())
+    journal.close()
+
+
+def _remove(segmentos: list[str]):
+    for segmento in segmentos:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(segmento)
+
+
+async def _load(identificacion: str, db) -> _student.EstudianteResumen | None:
+    # Usa la sesión del request: abrir otra mientras el request retiene una
+    # conexión puede agotar el pool con muchos escaneos simultáneos
+    result = await _databaseServices.execute(
+        db,
+        _sql.select(*_RESUMEN_COLUMNS).where(
+            _models.Estudiante.identificacion == identificacion
+        ),
+    )
+    row = result.first()
+    return (
+        None if row is None else _student.EstudianteResumen.model_validate(row._mapping)
+    )
+
+
+def cached_balance(identificacion: str) -> _student.EstudianteResumen | None:
+    saldo = _saldos.get(identificacion)
+    return None if saldo is None else saldo.model_copy()
+
+
+async def discount(
+    identificacion: str, db, admin: _admin.Admin
+) -> _student.EstudianteResumen:
+    global _secuencia
+
+    saldo = _saldos.get(identificacion)
+    while saldo is None:
+        async with _cambio_terminado:
+            await _cambio_terminado.wait_for(lambda: not _changing(identificacion))
+        generacion = _generacion
+        cargado = await _load(identificacion, db)
+        if cargado is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"El estudiante con id {identificacion} no se encuentra registrado",
+            )
+        if generacion != _generacion:
+            # Empezó o terminó un cambio de saldo durante la consulta
+            continue
+        # Otro descuento pudo cargar el mismo saldo mientras se esperaba la consulta
+        saldo = _saldos.setdefault(identificacion, cargado)
+
+    if saldo.numero_tiquetes <= 0:
+        raise HTTPException(
+            status_code=400,
+            detail="El estudiante no tiene tiquetes disponibles para descontar",
+        )
+
+    # Sin await entre la validación y el descuento: el event loop lo hace atómico
+    saldo.numero_tiquetes -= 1
+    saldo.numero_viajes += 1
+    _secuencia += 1
+    ahora = _dt.datetime.utcnow()
+    entrada = {
+        "secuencia": _secuencia,
+        "clave": uuid.uuid4().hex,
+        "identificacion": identificacion,
+        "estudiante_id": str(saldo.estudiante_id),
+        "institucion": saldo.institucion,
+        "administrador_id": str(admin.administrador_id),
+        "fecha": ahora.isoformat(),
+    }
+    _append(entrada)
+    _pendientes.append(entrada)
+    if len(_pendientes) >= DISCOUNT_FLUSH_MAX:
+        _lleno.set()
+    return saldo.model_copy()
+
+
+@contextlib.asynccontextmanager
+async def _session(db=None):
+    if db is not None:
+        yield db
+        return
+    async with contextlib.asynccontextmanager(_databaseServices.get_db)() as db:
+        yield db
+
+
+async def _apply(lote: list[dict], db=None):
+    async with _session(db) as db:
+        # clave_idempotencia descarta lo que ya se aplicó, p. ej. al reprocesar
+        # el diario después de una caída ocurrida justo tras el commit
+        result = await _databaseServices.execute(
+            db,
+            _sql.select(_models.Viaje.clave_idempotencia).where(
+                _models.Viaje.clave_idempotencia.in_([e["clave"] for e in lote])
+            ),
+        )
+        aplicadas = set(result.scalars().all())
+        lote = [e for e in lote if e["clave"] not in aplicadas]
+        if not lote:
+            return
+
+        descuentos = Counter(UUID(e["estudiante_id"]) for e in lote)
+        descuento = _sql.case(descuentos, value=_models.Estudiante.estudiante_id)
+        await _databaseServices.execute(
+            db,
+            _sql.update(_models.Estudiante)
+            .where(_models.Estudiante.estudiante_id.in_(descuentos))
+            .values(
+                numero_tiquetes=_models.Estudiante.numero_tiquetes - descuento,
+                numero_viajes=_models.Estudiante.numero_viajes + descuento,
+            )
+            .execution_options(synchronize_session=False),
+        )
+
+        viajes = []
+        conteos = Counter()
+        for e in lote:
+            fecha = _dt.datetime.fromisoformat(e["fecha"])
+            administrador_id = UUID(e["administrador_id"])
+            conteos[(fecha.date(), e["institucion"], administrador_id)] += 1
+            viajes.append(
+                {
+                    "estudiante_id": UUID(e["estudiante_id"]),
+                    "administrador_id": administrador_id,
+                    "fecha_viaje": fecha,
+                    "hora": fecha.time(),
+                    "clave_idempotencia": e["clave"],
+                }
+            )
+        await _databaseServices.execute(db, _sql.insert(_models.Viaje), viajes)
+        await _reportService.record_trips(db, conteos)
+        await _dashboardService.add(db, tiquetes_pendientes=-len(lote))
+        await _databaseServices.commit(db)
+
+
+def _park(entrada: dict, error: Exception):
+    # Descuento que la base rechaza (p. ej. el estudiante ya no existe): se
+    # aparta para revisarlo a mano y no bloquea a los siguientes
+    os.makedirs(DISCOUNT_JOURNAL_DIR, exist_ok=True)
+    with open(_rejected_path(), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entrada | {"error": str(error.orig)}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def _apply_isolating(lote: list[dict], db=None):
+    # Aplica el lote; si la base rechaza los datos, reintenta uno por uno y
+    # aparta los que fallan. Otros errores (p. ej. sin conexión) se propagan
+    # para reintentar el lote completo.
+    try:
+        await _apply(lote, db)
+        return
+    except (_exc.IntegrityError, _exc.DataError):
+        if db is not None:
+            await _databaseServices.rollback(db)
+
+    apartados = 0
+    for entrada in lote:
+        try:
+            await _apply([entrada], db)
+        except (_exc.IntegrityError, _exc.DataError) as error:
+            if db is not None:
+                await _databaseServices.rollback(db)
+            _logger.error("Descuento rechazado por la base, se aparta: %s", entrada)
+            await run_in_threadpool(_park, entrada, error)
+            # El saldo en memoria contaba con este descuento
+            _saldos.pop(entrada["identificacion"], None)
+            apartados += 1
+    _metrics.write_behind_rejected_total.inc(apartados)
+
+
+async def flush(db=None) -> int:
+    # Con `db` el lote se confirma en esa sesión (la del cambio que llama desde
+    # change); sin ella, el flusher abre una propia
+    async with _flush_lock:
+        if not _pendientes:
+            return 0
+
+        # El lote y el segmento del diario se cortan juntos, sin await de por
+        # medio: los descuentos que lleguen durante el commit van al diario nuevo
+        lote = list(_pendientes)
+        _pendientes.clear()
+        segmentos, journal = _rotate()
+
+        try:
+            await run_in_threadpool(_close, journal)
+            await _apply_isolating(lote, db)
+        except BaseException:
+            # También si se cancela (p. ej. al detener): el lote vuelve a la cola,
+            # antes que los descuentos nuevos, y su segmento queda en el diario.
+            # Si el commit alcanzó a hacerse, clave_idempotencia evita aplicarlo
+            # dos veces.
+            _pendientes[:0] = lote
+            if db is not None:
+                await _databaseServices.rollback(db)
+            raise
+
+        _segmentos.clear()
+        await run_in_threadpool(_remove, segmentos)
+        _metrics.write_behind_flushed_total.inc(len(lote))
+        return len(lote)
+
+
+def _changing(identificacion: str) -> bool:
+    return any(ids is None or identificacion in ids for ids in _en_cambio)
+
+
+def _evict(ids: set[str] | None):
+    if ids is None:
+        _saldos.clear()
+        return
+    for identificacion in ids:
+        _saldos.pop(identificacion, None)
+
+
+@contextlib.asynccontextmanager
+async def change(db=None, identificaciones=None):
+    # Envuelve los demás cambios de saldo (recargas, sincronización,
+    # eliminación) hasta su commit: aplica primero los pendientes, y mientras
+    # dura los descuentos de esas identificaciones esperan. Al salir descarta
+    # los saldos en memoria, que se vuelven a leer ya con el cambio confirmado.
+    global _generacion
+    if not DISCOUNT_WRITE_BEHIND:
+        yield
+        return
+
+    ids = None if identificaciones is None else set(identificaciones)
+    _en_cambio.append(ids)
+    _generacion += 1
+    _evict(ids)
+    try:
+        await flush(db)
+        yield
+    finally:
+        # Por identidad: dos cambios pueden tener el mismo conjunto
+        del _en_cambio[next(i for i, e in enumerate(_en_cambio) if e is ids)]
+        _generacion += 1
+        _evict(ids)
+        async with _cambio_terminado:
+            _cambio_terminado.notify_all()
+
+
+def _read_journal(path: str) -> list[dict]:
+    entradas = []
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                entradas.append(json.loads(linea))
+            except ValueError:
+                # Última línea incompleta de una caída a mitad de escritura: ese
+                # descuento nunca se confirmó al cliente
+                break
+    return entradas
+
+
+async def recover() -> int:
+    # Aplica lo que quedó en el diario de una ejecución anterior, en orden
+    global _secuencia
+
+    if not os.path.isdir(DISCOUNT_JOURNAL_DIR):
+        return 0
+    archivos = sorted(
+        os.path.join(DISCOUNT_JOURNAL_DIR, nombre)
+        for nombre in os.listdir(DISCOUNT_JOURNAL_DIR)
+        if nombre.startswith("descuentos-")
+    )
+    if os.path.exists(_journal_path()):
+        archivos.append(_journal_path())
+
+    recuperados = 0
+    for archivo in archivos:
+        entradas = await run_in_threadpool(_read_journal, archivo)
+        for inicio in range(0, len(entradas), DISCOUNT_FLUSH_MAX):
+            await _apply_isolating(entradas[inicio : inicio + DISCOUNT_FLUSH_MAX])
+        if entradas:
+            _secuencia = max(_secuencia, entradas[-1]["secuencia"])
+        recuperados += len(entradas)
+        await run_in_threadpool(_remove, [archivo])
+    return recuperados
+
+
+async def _run():
+    # Termina cuando stop() activa _detener, después del flush en curso: no se
+    # cancela a mitad de un lote
+    while not _detener.is_set():
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(_lleno.wait(), DISCOUNT_FLUSH_MS / 1000)
+        _lleno.clear()
+        _metrics.write_behind_pending.set(len(_pendientes))
+        try:
+            await flush()
+        except Exception:
+            _logger.exception("No se pudieron aplicar los descuentos pendientes")
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(_detener.wait(), 1)
+
+
+async def start():
+    global _flusher
+    if not DISCOUNT_WRITE_BEHIND:
+        return
+    await recover()
+    _detener.clear()
+    _flusher = asyncio.create_task(_run())
+
+
+async def stop():
+    global _flusher, _journal
+    if _flusher is None:
+        return
+    _detener.set()
+    _lleno.set()
+    await _flusher
+    _flusher = None
+
+    await flush()
+    if _journal is not None:
+        _journal.close()
+        _journal = None
+    _saldos.clear()
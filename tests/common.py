@@ -0,0 +1,30 @@
+# Utilidades compartidas por las pruebas
+import contextlib
+
+import database as _database
+import models as _models
+import services.database as _databaseServices
+
+
+def session():
+    # Sesión propia, igual que los trabajos en segundo plano
+    return contextlib.asynccontextmanager(_databaseServices.get_db)()
+
+
+def student(identificacion: str):
+    with _database.SessionLocal() as db:
+        return (
+            db.query(_models.Estudiante)
+            .filter(_models.Estudiante.identificacion == identificacion)
+            .one()
+        )
+
+
+def count_trips(identificacion: str | None = None) -> int:
+    with _database.SessionLocal() as db:
+        query = db.query(_models.Viaje)
+        if identificacion is not None:
+            query = query.join(_models.Estudiante).filter(
+                _models.Estudiante.identificacion == identificacion
+            )
+        return query.count()
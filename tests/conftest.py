@@ -0,0 +1,125 @@
+# Las pruebas usan una base SQLite temporal. La configuración se fija antes de
+# importar `database`/`main`, porque el engine se crea al importar.
+import os
+import tempfile
+
+import pytest
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/pruebas.db"
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("JWT_SECRET", "pruebas")
+os.environ.setdefault("LOGIN_RATE_LIMIT", "false")
+
+import database as _database  # noqa: E402
+import models as _models  # noqa: E402
+import services.admin_services as _adminServices  # noqa: E402
+import services.database as _databaseServices  # noqa: E402
+import services.hashing_service as _hashingService  # noqa: E402
+import services.qr_revocation_service as _qrRevocationService  # noqa: E402
+import services.search_service as _searchService  # noqa: E402
+import services.student_service as _studentService  # noqa: E402
+from schemas import admin as _admin  # noqa: E402
+
+ADMIN_IDENTIFICACION = "admin-pruebas"
+ADMIN_PASSWORD = "Pruebas123!"
+
+_databaseServices.upgrade_database()
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    # Un solo event loop para toda la sesión: los servicios guardan primitivas
+    # de asyncio a nivel de módulo
+    return "asyncio"
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def event_loop():
+    # anyio mantiene el mismo runner (y su loop) mientras viva un fixture
+    # asíncrono de la sesión; sin él, cada prueba tendría un loop nuevo
+    yield
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    yield
+    with _database.engine.begin() as conn:
+        for table in reversed(_database.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    # Las cachés en memoria guardan filas que ya no existen
+    for cache in (
+        _studentService.student_cache,
+        _adminServices.principal_cache,
+        _qrRevocationService.versions,
+    ):
+        cache._cache.clear()
+    # La próxima búsqueda construye el índice con las filas de esa prueba
+    _searchService._index = None
+
+
+@pytest.fixture
+def admin() -> _admin.Admin:
+    with _database.SessionLocal() as db:
+        administrador = _models.Administrador(
+            identificacion=ADMIN_IDENTIFICACION,
+            nombres="Admin",
+            apellidos="Pruebas",
+            telefono="0",
+            cargo="pruebas",
+            empresa="pruebas",
+            email="admin@example.com",
+            hashed_password=_hashingService.pwd_context().hash(ADMIN_PASSWORD),
+        )
+        db.add(administrador)
+        db.commit()
+        return _admin.Admin.model_validate(administrador)
+
+
+@pytest.fixture
+def create_students():
+    def create(n: int, tiquetes: int = 0, prefijo: str = "est", **campos):
+        with _database.SessionLocal() as db:
+            for i in range(n):
+                db.add(
+                    _models.Estudiante(
+                        **{
+                            "tipo_identificacion": "CC",
+                            "identificacion": f"{prefijo}-{i}",
+                            "nombres": "Nombre",
+                            "apellidos": str(i),
+                            "institucion": "colegio",
+                            "telefono": "0",
+                            "direccion": "-",
+                            "email": f"{prefijo}-{i}@example.com",
+                            "hashed_password": "-",
+                            "numero_tiquetes": tiquetes,
+                            **campos,
+                        }
+                    )
+                )
+            db.commit()
+        return [f"{prefijo}-{i}" for i in range(n)]
+
+    return create
+
+
+@pytest.fixture
+async def client():
+    import httpx
+
+    import main as _main
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=_main.app), base_url="http://pruebas"
+    ) as client:
+        yield client
+
+
+@pytest.fixture
+async def headers(client, admin) -> dict:
+    response = await client.post(
+        "/api/v1/token",
+        data={"username": ADMIN_IDENTIFICACION, "password": ADMIN_PASSWORD},
+    )
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
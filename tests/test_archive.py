@@ -0,0 +1,89 @@
+import datetime as _dt
+import os
+
+import pytest
+
+import database as _database
+import models as _models
+import services.archive_service as _archiveService
+from tests import common as _common
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def archive_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(_archiveService, "ARCHIVE_DIR", str(tmp_path / "archivo"))
+
+
+@pytest.fixture
+def months_read(monkeypatch):
+    leidos = []
+    read_month = _archiveService._read_month
+
+    def spy(mes):
+        leidos.append(mes)
+        return read_month(mes)
+
+    monkeypatch.setattr(_archiveService, "_read_month", spy)
+    return leidos
+
+
+def add_trips(admin, identificacion: str, fechas: list[_dt.datetime]):
+    estudiante = _common.student(identificacion)
+    with _database.SessionLocal() as db:
+        for fecha in fechas:
+            db.add(
+                _models.Viaje(
+                    estudiante_id=estudiante.estudiante_id,
+                    administrador_id=admin.administrador_id,
+                    fecha_viaje=fecha,
+                    hora=fecha.time(),
+                )
+            )
+        db.commit()
+
+
+async def test_history_reads_only_the_student_months(
+    archive_dir, months_read, client, headers, admin, create_students
+):
+    antiguo, nuevo = create_students(2)
+    add_trips(admin, antiguo, [_dt.datetime(2025, mes, 10, 8) for mes in range(1, 13)])
+    add_trips(admin, nuevo, [_dt.datetime(2025, 11, 20, 8), _dt.datetime(2026, 2, 1)])
+    async with _common.session() as db:
+        resultado = await _archiveService.archive_trips(
+            db, antes=_dt.datetime(2026, 1, 1)
+        )
+    assert resultado["archivados"] == 13
+
+    response = await client.get(f"/api/v1/estudiantes/{nuevo}/viajes", headers=headers)
+    assert [v["fecha_viaje"][:10] for v in response.json()] == [
+        "2026-02-01",
+        "2025-11-20",
+    ]
+    # Doce meses archivados, pero el estudiante solo tiene viajes en uno
+    assert months_read == ["2025-11"]
+
+    months_read.clear()
+    response = await client.get(
+        f"/api/v1/estudiantes/{antiguo}/viajes", params={"limit": 3}, headers=headers
+    )
+    assert len(response.json()) == 3
+    assert months_read == ["2025-12", "2025-11", "2025-10"]
+
+
+async def test_months_without_student_list_are_read(
+    archive_dir, months_read, client, headers, admin, create_students
+):
+    # Meses archivados antes de que existiera la lista de estudiantes
+    [identificacion] = create_students(1)
+    add_trips(admin, identificacion, [_dt.datetime(2025, 6, 1, 8)])
+    async with _common.session() as db:
+        await _archiveService.archive_trips(db, antes=_dt.datetime(2026, 1, 1))
+    os.remove(_archiveService._students_path("2025-06"))
+
+    response = await client.get(
+        f"/api/v1/estudiantes/{identificacion}/viajes", headers=headers
+    )
+    assert len(response.json()) == 1
+    assert months_read == ["2025-06"]
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from tests import common as _common
+
+pytestmark = pytest.mark.anyio
+
+TIQUETES = 10
+ESCANEOS = 25
+
+
+async def discount(client, headers, identificacion: str):
+    return await client.put(
+        f"/api/v1/estudiantes/tickets/delete/{identificacion}",
+        data={"identification": identificacion},
+        headers=headers,
+    )
+
+
+async def test_concurrent_discounts_never_overspend(client, headers, create_students):
+    [identificacion] = create_students(1, tiquetes=TIQUETES)
+
+    respuestas = await asyncio.gather(
+        *(discount(client, headers, identificacion) for _ in range(ESCANEOS))
+    )
+    exitosas = [r.json() for r in respuestas if r.status_code == 200]
+    rechazadas = [r for r in respuestas if r.status_code != 200]
+
+    assert len(exitosas) == TIQUETES
+    assert all(r.status_code == 400 for r in rechazadas)
+    # Cada descuento vio un saldo distinto: ninguno gastó el mismo tiquete
+    assert sorted(e["numero_tiquetes"] for e in exitosas) == list(range(TIQUETES))
+
+    estudiante = _common.student(identificacion)
+    assert estudiante.numero_tiquetes == 0
+    assert estudiante.numero_viajes == len(exitosas)
+    assert _common.count_trips(identificacion) == len(exitosas)
+
+
+async def test_discount_without_tickets_is_rejected(client, headers, create_students):
+    [identificacion] = create_students(1, tiquetes=0)
+
+    response = await discount(client, headers, identificacion)
+    assert response.status_code == 400
+    assert _common.student(identificacion).numero_tiquetes == 0
+    assert _common.count_trips(identificacion) == 0
+
+    response = await discount(client, headers, "no-existe")
+    assert response.status_code == 404
@@ -0,0 +1,64 @@
+import csv
+import datetime as _dt
+import io
+
+import pytest
+
+import database as _database
+import models as _models
+import services.archive_service as _archiveService
+from tests import common as _common
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def archive_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(_archiveService, "ARCHIVE_DIR", str(tmp_path / "archivo"))
+
+
+async def test_trip_export_includes_archived_months(
+    archive_dir, client, headers, admin, create_students
+):
+    [identificacion] = create_students(1)
+    inicio = _dt.datetime(2025, 10, 1, 8)
+    with _database.SessionLocal() as db:
+        estudiante = _common.student(identificacion)
+        for i in range(6):
+            fecha = inicio + _dt.timedelta(days=20 * i)
+            db.add(
+                _models.Viaje(
+                    estudiante_id=estudiante.estudiante_id,
+                    administrador_id=admin.administrador_id,
+                    fecha_viaje=fecha,
+                    hora=fecha.time(),
+                )
+            )
+        db.commit()
+
+    # Los cuatro primeros viajes pasan a los archivos
+    async with _common.session() as db:
+        resultado = await _archiveService.archive_trips(
+            db, antes=_dt.datetime(2025, 12, 15)
+        )
+    assert resultado["archivados"] == 4
+    assert _common.count_trips() == 2
+
+    rango = {"desde": "2025-09-01", "hasta": "2026-03-31"}
+    response = await client.get(
+        "/api/v1/reportes/exportar/viajes", params=rango, headers=headers
+    )
+    assert response.status_code == 200
+    filas = list(csv.DictReader(io.StringIO(response.content.decode("utf-8-sig"))))
+
+    historial = await client.get(
+        f"/api/v1/estudiantes/{identificacion}/viajes", params=rango, headers=headers
+    )
+    assert len(filas) == len(historial.json()) == 6
+    assert {f["viaje_id"] for f in filas} == {v["viaje_id"] for v in historial.json()}
+    # Del más antiguo al más reciente, con los datos del estudiante y del
+    # administrador también en los viajes archivados
+    assert [f["fecha_viaje"] for f in filas] == sorted(f["fecha_viaje"] for f in filas)
+    assert {(f["nombres"], f["administrador"]) for f in filas} == {
+        ("Nombre", admin.identificacion)
+    }
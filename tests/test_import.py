@@ -0,0 +1,54 @@
+import io
+import json
+
+import pytest
+
+from tests import common as _common
+
+pytestmark = pytest.mark.anyio
+
+
+def fila(identificacion: str, **campos) -> str:
+    return json.dumps(
+        {
+            "tipo_identificacion": "CC",
+            "identificacion": identificacion,
+            "nombres": "Nombre",
+            "apellidos": "Apellido",
+            "institucion": "colegio",
+            "telefono": "0",
+            "direccion": "-",
+            "email": f"{identificacion}@example.com",
+            "hashed_password": "Clave123!",
+            **campos,
+        }
+    )
+
+
+async def test_import_reports_errors_in_file_order(client, headers, create_students):
+    create_students(1)
+    archivo = "\n".join(
+        [
+            fila("est-0"),
+            fila("nuevo-1"),
+            fila("nuevo-2", hashed_password="corta"),
+            fila("nuevo-1", email="otro@example.com"),
+            fila("nuevo-3"),
+        ]
+    ).encode()
+
+    response = await client.post(
+        "/api/v1/estudiantes/importar",
+        files={"archivo": ("estudiantes.jsonl", io.BytesIO(archivo))},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    resultado = response.json()
+    assert resultado["procesados"] == 5
+    assert resultado["insertados"] == 2
+    assert [(e["fila"], e.get("identificacion")) for e in resultado["errores"]] == [
+        (1, "est-0"),
+        (3, None),
+        (4, "nuevo-1"),
+    ]
+    assert _common.student("nuevo-3").institucion == "colegio"
@@ -0,0 +1,139 @@
+import asyncio
+
+import pydantic as _pydantic
+import pytest
+
+import services.job_service as _jobService
+
+pytestmark = pytest.mark.anyio
+
+
+class ParametrosPrueba(_pydantic.BaseModel):
+    # Falla las primeras `fallas` veces; `permanente` con un error sin reintento
+    fallas: int = 0
+    permanente: bool = False
+    segundos: float = 0
+
+
+@pytest.fixture
+async def jobs(monkeypatch):
+    intentos = []
+
+    async def handler(trabajo, parametros, db, admin):
+        intentos.append(trabajo.intentos)
+        await asyncio.sleep(parametros.segundos)
+        if parametros.permanente:
+            raise _jobService.JobError("no se puede")
+        if len(intentos) <= parametros.fallas:
+            raise RuntimeError("transitorio")
+        return {"intentos": trabajo.intentos, "admin": admin is not None}
+
+    monkeypatch.setitem(_jobService._handlers, "prueba", (handler, ParametrosPrueba))
+    monkeypatch.setattr(_jobService, "_periodicos", {})
+    monkeypatch.setattr(_jobService, "JOBS_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(_jobService, "JOBS_POLL_SECONDS", 0.05)
+    await _jobService.start(workers=1)
+    yield intentos
+    await _jobService.stop()
+
+
+async def enqueue(client, headers, tipo: str, parametros: dict, **campos) -> str:
+    response = await client.post(
+        "/api/v1/trabajos",
+        json={"tipo": tipo, "parametros": parametros, **campos},
+        headers=headers,
+    )
+    assert response.status_code == 202, response.text
+    assert response.json()["estado"] == "pendiente"
+    return response.json()["trabajo_id"]
+
+
+async def wait(client, headers, trabajo_id: str) -> dict:
+    for _ in range(200):
+        response = await client.get(f"/api/v1/trabajos/{trabajo_id}", headers=headers)
+        trabajo = response.json()
+        if trabajo["estado"] in ("completado", "fallido"):
+            return trabajo
+        await asyncio.sleep(0.02)
+    raise AssertionError(trabajo)
+
+
+async def test_transient_failures_are_retried(jobs, client, headers):
+    trabajo_id = await enqueue(client, headers, "prueba", {"fallas": 2})
+    trabajo = await wait(client, headers, trabajo_id)
+
+    assert trabajo["estado"] == "completado"
+    assert trabajo["intentos"] == 3
+    assert trabajo["resultado"] == {"intentos": 3, "admin": True}
+    assert trabajo["error"] is None
+    assert jobs == [1, 2, 3]
+
+
+async def test_failed_jobs_stop_retrying(jobs, client, headers):
+    trabajo_id = await enqueue(client, headers, "prueba", {"fallas": 5}, max_intentos=2)
+    trabajo = await wait(client, headers, trabajo_id)
+    assert trabajo["estado"] == "fallido"
+    assert trabajo["intentos"] == 2
+    assert trabajo["error"] == "RuntimeError: transitorio"
+
+    # Un error permanente no se reintenta
+    jobs.clear()
+    trabajo_id = await enqueue(client, headers, "prueba", {"permanente": True})
+    trabajo = await wait(client, headers, trabajo_id)
+    assert trabajo["estado"] == "fallido"
+    assert trabajo["intentos"] == 1
+    assert trabajo["error"] == "JobError: no se puede"
+
+
+async def test_invalid_jobs_are_rejected(client, headers):
+    response = await client.post(
+        "/api/v1/trabajos", json={"tipo": "nada"}, headers=headers
+    )
+    assert response.status_code == 400
+    response = await client.post(
+        "/api/v1/trabajos",
+        json={"tipo": "regenerar_qr", "parametros": {}},
+        headers=headers,
+    )
+    assert response.status_code == 400
+
+
+async def test_stop_returns_the_running_job_to_the_queue(jobs, client, headers):
+    trabajo_id = await enqueue(client, headers, "prueba", {"segundos": 10})
+    while not jobs:
+        await asyncio.sleep(0.01)
+    await _jobService.stop()
+
+    response = await client.get(f"/api/v1/trabajos/{trabajo_id}", headers=headers)
+    trabajo = response.json()
+    # Sin gastar el intento: otro worker lo toma de nuevo
+    assert trabajo["estado"] == "pendiente"
+    assert trabajo["intentos"] == 0
+
+
+async def test_export_job_file(jobs, client, headers, create_students):
+    create_students(3)
+    create_students(2, prefijo="otro", institucion="otra")
+
+    trabajo_id = await enqueue(
+        client,
+        headers,
+        "exportar",
+        {"objeto": "estudiantes", "formato": "csv", "institucion": "colegio"},
+    )
+    trabajo = await wait(client, headers, trabajo_id)
+    assert trabajo["estado"] == "completado", trabajo["error"]
+
+    response = await client.get(
+        f"/api/v1/trabajos/{trabajo_id}/archivo", headers=headers
+    )
+    assert response.status_code == 200
+    assert "attachment" in response.headers["content-disposition"]
+    lineas = response.text.splitlines()
+    # Encabezado y los tres estudiantes de la institución
+    assert len(lineas) == 4
+    assert sorted(linea.split(",")[1] for linea in lineas[1:]) == [
+        "est-0",
+        "est-1",
+        "est-2",
+    ]
@@ -0,0 +1,81 @@
+import pytest
+import sqlalchemy as _sql
+
+import database as _database
+import services.qr_revocation_service as _qrRevocationService
+from tests import common as _common
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def statements():
+    # Sentencias SQL ejecutadas mientras dura la prueba
+    ejecutadas = []
+
+    def listener(conn, cursor, statement, *args):
+        ejecutadas.append(statement)
+
+    _sql.event.listen(_database.engine, "before_cursor_execute", listener)
+    yield ejecutadas
+    _sql.event.remove(_database.engine, "before_cursor_execute", listener)
+
+
+async def validate(client, headers, token: str) -> dict:
+    response = await client.get(
+        "/api/v1/qr/validar", params={"t": token}, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+async def token(client, headers, identificacion: str) -> str:
+    response = await client.post(
+        f"/api/v1/estudiantes/{identificacion}/qr/regenerar", headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()["token"]
+
+
+async def test_regenerated_qr_revokes_previous_versions(
+    client, headers, create_students, statements
+):
+    [identificacion] = create_students(1)
+    anterior = await token(client, headers, identificacion)
+    actual = await token(client, headers, identificacion)
+
+    statements.clear()
+    assert (await validate(client, headers, actual))["valido"]
+    assert (await validate(client, headers, anterior))["motivo"] == "Token revocado"
+    # El principal ya está en caché: validar no consulta la base
+    assert statements == []
+
+
+async def test_deleted_student_qr_is_revoked(client, headers, create_students):
+    [identificacion] = create_students(1)
+    actual = await token(client, headers, identificacion)
+
+    response = await client.delete(
+        "/api/v1/estudiantes",
+        params={"identification": identificacion},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert (await validate(client, headers, actual))["motivo"] == "Token revocado"
+
+
+async def test_revocations_are_reloaded_from_the_database(
+    client, headers, create_students
+):
+    [identificacion] = create_students(1)
+    anterior = await token(client, headers, identificacion)
+    await token(client, headers, identificacion)
+
+    # Otro proceso (o un reinicio): su backend en memoria empieza vacío
+    _qrRevocationService.versions._cache.clear()
+    assert (await validate(client, headers, anterior))["valido"]
+
+    await _qrRevocationService.start()
+    await _qrRevocationService.stop()
+    assert (await validate(client, headers, anterior))["motivo"] == "Token revocado"
+    assert _common.student(identificacion).version_qr == 3
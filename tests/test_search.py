@@ -0,0 +1,198 @@
+import io
+import json
+import uuid
+
+import pytest
+
+import services.search_service as _searchService
+
+pytestmark = pytest.mark.anyio
+
+
+def documento(identificacion, nombres="Nombre", apellidos="Apellido", **campos):
+    return _searchService.Documento(
+        **{
+            "estudiante_id": uuid.uuid4(),
+            "identificacion": identificacion,
+            "nombres": nombres,
+            "apellidos": apellidos,
+            "institucion": "colegio",
+            **campos,
+        }
+    )
+
+
+def identificaciones(index, docs, q, limit=20, min_similarity=0.5):
+    por_id = {d.estudiante_id: d.identificacion for d in docs}
+    return [por_id[i] for i in index.search(q, limit, min_similarity)]
+
+
+def test_bitmap_helpers():
+    bits = _searchService._bitmap([0, 3, 9, 64])
+    assert bits == (1 << 0) | (1 << 3) | (1 << 9) | (1 << 64)
+    assert list(_searchService._iter_bits(bits)) == [0, 3, 9, 64]
+    assert list(_searchService._iter_bits(0)) == []
+
+
+def test_count_equal_selects_documents_by_count():
+    # Conteos por documento: 0 -> 1, 1 -> 2, 2 -> 3, 3 -> 0, en planos de bits
+    conteos = [1, 2, 3, 0]
+    planos = [
+        sum(1 << doc for doc, c in enumerate(conteos) if c >> i & 1) for i in range(2)
+    ]
+    for n in range(4):
+        esperados = [doc for doc, c in enumerate(conteos) if c == n]
+        assert (
+            list(
+                _searchService._iter_bits(
+                    _searchService._count_equal(planos, n) & 0b1111
+                )
+            )
+            == esperados
+        )
+    # Un conteo que no cabe en los planos
+    assert _searchService._count_equal(planos, 4) == 0
+
+
+def test_prefix_then_contains_then_similar():
+    docs = [
+        documento("200", nombres="Pereira"),
+        documento("100", nombres="Pérez"),
+        documento("per-2"),
+        documento("per-1"),
+        documento("300", nombres="Perea"),
+        documento("400", nombres="Gómez"),
+    ]
+    index = _searchService.NgramIndex(docs)
+    # Prefijo de la identificación, en orden; luego los que contienen "per"
+    assert identificaciones(index, docs, "per") == [
+        "per-1",
+        "per-2",
+        "100",
+        "200",
+        "300",
+    ]
+    # Sin tildes ni mayúsculas; después, por trigramas en común
+    assert identificaciones(index, docs, "PÉREZ") == [
+        "100",
+        "200",
+        "300",
+        "per-1",
+        "per-2",
+    ]
+    assert identificaciones(index, docs, "PÉREZ", min_similarity=0.9) == ["100"]
+    # Parecidos: comparten la mayoría de los trigramas
+    assert identificaciones(index, docs, "pereiro", min_similarity=0.7) == ["200"]
+    assert identificaciones(index, docs, "per", limit=3) == ["per-1", "per-2", "100"]
+    assert identificaciones(index, docs, "x") == []
+
+
+def test_dense_trigrams_use_bitmaps():
+    # Todos comparten apellido: sus trigramas superan 1/32 de los documentos
+    docs = [
+        documento(f"{i:03d}", nombres=f"n{i:03d}", apellidos="Ramírez")
+        for i in range(100)
+    ]
+    docs.append(documento("999", nombres="Único", apellidos="Torres"))
+    index = _searchService.NgramIndex(docs)
+    assert isinstance(index._postings["ram"], int)
+    assert not isinstance(index._postings["tor"], int)
+
+    assert identificaciones(index, docs, "ramirez", limit=3) == ["000", "001", "002"]
+    assert identificaciones(index, docs, "n042 ramirez")[:2] == ["042", "040"]
+    assert identificaciones(index, docs, "n042 ramirez", min_similarity=1) == ["042"]
+    assert identificaciones(index, docs, "torres") == ["999"]
+
+
+def test_add_and_remove_merge_with_the_base():
+    docs = [documento("per-1"), documento("per-3"), documento("100", nombres="Pérez")]
+    index = _searchService.NgramIndex(docs)
+
+    nuevos = [documento("per-2"), documento("050", nombres="Perea")]
+    index.add(nuevos)
+    docs += nuevos
+    assert identificaciones(index, docs, "per") == [
+        "per-1",
+        "per-2",
+        "per-3",
+        "050",
+        "100",
+    ]
+
+    index.remove([docs[0].estudiante_id, nuevos[0].estudiante_id])
+    assert identificaciones(index, docs, "per") == ["per-3", "050", "100"]
+    # El límite se cumple aunque la base tenga eliminados
+    assert identificaciones(index, docs, "per", limit=2) == ["per-3", "050"]
+    assert index.changes == 3
+
+
+def test_changes_over_the_limit_mark_the_index_stale(monkeypatch):
+    monkeypatch.setattr(_searchService, "SEARCH_INDEX_MAX_CHANGES", 1)
+    monkeypatch.setattr(_searchService, "_stale", False)
+    index = _searchService.NgramIndex([])
+    _searchService._apply(index, ("add", [documento("a")]))
+    assert not _searchService._stale
+    _searchService._apply(index, ("add", [documento("b")]))
+    assert _searchService._stale
+
+
+async def search(client, headers, q: str) -> list[str]:
+    response = await client.get(
+        "/api/v1/estudiantes/search", params={"q": q}, headers=headers
+    )
+    assert response.status_code == 200
+    return [e["identificacion"] for e in response.json()]
+
+
+def payload(identificacion: str, **campos) -> dict:
+    return {
+        "tipo_identificacion": "CC",
+        "identificacion": identificacion,
+        "nombres": "Nombre",
+        "apellidos": "Apellido",
+        "institucion": "colegio",
+        "telefono": "0",
+        "direccion": "-",
+        "email": f"{identificacion}@example.com",
+        "hashed_password": "Clave123!",
+        **campos,
+    }
+
+
+async def test_created_and_deleted_students_are_searchable_at_once(
+    client, headers, create_students
+):
+    create_students(2, prefijo="per")
+    assert await search(client, headers, "per") == ["per-0", "per-1"]
+
+    response = await client.post(
+        "/api/v1/estudiantes", json=payload("per-5"), headers=headers
+    )
+    assert response.status_code == 200
+    assert await search(client, headers, "per") == ["per-0", "per-1", "per-5"]
+
+    response = await client.delete(
+        "/api/v1/estudiantes", params={"identification": "per-0"}, headers=headers
+    )
+    assert response.status_code == 200
+    assert await search(client, headers, "per") == ["per-1", "per-5"]
+    # Sin reconstrucción completa
+    assert _searchService._refresh is None
+
+
+async def test_imported_students_are_searchable_at_once(
+    client, headers, create_students
+):
+    create_students(1, prefijo="per")
+    assert await search(client, headers, "per") == ["per-0"]
+
+    archivo = "\n".join(
+        json.dumps(payload(i)) for i in ("per-1", "per-0", "per-2")
+    ).encode()
+    response = await client.post(
+        "/api/v1/estudiantes/importar",
+        files={"archivo": ("estudiantes.jsonl", io.BytesIO(archivo))},
+        headers=headers,
+    )
+    assert response.json()["insertados"] == 2
+    assert await search(client, headers, "per") == ["per-0", "per-1", "per-2"]
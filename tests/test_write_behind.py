@@ -0,0 +1,134 @@
+import asyncio
+import os
+
+import pytest
+
+import services.write_behind_service as _writeBehindService
+from tests import common as _common
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def write_behind(monkeypatch, tmp_path):
+    monkeypatch.setattr(_writeBehindService, "DISCOUNT_WRITE_BEHIND", True)
+    monkeypatch.setattr(
+        _writeBehindService, "DISCOUNT_JOURNAL_DIR", str(tmp_path / "diario")
+    )
+    await _writeBehindService.start()
+    yield _writeBehindService
+    await _writeBehindService.stop()
+
+
+async def test_stop_during_flush_applies_the_batch(
+    write_behind, monkeypatch, admin, create_students
+):
+    [identificacion] = create_students(1, tiquetes=5)
+
+    # El flusher queda dentro de _apply cuando se llama a stop()
+    aplicando = asyncio.Event()
+    apply = write_behind._apply
+
+    async def slow_apply(lote, db=None):
+        aplicando.set()
+        await asyncio.sleep(0.2)
+        await apply(lote, db)
+
+    monkeypatch.setattr(write_behind, "_apply", slow_apply)
+
+    async with _common.session() as db:
+        for _ in range(2):
+            await write_behind.discount(identificacion, db, admin)
+
+    await aplicando.wait()
+    await write_behind.stop()
+
+    assert _common.student(identificacion).numero_tiquetes == 3
+    assert _common.count_trips(identificacion) == 2
+    assert not write_behind._pendientes
+    # Todo quedó en la base: el diario no tiene nada por reprocesar
+    diario = write_behind.DISCOUNT_JOURNAL_DIR
+    assert not [f for f in os.listdir(diario) if f.startswith("descuentos-")]
+
+
+async def discount(client, headers, identificacion: str):
+    return await client.put(
+        f"/api/v1/estudiantes/tickets/delete/{identificacion}",
+        data={"identification": identificacion},
+        headers=headers,
+    )
+
+
+async def test_concurrent_discounts_match_the_database(
+    write_behind, client, headers, create_students
+):
+    [identificacion] = create_students(1, tiquetes=10)
+
+    respuestas = await asyncio.gather(
+        *(discount(client, headers, identificacion) for _ in range(25))
+    )
+    exitosas = [r.json() for r in respuestas if r.status_code == 200]
+    assert sorted(e["numero_tiquetes"] for e in exitosas) == list(range(10))
+    assert all(r.status_code == 400 for r in respuestas if r.status_code != 200)
+
+    await write_behind.flush()
+    estudiante = _common.student(identificacion)
+    assert estudiante.numero_tiquetes == 0
+    assert estudiante.numero_viajes == len(exitosas)
+    assert _common.count_trips(identificacion) == len(exitosas)
+
+
+async def test_recharge_applies_pending_discounts_first(
+    write_behind, monkeypatch, client, headers, create_students
+):
+    [identificacion] = create_students(1, tiquetes=2)
+    # El flusher no corre durante la prueba: los descuentos quedan pendientes
+    # hasta la recarga
+    monkeypatch.setattr(write_behind, "DISCOUNT_FLUSH_MS", 60_000)
+    write_behind._lleno.set()
+    await asyncio.sleep(0.05)
+
+    for _ in range(2):
+        assert (await discount(client, headers, identificacion)).status_code == 200
+    assert _common.student(identificacion).numero_tiquetes == 2
+
+    response = await client.put(
+        f"/api/v1/estudiantes/tickets/{identificacion}",
+        data={"student_id": identificacion, "nro_tickets": "3"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert _common.student(identificacion).numero_tiquetes == 3
+    assert _common.count_trips(identificacion) == 2
+    # El saldo en memoria se descartó y se vuelve a leer con la recarga
+    response = await discount(client, headers, identificacion)
+    assert response.json()["numero_tiquetes"] == 2
+
+
+async def test_recover_replays_the_journal_once(
+    monkeypatch, tmp_path, admin, create_students
+):
+    # Descuentos anotados en el diario que no alcanzaron a aplicarse: el
+    # proceso "cae" sin flusher ni stop()
+    monkeypatch.setattr(_writeBehindService, "DISCOUNT_WRITE_BEHIND", True)
+    monkeypatch.setattr(_writeBehindService, "DISCOUNT_JOURNAL_DIR", str(tmp_path))
+    [identificacion] = create_students(1, tiquetes=5)
+    async with _common.session() as db:
+        for _ in range(3):
+            await _writeBehindService.discount(identificacion, db, admin)
+    _writeBehindService._journal.close()
+    _writeBehindService._journal = None
+    entradas = _writeBehindService._read_journal(_writeBehindService._journal_path())
+    _writeBehindService._pendientes.clear()
+    _writeBehindService._saldos.clear()
+
+    assert await _writeBehindService.recover() == 3
+    assert _common.student(identificacion).numero_tiquetes == 2
+    assert _common.count_trips(identificacion) == 2 + 1
+    assert os.listdir(tmp_path) == []
+
+    # Reprocesar las mismas entradas (caída justo después del commit) no las
+    # aplica dos veces
+    await _writeBehindService._apply(entradas)
+    assert _common.student(identificacion).numero_tiquetes == 2
+    assert _common.count_trips(identificacion) == 3